@@ -0,0 +1,7 @@
+"""
+SUMMARY: The medline_trends package holds the code that the
+    mesh-intersections programs share. The programs themselves only
+    set a few variables (where to save the CSV file, which MeSH to
+    look at, and which years to search) and hand them to the engine
+    in medline_trends.engine.
+"""
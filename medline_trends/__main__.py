@@ -0,0 +1,172 @@
+"""
+SUMMARY: This module is the command-line entry point of the package. It
+    runs any number of user-selected MeSH against any number of presets
+    as one batch, without editing a program, and also reaches the
+    commands of the other modules. The rest of the package, and the
+    libraries it needs, are only imported once a command is chosen, so
+    it starts quickly.
+
+USAGE: Run this from the folder that holds the programs:
+        python -m medline_trends run --mesh "<MeSH>" ... --preset <preset>
+            ... [--pair "<MeSH>" ...] [--start-year YYYY] [--end-year YYYY]
+            [--folder <folder>] [--mode <mode>] [--api-key KEY]
+            [--dataset <folder>] [--trends] [--history]
+    <preset> is one of physicians, health-personnel, medicine, and
+    geographic-locations; --pair intersects each user-selected MeSH
+    with another MeSH, as mesh-intersections.py does. One CSV file is
+    written for each user-selected MeSH and each preset or pair, with
+    a journal for each next to it. Every search of the batch goes
+    through one client, so the connections, the rate limit, and the
+    cache are shared, the yearly totals are loaded once, and each MeSH
+    is checked once before any search for an intersection is sent.
+    With --dataset (or the MEDLINE_TRENDS_DATASET environment variable),
+    the rows are also written to a Parquet dataset in that folder (see
+    medline_trends/sinks.py), which needs pyarrow. With --trends, each
+    CSV file also gets a trends file next to it (see
+    medline_trends/analytics.py). With --history, each user-selected
+    MeSH is kept on the NCBI history server and the searches refer to
+    it (see medline_trends/eutils.py).
+        python -m medline_trends presets
+    lists the presets, and
+        python -m medline_trends <module> [arguments]
+    runs the command of one of the other modules (analytics, grid,
+    journal, refresh, shards, index, baseline, benchmark, or totals).
+"""
+
+# The argparse module reads the command-line arguments.
+import argparse
+# The os module reads the paths of the MeSH descriptor file and the
+    # dataset from the environment.
+import os
+# The runpy module runs the command of another module.
+import runpy
+# The sys module holds the arguments passed on to another module.
+import sys
+# The warnings module reports preset terms that are not MeSH.
+import warnings
+
+# The modules with commands of their own.
+MODULES = [
+    "analytics", "baseline", "benchmark", "grid", "index", "journal",
+    "refresh", "shards", "totals"]
+
+# The keys of engine.MODES, listed here so that the engine is not
+    # imported to parse the arguments.
+MODES = ["esearch", "groups", "pmids", "spans"]
+
+
+def run(args, parser):
+    """Run the batch the arguments describe."""
+    # Imported here so that the other commands start quickly.
+    from medline_trends import engine, eutils, presets
+    chosen = []
+    for name in args.preset:
+        if name not in presets.BY_NAME:
+            parser.error(
+                "--preset must be one of "
+                f"{', '.join(sorted(presets.BY_NAME))}")
+        chosen.append(presets.BY_NAME[name])
+    chosen += [engine.pair(mesh) for mesh in args.pair]
+    if not chosen:
+        parser.error("give at least one --preset or --pair")
+    client = eutils.EutilsClient(
+        api_key=args.api_key, history=args.history)
+    descriptors = args.descriptors
+    tree = None
+    if descriptors:
+        from medline_trends import mesh
+        tree = mesh.load(descriptors)
+    # Check every MeSH of the batch once, before any intersection is
+        # searched for: the user-selected MeSH, and the terms each
+        # preset runs with, whether its rule selects them from the tree
+        # or they are listed in medline_trends/presets.py.
+    checked = args.mesh + args.pair
+    for preset in chosen:
+        checked += list(engine.resolve(preset, tree).terms)
+    unknown = engine.unknown_mesh(checked, client, tree)
+    given = [name for name in unknown if name in args.mesh + args.pair]
+    if given:
+        parser.error(f"not MeSH: {', '.join(given)}")
+    if unknown:
+        warnings.warn(
+            f"These preset terms are not MeSH: {', '.join(unknown)}",
+            RuntimeWarning)
+    end_year = args.end_year or engine.default_end_year()
+    jobs = [
+        engine.Job(mesh, preset, args.start_year, end_year)
+        for mesh in args.mesh for preset in chosen]
+    for filename in engine.batch(
+            jobs, args.folder, client, args.mode, descriptors,
+            args.dataset):
+        print(f"Wrote {filename}")
+        if args.trends:
+            from medline_trends import analytics
+            trends = analytics.export(os.path.join(args.folder, filename))
+            print(f"Wrote {os.path.basename(trends)}")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    # Hand the other modules' commands over before parsing anything.
+    if argv and argv[0] in MODULES:
+        sys.argv = [f"medline_trends.{argv[0]}"] + argv[1:]
+        runpy.run_module(
+            f"medline_trends.{argv[0]}", run_name="__main__", alter_sys=True)
+        return
+    parser = argparse.ArgumentParser(
+        prog="python -m medline_trends",
+        description="Run MeSH intersections, or the command of another "
+        f"module ({', '.join(MODULES)}).")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser(
+        "run", help="run user-selected MeSH against presets as one batch")
+    run_parser.add_argument(
+        "--mesh", nargs="+", required=True, help="user-selected MeSH")
+    run_parser.add_argument(
+        "--preset", nargs="+", default=[], help="names of presets")
+    run_parser.add_argument(
+        "--pair", nargs="+", default=[],
+        help="MeSH to intersect each user-selected MeSH with")
+    run_parser.add_argument(
+        "--start-year", type=int, default=1966,
+        help="first year (default: 1966)")
+    run_parser.add_argument(
+        "--end-year", type=int, default=None,
+        help="last year (default: the last year over for three months)")
+    run_parser.add_argument(
+        "--folder", default=".", help="folder for the CSV files")
+    run_parser.add_argument(
+        "--mode", choices=MODES,
+        default="esearch", help="how to get the counts (default: esearch)")
+    run_parser.add_argument(
+        "--api-key", default=None,
+        help="NCBI API key (default: NCBI_API_KEY)")
+    run_parser.add_argument(
+        "--descriptors", default=None,
+        help="MeSH descriptor file (default: MEDLINE_TRENDS_MESH)")
+    run_parser.add_argument(
+        "--dataset", default=None,
+        help="folder of a Parquet dataset to also write the rows to "
+        "(default: MEDLINE_TRENDS_DATASET)")
+    run_parser.add_argument(
+        "--trends", action="store_true",
+        help="also write the trends of each CSV file")
+    run_parser.add_argument(
+        "--history", action="store_true",
+        help="keep each user-selected MeSH on the NCBI history server")
+    commands.add_parser("presets", help="list the presets")
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        args.descriptors = (
+            args.descriptors or os.environ.get("MEDLINE_TRENDS_MESH"))
+        args.dataset = (
+            args.dataset or os.environ.get("MEDLINE_TRENDS_DATASET"))
+        run(args, parser)
+    else:
+        from medline_trends import presets
+        for name, preset in sorted(presets.BY_NAME.items()):
+            print(f"{name}\t{len(preset.terms)} terms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+SUMMARY: This module works out trends from the counts of a run: the
+    counts per 1,000 citations, the growth from one year to the next,
+    each term's share of the term above it, each term's rank among the
+    terms in each year, and the counts per 1,000 smoothed over several
+    years. The counts are held as a matrix of terms by years, with a
+    vector of the yearly totals, and each measure is worked out for the
+    whole matrix at once with NumPy instead of a row at a time.
+
+USAGE: To write the trends of one or more CSV files written by the
+    programs, run this from the folder that holds the programs:
+        python -m medline_trends.analytics <CSV file> ...
+            [--window N]
+    Each CSV file gets a trends file next to it, with the same name
+    ending in "_trends.csv" instead of ".csv". The run command of the
+    package (see medline_trends/__main__.py) writes them too when given
+    --trends. From other code, from_rows() builds the matrix from the
+    rows of engine.stream() or of a CSV file, and measures() works out
+    every measure for it.
+
+FORMAT: A trends file has one row per term and year, like the CSV file
+    it comes from (without the term for a pair of MeSH), with these
+    fields after the term and year:
+    1) intersecting_citations: The count, as in the CSV file
+    2) intersecting_citations_per_1k: The count per 1,000 MEDLINE-indexed
+        citations from that year
+    3) growth: The change in the count from the year before, as a
+        fraction of the count the year before (empty in the first year
+        and when that count is zero)
+    4) share_of_parent: The count as a fraction of the count of the term
+        above it in the preset (empty for a term with nothing above it)
+    5) rank: The term's place among all the terms in that year by count,
+        1 being the most; terms with the same count share a place
+    6) per_1k_smoothed: The counts per 1,000 averaged over the year and
+        the years before it, up to the window (default: 3 years)
+    A cell that failed in the run is empty in every field, and a CSV
+    file without rows, as from a run whose cells all failed, gets a
+    trends file without rows.
+
+LIMITS: The measures are worked out along the last two axes of the
+    arrays (terms, then years), so runs of the same preset and years
+    for several user-selected MeSH can be stacked into one array with
+    numpy.stack() and measured at once.
+"""
+
+# The argparse module reads the command-line arguments.
+import argparse
+# The collections module is used to define a record type for matrices.
+from collections import namedtuple
+# The csv module reads the CSV files of the programs.
+import csv
+
+# The numpy module holds the matrices and works out the measures.
+import numpy as np
+
+from medline_trends import presets, sinks
+
+# How many years the counts per 1,000 are smoothed over.
+WINDOW = 3
+
+# The counts of a run as a matrix. "column" is the name of the CSV field
+    # that holds the terms (None for a pair of MeSH, whose one term is
+    # then None too), "counts" is a terms-by-years array of floats, with
+    # NaN for cells that failed, and "totals" the yearly totals.
+Matrix = namedtuple(
+    "Matrix", ["column", "terms", "years", "counts", "totals"])
+
+
+def from_rows(rows, column=None):
+    """Return the matrix of the rows of a run (see engine.make_row()),
+    whose terms are in the given field. Without rows, the matrix has
+    no terms and no years."""
+    year_field = "year" if column else "publication_year"
+    total_field = "total_medline_citations" if column else "total_citations"
+    cells = {}
+    year_totals = {}
+    for row in rows:
+        term = row[column] if column else None
+        year = int(row[year_field])
+        cells[term, year] = float(row["intersecting_citations"])
+        year_totals[year] = float(row[total_field])
+    terms = list(dict.fromkeys(term for term, _ in cells))
+    years = list(range(min(year_totals, default=0),
+                       max(year_totals, default=-1) + 1))
+    counts = np.full((len(terms), len(years)), np.nan)
+    index = {term: i for i, term in enumerate(terms)}
+    for (term, year), count in cells.items():
+        counts[index[term], year - years[0]] = count
+    return Matrix(
+        column, terms, years, counts,
+        np.array([year_totals.get(year, np.nan) for year in years]))
+
+
+def per_1k(counts, totals):
+    """Return the counts per 1,000 citations from their years."""
+    return counts / totals * 1000
+
+
+def growth(counts):
+    """Return the change in each count from the year before, as a
+    fraction of the count the year before: NaN in the first year and
+    where that count is zero."""
+    change = np.full(counts.shape, np.nan)
+    before = counts[..., :-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change[..., 1:] = np.where(
+            before > 0, (counts[..., 1:] - before) / before, np.nan)
+    return change
+
+
+def parent_index(terms, parents):
+    """Return, for each term, the index of the term above it in the list,
+    or -1 if there is none there."""
+    index = {term: i for i, term in enumerate(terms)}
+    return np.array(
+        [index.get(parents.get(term), -1) for term in terms], dtype=int)
+
+
+def share_of_parent(counts, above):
+    """Return each count as a fraction of the count of the term above it
+    that year (see parent_index()): NaN for a term with nothing above
+    it and where the term above has a count of zero."""
+    parent = np.take(counts, np.maximum(above, 0), axis=-2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        share = np.where(parent > 0, counts / parent, np.nan)
+    share[..., above < 0, :] = np.nan
+    return share
+
+
+def ranks(counts):
+    """Return the place of each term among the terms in each year by
+    count, 1 being the most; terms with the same count share the
+    highest place they could have, and cells that failed get NaN."""
+    terms = counts.shape[-2]
+    filled = np.where(np.isnan(counts), -np.inf, counts)
+    order = np.argsort(-filled, axis=-2, kind="stable")
+    ordered = np.take_along_axis(filled, order, axis=-2)
+    # Each place in the sorted order takes the place of the first term
+        # with the same count.
+    position = np.broadcast_to(
+        np.arange(terms).reshape(-1, 1), ordered.shape)
+    starts = np.ones(ordered.shape, dtype=bool)
+    starts[..., 1:, :] = ordered[..., 1:, :] != ordered[..., :-1, :]
+    first = np.maximum.accumulate(
+        np.where(starts, position, 0), axis=-2)
+    places = np.empty(ordered.shape)
+    np.put_along_axis(places, order, first + 1.0, axis=-2)
+    places[np.isnan(counts)] = np.nan
+    return places
+
+
+def smoothed(values, window=WINDOW):
+    """Return the average of each value and the values of the years
+    before it, up to the window, leaving out the NaNs; the first years
+    average over the years there are."""
+    known = ~np.isnan(values)
+    sums = np.cumsum(np.where(known, values, 0.0), axis=-1)
+    seen = np.cumsum(known, axis=-1)
+    sums[..., window:] = sums[..., window:] - sums[..., :-window]
+    seen[..., window:] = seen[..., window:] - seen[..., :-window]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(seen > 0, sums / seen, np.nan)
+
+
+def measures(matrix, parents=None, window=WINDOW):
+    """Return every measure of a matrix as a dictionary of terms-by-years
+    arrays, by the name of its field in a trends file. "parents" maps
+    terms to the term above them, as in a preset."""
+    rates = per_1k(matrix.counts, matrix.totals)
+    return {
+        "intersecting_citations": matrix.counts,
+        "intersecting_citations_per_1k": rates,
+        "growth": growth(matrix.counts),
+        "share_of_parent": share_of_parent(
+            matrix.counts, parent_index(matrix.terms, parents or {})),
+        "rank": ranks(matrix.counts),
+        "per_1k_smoothed": smoothed(rates, window)}
+
+
+def trend_rows(matrix, parents=None, window=WINDOW):
+    """Yield the rows of the trends file of a matrix, in the order of the
+    CSV file it comes from."""
+    found = measures(matrix, parents, window)
+    year_field = "year" if matrix.column else "publication_year"
+    for i, term in enumerate(matrix.terms):
+        for j, year in enumerate(matrix.years):
+            row = {matrix.column: term} if matrix.column else {}
+            row[year_field] = year
+            failed = np.isnan(matrix.counts[i, j])
+            for name, values in found.items():
+                value = values[i, j]
+                if failed or np.isnan(value):
+                    row[name] = ""
+                elif name in ["intersecting_citations", "rank"]:
+                    row[name] = int(value)
+                else:
+                    row[name] = round(float(value), 6)
+            yield row
+
+
+def trends_filename(path):
+    """Return the path of the trends file for a CSV file."""
+    return f"{path[:-4] if path.endswith('.csv') else path}_trends.csv"
+
+
+def read_csv(path):
+    """Return the matrix of a CSV file written by the programs. A run
+    without rows leaves a CSV file without a header, whose matrix is
+    empty."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        if reader.fieldnames is None:
+            return from_rows([])
+        column = reader.fieldnames[0]
+        if column == "publication_year":
+            column = None
+        return from_rows(reader, column)
+
+
+def preset_parents(column):
+    """Return the hierarchy of the preset whose terms are in the given
+    CSV field, if there is one."""
+    for preset in presets.BY_NAME.values():
+        if preset.column == column:
+            return preset.parents or {}
+    return {}
+
+
+def export(path, window=WINDOW):
+    """Write the trends file for a CSV file and return its path."""
+    matrix = read_csv(path)
+    target = trends_filename(path)
+    with sinks.CsvSink(target) as sink:
+        for row in trend_rows(
+                matrix, preset_parents(matrix.column), window):
+            sink.write(row)
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write the trends of CSV files written by the "
+        "programs.")
+    parser.add_argument("csv", nargs="+", help="CSV files of runs")
+    parser.add_argument(
+        "--window", type=int, default=WINDOW,
+        help=f"years to smooth over (default: {WINDOW})")
+    args = parser.parse_args()
+    for path in args.csv:
+        print(f"Wrote {export(path, args.window)}")
+
+
+if __name__ == "__main__":
+    main()
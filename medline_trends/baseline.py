@@ -0,0 +1,353 @@
+"""
+SUMMARY: This module builds a local store of MEDLINE citations from the
+    annual baseline files that NLM publishes
+    (https://www.nlm.nih.gov/databases/download/pubmed_medline.html)
+    and lets the programs run against that store instead of the
+    E-utilities. For each citation, the store keeps its PMID, its
+    publication year, the IDs of the MeSH descriptors it is tagged
+    with, and its MEDLINE status, each as its own column.
+
+USAGE: To build a store, download the baseline (and, if you like, the
+    update) .xml.gz files into one folder and run this from the folder
+    that holds the programs:
+        python -m medline_trends.baseline <folder of .xml.gz files>
+            <folder for the store> [--workers N]
+    The files are read in name order, spread across N processes (all
+    of the computer's cores by default), and parsed as a stream, so
+    memory use does not depend on the size of a file. A citation that
+    appears in more than one file is taken from the last one, and
+    citations deleted in an update file are dropped. To run a program
+    against the store, pass a Store as the client:
+        engine.run(job, client=baseline.Store("<folder for the store>"))
+    To have "[mh]" exploded, as PubMed does, give the Store a MeSH
+    descriptor file (see medline_trends/mesh.py) too:
+        baseline.Store("<folder for the store>", "<descriptor file>")
+
+CAVEAT: The publication year is the year of the journal issue (the
+    [dp] field). PubMed's [pdat] field, which the E-utilities searches
+    use, also counts a citation in the year of its electronic
+    publication, so counts from the store can differ slightly from
+    counts from the E-utilities. Without a descriptor file, the store
+    only matches the MeSH a citation is tagged with, not the MeSH below
+    it, so "[mh]" is not exploded, and the engine does not skip the
+    terms under a term with a count of zero. An index built from the
+    store (see medline_trends/index.py) is much quicker to search.
+"""
+
+# The argparse module reads the command-line arguments.
+import argparse
+# The concurrent.futures module spreads the files across processes.
+from concurrent.futures import ProcessPoolExecutor
+# The gzip module reads the compressed baseline files.
+import gzip
+# The os module is used to find the files and build paths.
+import os
+# The re module is used to find the year in free-text dates.
+import re
+# The xml.etree module parses the files as a stream.
+from xml.etree import ElementTree
+
+# The numpy module holds the columns.
+import numpy as np
+
+# The MeSH tree explodes "[mh]" searches when a descriptor file is given.
+from medline_trends import mesh
+
+# The MEDLINE statuses a citation can have. A citation's status is kept
+    # as its position in this list.
+STATUSES = [
+    "MEDLINE", "PubMed-not-MEDLINE", "In-Data-Review", "In-Process",
+    "Publisher", "OLDMEDLINE", "Completed", "Other"]
+
+# The columns of the store, with the type of each.
+COLUMNS = {
+    "pmid": "<u4", "year": "<i2", "status": "<u1",
+    "mesh_offsets": "<i8", "mesh_ids": "<u4"}
+
+# The four-digit year in a date such as "1998 Dec-1999 Jan".
+_YEAR = re.compile(r"\d{4}")
+
+
+def descriptor_number(ui):
+    """Return the number in a MeSH descriptor ID such as "D012345"."""
+    return int(ui[1:])
+
+
+def publication_year(citation):
+    """Return the publication year of a MedlineCitation element, or 0 if
+    it has none."""
+    pub_date = citation.find("Article/Journal/JournalIssue/PubDate")
+    if pub_date is not None:
+        year = pub_date.findtext("Year")
+        if year is None:
+            match = _YEAR.search(pub_date.findtext("MedlineDate") or "")
+            year = match and match.group()
+        if year:
+            return int(year)
+    year = citation.findtext("Article/ArticleDate/Year")
+    return int(year) if year else 0
+
+
+def parse(path):
+    """Yield ("citation", pmid, year, status, descriptors) for each
+    citation in a baseline or update file and ("deleted", pmid) for each
+    deleted citation, where descriptors is a list of (ID, name) pairs.
+    Each citation, and each list of deleted citations, is cleared once
+    it has been read, so memory use stays flat."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        events = ElementTree.iterparse(f, events=("start", "end"))
+        root = None
+        for event, elem in events:
+            if root is None:
+                root = elem
+            if event != "end":
+                continue
+            if elem.tag == "MedlineCitation":
+                status = elem.get("Status", "Other")
+                descriptors = [
+                    (name.get("UI"), name.text)
+                    for name in elem.iterfind(
+                        "MeshHeadingList/MeshHeading/DescriptorName")]
+                yield (
+                    "citation", int(elem.findtext("PMID")),
+                    publication_year(elem),
+                    STATUSES.index(status) if status in STATUSES
+                    else STATUSES.index("Other"),
+                    descriptors)
+            elif elem.tag == "DeleteCitation":
+                for pmid in elem.iterfind("PMID"):
+                    yield "deleted", int(pmid.text)
+                root.clear()
+            elif elem.tag == "PubmedArticle":
+                root.clear()
+
+
+def ingest_file(path, parts):
+    """Parse one file into a part of the store, saved in the parts
+    folder, and return the part's path."""
+    pmid, year, status, offsets, mesh_ids = [], [], [], [0], []
+    deleted, names = [], {}
+    for record in parse(path):
+        if record[0] == "deleted":
+            deleted.append(record[1])
+            continue
+        _, p, y, s, descriptors = record
+        pmid.append(p)
+        year.append(y)
+        status.append(s)
+        for ui, name in descriptors:
+            mesh_ids.append(descriptor_number(ui))
+            names[ui] = name
+        offsets.append(len(mesh_ids))
+    part = os.path.join(parts, os.path.basename(path) + ".npz")
+    np.savez(
+        part, pmid=np.array(pmid, COLUMNS["pmid"]),
+        year=np.array(year, COLUMNS["year"]),
+        status=np.array(status, COLUMNS["status"]),
+        mesh_offsets=np.array(offsets, COLUMNS["mesh_offsets"]),
+        mesh_ids=np.array(mesh_ids, COLUMNS["mesh_ids"]),
+        deleted=np.array(deleted, COLUMNS["pmid"]),
+        names=np.array(sorted(names.items()), dtype=str).reshape(-1, 2))
+    return part
+
+
+def take_ragged(offsets, values, rows):
+    """Return the offsets and values of a ragged column (one list of
+    values per row) for the given rows, in the given order."""
+    lengths = (offsets[1:] - offsets[:-1])[rows]
+    new_offsets = np.zeros(len(rows) + 1, offsets.dtype)
+    np.cumsum(lengths, out=new_offsets[1:])
+    # For each value to keep, the position of its row's first value in
+        # the old column plus its position within the row.
+    starts = np.repeat(offsets[:-1][rows] - new_offsets[:-1], lengths)
+    return new_offsets, values[starts + np.arange(new_offsets[-1])]
+
+
+def merge(part_paths, store):
+    """Combine the parts, in order, into the columns of the store. A
+    citation that appears in more than one part is taken from the last
+    one, and citations deleted in a part are dropped from the parts
+    before it."""
+    parts = [np.load(path) for path in part_paths]
+    pmid = np.concatenate([part["pmid"] for part in parts])
+    source = np.concatenate([
+        np.full(len(part["pmid"]), i) for i, part in enumerate(parts)])
+    # Keep the last row for each PMID.
+    last = len(pmid) - 1 - np.unique(pmid[::-1], return_index=True)[1]
+    # Drop the rows deleted by a later part.
+    for i, part in enumerate(parts):
+        if len(part["deleted"]):
+            gone = np.isin(pmid[last], part["deleted"]) & (source[last] < i)
+            last = last[~gone]
+    year = np.concatenate([part["year"] for part in parts])
+    status = np.concatenate([part["status"] for part in parts])
+    # Join the ragged MeSH columns by shifting each part's offsets.
+    shifts = np.cumsum([0] + [len(part["mesh_ids"]) for part in parts])
+    offsets = np.concatenate(
+        [part["mesh_offsets"][:-1] + shift
+         for part, shift in zip(parts, shifts)] + [shifts[-1:]])
+    mesh_ids = np.concatenate([part["mesh_ids"] for part in parts])
+    mesh_offsets, mesh_ids = take_ragged(offsets, mesh_ids, last)
+    columns = {
+        "pmid": pmid[last], "year": year[last], "status": status[last],
+        "mesh_offsets": mesh_offsets, "mesh_ids": mesh_ids}
+    for name, values in columns.items():
+        np.save(os.path.join(store, f"{name}.npy"), values.astype(
+            COLUMNS[name]))
+    names = {}
+    for part in parts:
+        names.update(dict(part["names"]))
+    with open(
+            os.path.join(store, "descriptors.tsv"), "w",
+            encoding="utf-8") as f:
+        for ui in sorted(names):
+            f.write(f"{ui}\t{names[ui]}\n")
+
+
+def read_names(store):
+    """Return a dictionary of the MeSH descriptor IDs in a store, by
+    lowercase name."""
+    names = {}
+    with open(
+            os.path.join(store, "descriptors.tsv"), encoding="utf-8") as f:
+        for line in f:
+            ui, name = line.rstrip("\n").split("\t")
+            names[name.lower()] = ui
+    return names
+
+
+def ingest(folder, store, workers=None):
+    """Build a store from every .xml.gz (or .xml) file in a folder."""
+    paths = sorted(
+        os.path.join(folder, name) for name in os.listdir(folder)
+        if name.endswith((".xml.gz", ".xml")))
+    parts = os.path.join(store, "parts")
+    os.makedirs(parts, exist_ok=True)
+    with ProcessPoolExecutor(workers) as executor:
+        part_paths = list(executor.map(
+            ingest_file, paths, [parts] * len(paths)))
+    merge(part_paths, store)
+    for path in part_paths:
+        os.remove(path)
+    os.rmdir(parts)
+
+
+class LocalClient:
+    """The part of a local stand-in for the E-utilities client that
+    answers searches. The searches the engine sends join "<MeSH>"[mh]
+    and <year>[pdat] (or <year>:<year>[pdat]) clauses with AND. It
+    answers each search at once, so the engine only runs against it in
+    the default ("esearch") mode; the other modes are ways of sending
+    fewer searches to a server. Subclasses supply year_counts()."""
+
+    # Whether a "[mh]" search matches the MeSH below the one searched for
+        # too, as it does in PubMed. Only then is a term under a term
+        # with a count of zero known to be zero (see engine.stream()).
+    explodes = False
+
+    def year_counts(self, names):
+        """Return the number of citations tagged with every one of the
+        given MeSH in each year, as an array indexed by year."""
+        raise NotImplementedError
+
+    def count(self, query):
+        """Return the number of citations that match a search."""
+        names, first, last = [], 0, 9999
+        for clause in query.split(" AND "):
+            match = re.fullmatch(r'"(.+)"\[mh\]', clause)
+            if match:
+                names.append(match.group(1))
+                continue
+            match = re.fullmatch(r"(\d{4})(?::(\d{4}))?\[pdat\]", clause)
+            if match is None:
+                raise ValueError(f"Cannot answer {clause} locally")
+            first = max(first, int(match.group(1)))
+            last = min(last, int(match.group(2) or match.group(1)))
+        return int(self.year_counts(names)[first:last + 1].sum())
+
+    def counts(self, queries):
+        """Yield (query, count) for each query. Queries that cannot be
+        answered locally are skipped."""
+        for query in queries:
+            try:
+                yield query, self.count(query)
+            except ValueError:
+                continue
+
+
+class Store(LocalClient):
+    """A store built by ingest(). It answers the searches the engine
+    sends, so it can stand in for the E-utilities client. The columns
+    are memory-mapped, so opening a store is quick. Given a MeSH
+    descriptor file, it explodes "[mh]" searches."""
+
+    def __init__(self, path, descriptors=None):
+        self.path = path
+        self.columns = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            for name in COLUMNS}
+        self.descriptors = read_names(path)
+        self.tree = mesh.load(descriptors) if descriptors else None
+        self.explodes = self.tree is not None
+        self._rows = {}
+        self._years = {}
+
+    def matched(self, name):
+        """Return the IDs of the MeSH a "[mh]" search for a MeSH matches:
+        the MeSH and, with a descriptor file, every MeSH below it."""
+        if self.tree is not None:
+            descriptor = self.tree.by_name.get(name.lower())
+            return self.tree.explode(descriptor.ui) if descriptor else set()
+        ui = self.descriptors.get(name.lower())
+        return {ui} if ui else set()
+
+    def rows(self, name):
+        """Return the sorted rows of the citations that a "[mh]" search
+        for a MeSH matches."""
+        if name not in self._rows:
+            uis = self.matched(name)
+            if not uis:
+                rows = np.array([], dtype=np.int64)
+            else:
+                positions = np.flatnonzero(np.isin(
+                    self.columns["mesh_ids"],
+                    [descriptor_number(ui) for ui in uis]))
+                rows = np.unique(np.searchsorted(
+                    self.columns["mesh_offsets"], positions,
+                    side="right") - 1)
+            self._rows[name] = rows
+        return self._rows[name]
+
+    def year_counts(self, names):
+        """Return the number of citations tagged with every one of the
+        given MeSH in each year, as an array indexed by year."""
+        key = tuple(sorted(names))
+        if key not in self._years:
+            year = self.columns["year"]
+            if names:
+                rows = self.rows(key[0])
+                for name in key[1:]:
+                    rows = np.intersect1d(
+                        rows, self.rows(name), assume_unique=True)
+                years = year[rows]
+            else:
+                years = year
+            self._years[key] = np.bincount(years, minlength=10000)
+        return self._years[key]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build a local store from MEDLINE baseline files.")
+    parser.add_argument("folder", help="folder of .xml.gz files")
+    parser.add_argument("store", help="folder for the store")
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="number of processes (default: one per core)")
+    args = parser.parse_args()
+    ingest(args.folder, args.store, args.workers)
+
+
+if __name__ == "__main__":
+    main()
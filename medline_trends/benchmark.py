@@ -0,0 +1,388 @@
+"""
+SUMMARY: This module measures parts of the programs that decide how
+    long a run takes.
+
+USAGE: Run this from the folder that holds the programs:
+        python -m medline_trends.benchmark parse [--repeat N] [--live]
+    "parse" compares the way counts used to be retrieved (the default
+    esearch response, with 20 PMIDs and the query translation, built
+    into a BeautifulSoup tree) with the count-only response read by
+    eutils.parse_count(). It reports the size of each response and the
+    time it takes to parse it. By default it uses sample responses
+    made to look like PubMed's; with --live, it sends one search of
+    each kind to the E-utilities and uses those responses instead.
+        python -m medline_trends.benchmark workloads [--modes MODE ...]
+            [--workloads NAME ...] [--latency S] [--jitter S]
+            [--rate-limited F] [--errors F] [--history]
+            [--history-lifetime S] [--label LABEL] [--output benchmark.json]
+    "workloads" runs the jobs of the five programs, for "Public Health"
+    from 1966 through 2023, against a local stand-in for the
+    E-utilities (see medline_trends/mockserver.py), once with an empty
+    cache and once more with the cache the first run filled. For each
+    program and mode, it reports the time the first run took, the
+    requests it sent, how many of the searches the programs used to
+    send (one per cell and one per unsettled year) it saved, the
+    requests the second run sent, the average size of the query string
+    of a request, and the most memory the process of the first run
+    used (except on Windows). With --history, each mode is also run
+    with history server sessions for the user-selected MeSH (see
+    medline_trends/eutils.py), as "<mode>+history", and
+    --history-lifetime makes the server expire its sessions after that
+    many seconds, so that renewing them is measured too. The results
+    are also written to a JSON file, labeled with the current git
+    commit, and
+        python -m medline_trends.benchmark compare <old.json> <new.json>
+    compares two of them, so that a change can be checked for
+    regressions.
+"""
+
+# The argparse module reads the command-line arguments.
+import argparse
+# The concurrent.futures and multiprocessing modules run each workload
+    # in a fresh process of its own, so that its memory is measured on
+    # its own.
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+# The datetime module dates the results.
+from datetime import datetime
+# The json module writes and reads the results.
+import json
+# The os module is used to build the path of each workload's cache.
+import os
+# The platform module records the computer the results come from.
+import platform
+# The resource module reads the most memory a process has used. It is
+    # not available on Windows.
+try:
+    import resource
+except ImportError:
+    resource = None
+# The shutil module removes each workload's cache.
+import shutil
+# The subprocess module reads the current git commit.
+import subprocess
+# The sys module tells how the most memory used is measured.
+import sys
+# The tempfile module makes a folder for each workload's cache.
+import tempfile
+# The time module is used to wait for a token before a live search.
+import time
+# The timeit module times the parsers.
+import timeit
+
+# The bs4 module is how counts used to be read.
+from bs4 import BeautifulSoup
+
+from medline_trends import engine, eutils, presets, totals
+from medline_trends.cache import CountCache
+from medline_trends.metrics import Metrics
+from medline_trends.mockserver import Corpus, MockServer
+
+# The search used for the sample and live responses.
+SAMPLE_QUERY = '"Physicians"[mh] AND "Chad"[mh] AND 2015[pdat]'
+
+# The jobs of the five programs, by the name of the program.
+WORKLOADS = {
+    "mesh-intersections": engine.pair("Communication"),
+    "physicians": presets.PHYSICIANS,
+    "health-personnel": presets.HEALTH_PERSONNEL,
+    "medicine": presets.MEDICINE,
+    "geographic-locations": presets.GEOGRAPHIC_LOCATIONS}
+WORKLOAD_MESH = "Public Health"
+WORKLOAD_YEARS = (1966, 2023)
+
+# The modes the stand-in server can stand in for.
+WORKLOAD_MODES = ["esearch", "groups", "spans"]
+
+# The start of every esearch response.
+_PROLOG = (
+    '<?xml version="1.0" encoding="UTF-8" ?>\n'
+    '<!DOCTYPE eSearchResult PUBLIC "-//NLM//DTD esearch 20060628//EN" '
+    '"https://eutils.ncbi.nlm.nih.gov/eutils/dtd/20060628/esearch.dtd">\n')
+
+
+def sample_responses(count=1234):
+    """Return a default esearch response and a count-only response for
+    SAMPLE_QUERY, as PubMed would send them."""
+    ids = "".join(f"<Id>{36000000 + i}</Id>" for i in range(20))
+    translation = (
+        '<Translation><From>"Physicians"[mh]</From>'
+        '<To>"physicians"[MeSH Terms]</To></Translation>'
+        '<Translation><From>"Chad"[mh]</From>'
+        '<To>"chad"[MeSH Terms]</To></Translation>')
+    full = (
+        f"{_PROLOG}<eSearchResult><Count>{count}</Count>"
+        f"<RetMax>20</RetMax><RetStart>0</RetStart><IdList>{ids}</IdList>"
+        f"<TranslationSet>{translation}</TranslationSet>"
+        '<QueryTranslation>"physicians"[MeSH Terms] AND "chad"[MeSH '
+        'Terms] AND 2015/01/01:2015/12/31[Date - Publication]'
+        "</QueryTranslation></eSearchResult>\n")
+    count_only = (
+        f"{_PROLOG}<eSearchResult>\n\t<Count>{count}</Count>\n"
+        "</eSearchResult>\n")
+    return full, count_only
+
+
+def live_responses(query=SAMPLE_QUERY):
+    """Send one default search and one count-only search for a query and
+    return their responses."""
+    client = eutils.EutilsClient(cache=False)
+    responses = []
+    for extra in [{}, eutils.COUNT_ONLY]:
+        time.sleep(client.bucket.reserve())
+        responses.append(client.get(client.params(query, **extra)))
+    return responses
+
+
+def soup_count(text):
+    """Read a count the way the programs used to."""
+    return int(BeautifulSoup(text, features="xml").find("Count").text)
+
+
+def parse_benchmark(full, count_only, repeat=1000):
+    """Return the size in bytes and the parse time per call in
+    microseconds of each way of reading a count."""
+    cases = [
+        ("default response, BeautifulSoup", full, soup_count),
+        ("count-only response, BeautifulSoup", count_only, soup_count),
+        ("count-only response, parse_count", count_only,
+         lambda text: eutils.parse_count(text).count)]
+    results = []
+    for name, text, parse in cases:
+        seconds = min(timeit.repeat(
+            lambda: parse(text), number=repeat, repeat=3))
+        results.append((
+            name, len(text.encode("utf-8")), seconds / repeat * 1e6))
+    return results
+
+
+def peak_memory():
+    """Return the most memory this process has had in use at once, in
+    bytes, or None where that cannot be read."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # It is in kilobytes, except on macOS.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def measure(job, mode, url, rate, history=False):
+    """Run a job against a server twice, with an empty cache and then
+    with the cache the first run filled, and return what was measured.
+    This runs in a process of its own."""
+    results = {}
+    folder = tempfile.mkdtemp()
+    cache_path = os.path.join(folder, "esearch.sqlite")
+    try:
+        for run in ["first", "second"]:
+            client = eutils.EutilsClient(
+                api_key="benchmark", rate=rate, url=url,
+                cache=CountCache(cache_path), metrics=Metrics(console=False),
+                history=history)
+            started = time.perf_counter()
+            rows = engine.run(job, client=client, mode=mode)
+            if run == "first":
+                results["wall_seconds"] = time.perf_counter() - started
+                results["peak_memory_bytes"] = peak_memory()
+                results["rows"] = len(rows)
+                results["calls"] = client.metrics.requests
+                results["retries"] = client.metrics.retries
+                results["failed"] = len(engine.plan(job)) - len(rows)
+            else:
+                results["rerun_calls"] = client.metrics.requests
+    finally:
+        # The cache's connections stay open until the process ends.
+        shutil.rmtree(folder, ignore_errors=True)
+    return results
+
+
+def unsettled_years(start, end):
+    """Return how many of the years from start through end have totals
+    that the programs search for rather than read from the table."""
+    version, table = totals.read_table()
+    last_settled = totals.settled(version)
+    return sum(
+        1 for yr in range(start, end + 1)
+        if yr not in table or yr > last_settled)
+
+
+def current_commit():
+    """Return the short hash of the current git commit, or None if
+    there is none."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+            text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def workload_benchmark(names, modes, latency=0.0, jitter=0.0,
+                       rate_limited=0.0, errors=0.0, seed=0, rate=1000,
+                       history=False, history_lifetime=None):
+    """Run the named workloads in each mode, and also with history server
+    sessions if asked, against a stand-in server and return the
+    results, ready to be written as JSON."""
+    parents = {}
+    for preset in WORKLOADS.values():
+        parents.update(preset.parents or {})
+    start, end = WORKLOAD_YEARS
+    settings = {
+        "user_mesh": WORKLOAD_MESH, "start_year": start, "end_year": end,
+        "latency": latency, "jitter": jitter, "rate_limited": rate_limited,
+        "errors": errors, "seed": seed, "rate": rate,
+        "concurrency": eutils.CONCURRENCY,
+        "history_lifetime": history_lifetime}
+    results = []
+    server = MockServer(
+        Corpus(parents, seed), latency, jitter, rate_limited, errors, seed,
+        history_lifetime=history_lifetime)
+    runs = [(mode, False) for mode in modes]
+    if history:
+        runs += [(mode, True) for mode in modes]
+    with server:
+        for name in names:
+            job = engine.Job(WORKLOAD_MESH, WORKLOADS[name], start, end)
+            # The searches the programs used to send: one per cell, and
+                # one per year whose total is not in the table.
+            searches = len(engine.plan(job)) + unsettled_years(start, end)
+            for mode, uses_history in runs:
+                calls, received = server.calls, server.received
+                with ProcessPoolExecutor(
+                        1, multiprocessing.get_context("spawn")) as executor:
+                    measured = executor.submit(
+                        measure, job, mode, server.url, rate,
+                        uses_history).result()
+                calls, received = (
+                    server.calls - calls, server.received - received)
+                results.append({
+                    "workload": name,
+                    "mode": f"{mode}+history" if uses_history else mode,
+                    "cells": len(engine.plan(job)),
+                    "bytes_per_call": received / calls if calls else None,
+                    "calls_saved": searches - (
+                        measured["calls"] - measured["retries"]),
+                    **measured})
+    return {
+        "label": current_commit(),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": settings,
+        "results": results}
+
+
+def compare(old, new):
+    """Return a line for each workload and mode in both sets of results,
+    with the old and new time, calls, and memory and their ratios."""
+    before = {(r["workload"], r["mode"]): r for r in old["results"]}
+    lines = []
+    for result in new["results"]:
+        key = (result["workload"], result["mode"])
+        if key not in before:
+            continue
+        cells = []
+        for field in ["wall_seconds", "calls", "peak_memory_bytes"]:
+            a, b = before[key][field], result[field]
+            if a is None or b is None:
+                cells.append(f"{'':>32}")
+                continue
+            ratio = b / a if a else float("inf") if b else 1.0
+            cells.append(f"{a:>12.6g}{b:>12.6g}{ratio:>8.2f}")
+        lines.append(f"{key[0]:<22}{key[1]:<17}" + "".join(cells))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure parts of the programs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    parse = commands.add_parser(
+        "parse", help="compare the ways of retrieving a count")
+    parse.add_argument(
+        "--repeat", type=int, default=1000,
+        help="parses to time for each case (default: 1000)")
+    parse.add_argument(
+        "--live", action="store_true",
+        help="use responses from the E-utilities instead of samples")
+    workloads = commands.add_parser(
+        "workloads", help="run the programs' jobs against a local server")
+    workloads.add_argument(
+        "--workloads", nargs="+", choices=list(WORKLOADS),
+        default=list(WORKLOADS), help="programs to run (default: all)")
+    workloads.add_argument(
+        "--modes", nargs="+", choices=WORKLOAD_MODES, default=["esearch"],
+        help="modes to run each program in (default: esearch)")
+    workloads.add_argument(
+        "--latency", type=float, default=0.01,
+        help="seconds each response takes (default: 0.01)")
+    workloads.add_argument(
+        "--jitter", type=float, default=0.005,
+        help="seconds the latency varies either way (default: 0.005)")
+    workloads.add_argument(
+        "--rate-limited", type=float, default=0.0,
+        help="fraction of requests that get a 429 (default: 0)")
+    workloads.add_argument(
+        "--errors", type=float, default=0.0,
+        help="fraction of requests that get a 500 (default: 0)")
+    workloads.add_argument("--seed", type=int, default=0)
+    workloads.add_argument(
+        "--history", action="store_true",
+        help="also run each mode with history server sessions")
+    workloads.add_argument(
+        "--history-lifetime", type=float, default=None,
+        help="seconds a history server session lasts (default: no limit)")
+    workloads.add_argument(
+        "--rate", type=float, default=1000,
+        help="requests per second the client may send (default: 1000)")
+    workloads.add_argument(
+        "--label", default=None,
+        help="label for the results (default: the current git commit)")
+    workloads.add_argument(
+        "--output", default="benchmark.json",
+        help="JSON file for the results (default: benchmark.json)")
+    compare_parser = commands.add_parser(
+        "compare", help="compare two JSON files of results")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    args = parser.parse_args()
+    if args.command == "workloads":
+        report = workload_benchmark(
+            args.workloads, args.modes, args.latency, args.jitter,
+            args.rate_limited, args.errors, args.seed, args.rate,
+            args.history, args.history_lifetime)
+        report["label"] = args.label or report["label"]
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+        print(f"{'workload':<22}{'mode':<17}{'seconds':>9}{'calls':>8}"
+              f"{'saved':>8}{'rerun':>7}{'B/call':>8}{'peak MB':>9}")
+        for r in report["results"]:
+            print(f"{r['workload']:<22}{r['mode']:<17}"
+                  f"{r['wall_seconds']:>9.2f}{r['calls']:>8}"
+                  f"{r['calls_saved']:>8}{r['rerun_calls']:>7}"
+                  f"{r['bytes_per_call'] or 0:>8.0f}"
+                  f"{(r['peak_memory_bytes'] or 0) / 1e6:>9.1f}")
+    elif args.command == "compare":
+        reports = []
+        for path in [args.old, args.new]:
+            with open(path, encoding="utf-8") as f:
+                reports.append(json.load(f))
+        print(f"{reports[0]['label']} -> {reports[1]['label']}")
+        print(f"{'workload':<22}{'mode':<17}"
+              + "".join(f"{name:>32}" for name in [
+                  "seconds (old, new, ratio)", "calls (old, new, ratio)",
+                  "peak bytes (old, new, ratio)"]))
+        for line in compare(*reports):
+            print(line)
+    elif args.command == "parse":
+        full, count_only = (
+            live_responses() if args.live else sample_responses())
+        print(f"{'case':<38}{'bytes':>8}{'us/call':>10}")
+        for name, size, micros in parse_benchmark(
+                full, count_only, args.repeat):
+            print(f"{name:<38}{size:>8}{micros:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
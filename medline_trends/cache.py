@@ -0,0 +1,149 @@
+"""
+SUMMARY: This module keeps the esearch counts the programs retrieve,
+    and any lists of PMIDs they harvest, in a SQLite database so that
+    running a program again, or running a program that shares searches
+    with one that already ran, does not send those searches again.
+    Counts for years that are settled are kept for good. Counts for the
+    last few years, which keep growing as indexing catches up, expire
+    after a short time. Several programs can use the same database at
+    once.
+"""
+
+# The datetime module is used to tell which years are still settling.
+from datetime import date
+# The os module is used to find and create the folder for the database.
+import os
+# The re module is used to find the publication years in a search.
+import re
+# The sqlite3 module stores the counts.
+import sqlite3
+# The threading module is used to give each thread its own connection.
+import threading
+# The time module is used to record when each count was retrieved.
+import time
+
+# Where the database is kept unless a path is given or the
+    # MEDLINE_TRENDS_CACHE environment variable is set.
+DEFAULT_PATH = os.path.join(
+    os.path.expanduser("~"), ".medline-trends", "esearch.sqlite")
+
+# How many of the most recent years are still settling. Counts for these
+    # years (and for searches without a year) expire after TTL seconds.
+SETTLING_YEARS = 3
+TTL = 7 * 24 * 60 * 60
+
+# Publication date clauses such as "2020[pdat]", "1966:2022[pdat]", or
+    # "2020/01/01:2020/06/30[pdat]".
+_PDAT = re.compile(
+    r"(\d{4})(?:/\d{2}){0,2}(?::(\d{4})(?:/\d{2}){0,2})?\[pdat\]",
+    re.IGNORECASE)
+
+
+def normalize(query):
+    """Return the form of a search that is used as its key. Case and
+    spacing are ignored, and the parts of a search that only joins
+    clauses with AND are put in order, so that "A AND B" and "B AND A"
+    share a key."""
+    query = " ".join(query.split()).lower()
+    parts = query.split(" and ")
+    if any(
+            "(" in part or " or " in part or " not " in part
+            for part in parts):
+        return query
+    return " and ".join(sorted(parts))
+
+
+def latest_year(query):
+    """Return the latest publication year a search covers, or None if it
+    is not limited by year."""
+    years = [
+        int(end or start) for start, end in _PDAT.findall(query)]
+    return max(years) if years else None
+
+
+class CountCache:
+    """A SQLite cache of esearch counts, keyed by the normalized
+    search."""
+
+    def __init__(
+            self, path=None, settling_years=SETTLING_YEARS, ttl=TTL):
+        self.path = (
+            path or os.environ.get("MEDLINE_TRENDS_CACHE") or DEFAULT_PATH)
+        self.settling_years = settling_years
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.local = threading.local()
+        folder = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(folder, exist_ok=True)
+        with self.connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS counts ("
+                "term TEXT PRIMARY KEY, count INTEGER NOT NULL, "
+                "fetched REAL NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS id_lists ("
+                "term TEXT PRIMARY KEY, ids BLOB NOT NULL, "
+                "fetched REAL NOT NULL)")
+
+    def connection(self):
+        """Return this thread's connection, opening it if needed. The
+        database uses write-ahead logging so that readers in other
+        programs are not blocked by a writer."""
+        if not hasattr(self.local, "conn"):
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return self.local.conn
+
+    def expires(self, query, fetched):
+        """Return when a count retrieved at `fetched` stops being good,
+        or None if it never does. Whether its years had settled is
+        judged as of when it was retrieved, not as of today, so a count
+        retrieved while its years were still settling always expires."""
+        year = latest_year(query)
+        if year is not None:
+            retrieved = date.fromtimestamp(fetched).year
+            if year <= retrieved - self.settling_years:
+                return None
+        return fetched + self.ttl
+
+    def _get(self, table, column, query):
+        """Return the cached value for a search from a table, or None if
+        there is no value or it has expired."""
+        row = self.connection().execute(
+            f"SELECT {column}, fetched FROM {table} WHERE term = ?",
+            (normalize(query),)).fetchone()
+        if row is not None:
+            expires = self.expires(query, row[1])
+            if expires is None or expires > time.time():
+                self.hits += 1
+                return row[0]
+        self.misses += 1
+        return None
+
+    def _put(self, table, query, value):
+        """Store the value for a search in a table."""
+        with self.connection() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {table} VALUES (?, ?, ?)",
+                (normalize(query), value, time.time()))
+
+    def get(self, query):
+        """Return the cached count for a search, or None if there is no
+        count or it has expired."""
+        return self._get("counts", "count", query)
+
+    def put(self, query, count):
+        """Store the count for a search."""
+        self._put("counts", query, count)
+
+    def get_ids(self, query):
+        """Return the cached PMIDs for a search as bytes, or None if
+        there are none or they have expired."""
+        return self._get("id_lists", "ids", query)
+
+    def put_ids(self, query, ids):
+        """Store the PMIDs for a search as bytes."""
+        self._put("id_lists", query, ids)
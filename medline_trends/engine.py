@@ -0,0 +1,486 @@
+"""
+SUMMARY: This module is the intersection engine that every
+    mesh-intersections program runs on. A job names a user-selected
+    MeSH, a preset (a list of MeSH to intersect it with, along with how
+    to label the results), and a range of years. The engine turns the
+    job into a plan of (term, year) cells, sends one esearch per cell
+    through the E-utilities client in medline_trends.eutils, and turns
+    the counts it gets back into the rows that go into the CSV file.
+    The rows come out as the counts come back (see stream()), and the
+    CSV file is written a row at a time, so it fills in as a run goes.
+    If the MEDLINE_TRENDS_MESH environment variable is set to the path
+    of a MeSH descriptor file (see medline_trends.mesh), the cells from
+    before a MeSH was applied are given a count of zero without being
+    searched for.
+"""
+
+# The collections module is used to define small record types for jobs,
+    # presets, and cells.
+from collections import namedtuple
+# The datetime module is used to establish a default end year and to
+    # create a filename for the CSV file.
+from datetime import date
+# The os module is used to build the path of the CSV file.
+import os
+# The urllib.parse module escapes MeSH for the folders of a dataset.
+from urllib.parse import quote
+# The warnings module is used to report the cells that failed.
+import warnings
+
+# The E-utilities client sends the searches, and the totals module
+    # supplies the yearly totals. The spans and groups modules are the
+    # "spans" and "groups" modes, and the sinks module writes the CSV
+    # file.
+from medline_trends import eutils, groups, sinks, spans, totals
+
+# A preset is a list of MeSH to intersect with the user-selected MeSH.
+    # "name" starts the CSV filename and "column" is the name of the
+    # CSV field that holds the MeSH from the list. A preset without a
+    # name or column is a plain comparison of two MeSH (see pair()).
+    # "parents" maps terms to the term in the list they sit under, if
+    # any; a "[mh]" search for a term can only find citations that a
+    # search for the term above it also finds. "rule" is a list of
+    # mesh.Subtree rules that select the terms from a MeSH descriptor
+    # file, if one is available.
+Preset = namedtuple(
+    "Preset", ["name", "column", "terms", "parents", "rule"],
+    defaults=[None, None])
+
+# A job is everything needed to produce one CSV file.
+Job = namedtuple("Job", ["user_mesh", "preset", "start_year", "end_year"])
+
+# A cell is one unit of work: the intersection of the user-selected
+    # MeSH with one term from the preset for one publication year.
+Cell = namedtuple("Cell", ["term", "year"])
+
+
+def pair(mesh):
+    """Return a preset that intersects the user-selected MeSH with a
+    single other MeSH."""
+    return Preset(None, None, [mesh])
+
+
+def default_end_year(today=None):
+    """Return the most recently completed year that has been over for
+    at least three months."""
+    today = today or date.today()
+    if today.month >= 4:
+        return today.year - 1
+    return today.year - 2
+
+
+def mesh_clause(mesh):
+    """Return the search term for the citations tagged with a MeSH."""
+    return f"\"{mesh}\"[mh]"
+
+
+def intersection_query(user_mesh, cell):
+    """Return the search term for the citations from the cell's year
+    that are tagged with both the cell's term and the user's MeSH."""
+    return " AND ".join([
+        mesh_clause(cell.term), mesh_clause(user_mesh),
+        totals.year_query(cell.year)])
+
+
+def plan(job):
+    """Return the cells for a job, term by term and year by year."""
+    return [
+        Cell(term, yr)
+        for term in job.preset.terms
+        for yr in range(job.start_year, job.end_year + 1)]
+
+
+def unapplied(job, cells, first_years):
+    """Return the cells from before the cell's term or the user's MeSH
+    was first applied, which can only have a count of zero."""
+    user_first = first_years.get(job.user_mesh, 0)
+    return [
+        cell for cell in cells
+        if cell.year < max(user_first, first_years.get(cell.term, 0))]
+
+
+def waves(terms, parents):
+    """Return the terms in waves: the terms with no parent, then the
+    terms under those, and so on."""
+    depth = {}
+
+    def find(term):
+        if term not in depth:
+            parent = parents.get(term)
+            depth[term] = 0 if parent is None else find(parent) + 1
+        return depth[term]
+
+    for term in terms:
+        find(term)
+    return [
+        [term for term in terms if depth[term] == level]
+        for level in range(max(depth.values(), default=-1) + 1)]
+
+
+def resolve(preset, tree):
+    """Return a preset with the terms its rule selects from a Tree
+    (see medline_trends.mesh), or the preset as it is if it has no rule
+    or there is no Tree."""
+    if tree is None or not preset.rule:
+        return preset
+    return preset._replace(terms=tree.select(preset.rule))
+
+
+def make_row(job, cell, count, total):
+    """Return the CSV row for a cell."""
+    per_1k = round(count / total * 1000, 4)
+    if job.preset.column is None:
+        return {
+            "publication_year": cell.year,
+            "intersecting_citations": count,
+            "total_citations": total,
+            "intersecting_citations_per_1k": per_1k}
+    return {
+        job.preset.column: cell.term,
+        "year": cell.year,
+        "intersecting_citations": count,
+        "intersecting_citations_per_1k": per_1k,
+        "total_medline_citations": total}
+
+
+def esearch_counts(job, cells, client):
+    """Yield (cell, count) for each cell as its count comes back, asking
+    the server for the size of each intersection. Cells whose search
+    fails are left out."""
+    queries = {}
+    for cell in cells:
+        queries.setdefault(
+            intersection_query(job.user_mesh, cell), []).append(cell)
+    for query, count in client.counts(list(queries)):
+        for cell in queries[query]:
+            yield cell, count
+
+
+def pmid_counts(job, cells, client):
+    """Yield (cell, count) for each cell by harvesting PMID lists and
+    intersecting them locally (see medline_trends.pmids). The counts
+    for a term come back together once its list is harvested. Cells
+    whose harvest fails are left out."""
+    # Imported here so that numpy is only needed in this mode.
+    from medline_trends import pmids
+    if not cells:
+        return
+    years = sorted({cell.year for cell in cells})
+    terms = {mesh_clause(cell.term): cell.term for cell in cells}
+    wanted = set(cells)
+    for (clause, yr), count in pmids.cell_counts(
+            mesh_clause(job.user_mesh), list(terms), years, client):
+        cell = Cell(terms[clause], yr)
+        if cell in wanted:
+            yield cell, count
+
+
+def span_counts(job, cells, client):
+    """Yield (cell, count) for each cell by asking for the size of each
+    intersection over spans of years and splitting the spans whose
+    count is not zero (see medline_trends.spans). The counts for a term
+    come back together once its spans are done. Cells whose search
+    fails are left out."""
+    terms, term_years = {}, {}
+    for cell in cells:
+        clause = mesh_clause(cell.term)
+        terms[clause] = cell.term
+        term_years.setdefault(clause, []).append(cell.year)
+    for (clause, yr), count in spans.cell_counts(
+            mesh_clause(job.user_mesh), term_years, client):
+        yield Cell(terms[clause], yr), count
+
+
+def group_counts(job, cells, client):
+    """Yield (cell, count) for each cell by asking for the size of the
+    intersection with a group of terms at once and splitting the groups
+    whose count is not zero (see medline_trends.groups). The counts for
+    a year come back together once its groups are done. Cells whose
+    search fails are left out."""
+    terms, year_terms = {}, {}
+    for cell in cells:
+        clause = mesh_clause(cell.term)
+        terms[clause] = cell.term
+        year_terms.setdefault(cell.year, []).append(clause)
+    for (clause, yr), count in groups.cell_counts(
+            mesh_clause(job.user_mesh), year_terms, client):
+        yield Cell(terms[clause], yr), count
+
+
+# The ways the engine can get the count for each cell.
+MODES = {
+    "esearch": esearch_counts, "pmids": pmid_counts, "spans": span_counts,
+    "groups": group_counts}
+
+
+def failure_reason(job, cell, errors):
+    """Return the error for a failed cell from the client's failures,
+    which are kept by search (or, in the pmids and spans modes, by MeSH
+    clause, and in the groups mode, by year)."""
+    return (
+        errors.get(intersection_query(job.user_mesh, cell))
+        or errors.get(mesh_clause(cell.term))
+        or errors.get(cell.year)
+        or "No count came back")
+
+
+def stream(job, client=None, mode="esearch", journal=None,
+           descriptors=None, year_totals=None):
+    """Run a job and yield its rows in plan order, each as soon as its
+    count and the counts of the rows before it have come back. The mode
+    is one of the keys of MODES; a local client (see
+    medline_trends.baseline) only runs in the "esearch" mode, and
+    ValueError is raised for any other. If a MeSH descriptor file is given (or
+    named by the MEDLINE_TRENDS_MESH environment variable), a preset
+    with a rule takes its terms from the file, and the cells from
+    before a MeSH was applied are counted as zero without a search. If
+    a journal (see medline_trends.journal) is given, the cells it
+    already has are not searched for again (unless its run finished,
+    in which case it starts over), each new count is added to it as
+    soon as it comes back, and the cells that still fail are added to
+    its ledger of failures. The yearly totals are loaded
+    unless they are given, as a dictionary by year (see batch()). The
+    rows leave out failed cells, and the cells of years whose totals
+    could not be retrieved, and a warning says how many there were."""
+    client = client or eutils.EutilsClient()
+    # The other modes send their searches through the client's map(),
+        # which only a client of a server has (see
+        # baseline.LocalClient).
+    if mode != "esearch" and not hasattr(client, "map"):
+        raise ValueError(
+            f"A {type(client).__name__} can only be run in the esearch "
+            f"mode, not the {mode} mode")
+    # Every search of the job has the user-selected MeSH in it, so a
+        # client that uses the history server keeps it there.
+    if hasattr(client, "use_history"):
+        client.use_history(mesh_clause(job.user_mesh))
+    descriptors = descriptors or os.environ.get("MEDLINE_TRENDS_MESH")
+    tree = None
+    if descriptors:
+        # Imported here so that the descriptor file is only read when
+            # there is one.
+        from medline_trends import mesh
+        tree = mesh.load(descriptors)
+        job = job._replace(preset=resolve(job.preset, tree))
+    if year_totals is None:
+        year_totals = totals.load(
+            range(job.start_year, job.end_year + 1), client)
+    # Skip the years whose totals could not be retrieved, since there is
+        # nothing to divide their counts by; their cells are reported as
+        # failed.
+    cells = [cell for cell in plan(job) if cell.year in year_totals]
+    untotalled = [cell for cell in plan(job) if cell.year not in year_totals]
+    # A journal whose run finished is started over, so that a run long
+        # after it searches again for the years that were still settling.
+    if journal is not None and journal.finished():
+        journal.restart()
+    counts = journal.read() if journal is not None else {}
+    parents = job.preset.parents or {}
+    zeros = []
+    if tree is not None:
+        first_years = tree.first_years(
+            [job.user_mesh] + list(job.preset.terms))
+        zeros = unapplied(job, cells, first_years)
+        # The hierarchy in the file is the authority on which terms sit
+            # under which.
+        parents = tree.parents(job.preset.terms)
+    # A term under a term with a count of zero is only zero too if a
+        # search for the term above covers the terms below it, which it
+        # does not for a client that does not explode "[mh]".
+    if not getattr(client, "explodes", False):
+        parents = {}
+    todo = [cell for cell in cells if cell not in counts]
+    # The position in the plan of the first row not yet yielded.
+    position = 0
+    # Clients that talk to a server keep track of the progress of a run
+        # and report it while the run goes.
+    metrics = getattr(client, "metrics", None)
+    if metrics is not None:
+        metrics.add_cells(len(cells), len(cells) - len(todo))
+        metrics.start()
+
+    def record(cell, count):
+        counts[cell] = count
+        if journal is not None:
+            journal.write(cell, count)
+        if metrics is not None:
+            metrics.cell_done()
+
+    def ready():
+        """Return the rows whose counts, and the counts of every row
+        before them, have come back and that have not been yielded."""
+        nonlocal position
+        rows = []
+        while position < len(cells) and cells[position] in counts:
+            cell = cells[position]
+            rows.append(
+                make_row(job, cell, counts[cell], year_totals[cell.year]))
+            position += 1
+        return rows
+
+    try:
+        if journal is not None:
+            journal.start(job)
+        # The journal gets the zeros that were not searched for too, so
+            # that it holds every cell.
+        for cell in zeros:
+            if cell not in counts:
+                record(cell, 0)
+        yield from ready()
+        # Search for the terms higher in the hierarchy first. A cell
+            # whose parent has a count of zero that year is zero too.
+        for wave in waves(job.preset.terms, parents):
+            wave = set(wave)
+            searches = []
+            for cell in todo:
+                if cell.term not in wave or cell in counts:
+                    continue
+                parent = Cell(parents.get(cell.term), cell.year)
+                if counts.get(parent) == 0:
+                    record(cell, 0)
+                else:
+                    searches.append(cell)
+            yield from ready()
+            for cell, count in MODES[mode](job, searches, client):
+                record(cell, count)
+                yield from ready()
+        failed = [cell for cell in todo if cell not in counts]
+        if journal is not None:
+            errors = getattr(client, "failures", {})
+            for cell in failed:
+                journal.write_failure(cell, failure_reason(
+                    job, cell, errors))
+            for cell in untotalled:
+                journal.write_failure(cell, (
+                    f"No total of MEDLINE-indexed citations came back "
+                    f"for {cell.year}"))
+            if not failed and not untotalled:
+                journal.finish()
+    finally:
+        if journal is not None:
+            journal.close()
+        if metrics is not None:
+            metrics.stop()
+    # Past the first failed cell, the rest of the rows are ready.
+    for cell in cells[position:]:
+        if cell in counts:
+            yield make_row(job, cell, counts[cell], year_totals[cell.year])
+    retry = (
+        f"; to try them again, run python -m medline_trends.journal "
+        f"\"{journal.path}\" --refetch" if journal is not None else "")
+    if failed:
+        warnings.warn(
+            f"{len(failed)} of {len(cells)} cells could not be retrieved "
+            f"and were left out{retry}", RuntimeWarning, stacklevel=2)
+    if untotalled:
+        years = sorted({cell.year for cell in untotalled})
+        warnings.warn(
+            f"The yearly totals could not be retrieved for "
+            f"{', '.join(map(str, years))}, so {len(untotalled)} cells from "
+            f"those years were left out{retry}", RuntimeWarning, stacklevel=2)
+
+
+def run(job, client=None, mode="esearch", journal=None, descriptors=None,
+        year_totals=None):
+    """Run a job and return its rows in plan order (see stream())."""
+    return list(stream(
+        job, client, mode, journal, descriptors, year_totals))
+
+
+def unknown_mesh(names, client, tree=None):
+    """Return the names in a list that are not MeSH. With a Tree from a
+    MeSH descriptor file, the names are looked up in it; otherwise, a
+    name is unknown if a search for it finds nothing. Names whose
+    search fails are not judged."""
+    names = list(dict.fromkeys(names))
+    if tree is not None:
+        return [name for name in names if name.lower() not in tree.by_name]
+    clauses = {mesh_clause(name): name for name in names}
+    found = dict(client.counts(list(clauses)))
+    return [
+        name for clause, name in clauses.items()
+        if found.get(clause) == 0]
+
+
+def batch(jobs, path, client=None, mode="esearch", descriptors=None,
+          dataset=None):
+    """Run several jobs, such as every pairing of a few user-selected
+    MeSH with a few presets, and write the CSV file of each to the
+    given folder, keeping a journal of each there too. Given a dataset
+    folder, each job's rows are also written to a Parquet file in it
+    (see dataset_path()). The jobs share
+    one client, and so its connections, its rate limit, and its cache;
+    the MeSH tree; and the yearly totals, which are loaded once for all
+    the years of all the jobs. Return the names of the CSV files."""
+    # Imported here because the journal module imports this one.
+    from medline_trends import journal
+    client = client or eutils.EutilsClient()
+    years = sorted({
+        yr for job in jobs for yr in range(job.start_year, job.end_year + 1)})
+    year_totals = totals.load(years, client)
+    filenames = []
+    for job in jobs:
+        rows = stream(
+            job, client, mode, journal.for_job(job, path), descriptors,
+            year_totals)
+        write_csv(
+            rows, path, csv_filename(job),
+            dataset and dataset_path(job, dataset))
+        filenames.append(csv_filename(job))
+    return filenames
+
+
+def filename_mesh(mesh):
+    """Format a MeSH for a filename by making it lowercase and replacing
+    any spaces with hyphens."""
+    return mesh.replace(" ", "-").lower()
+
+
+def csv_filename(job, today=None):
+    """Return the name of the CSV file for a job."""
+    today = today or date.today()
+    if job.preset.name is None:
+        parts = [job.user_mesh] + list(job.preset.terms)
+    else:
+        parts = [job.preset.name, job.user_mesh]
+    return "".join([
+        "_".join(filename_mesh(part) for part in parts),
+        f"_{job.start_year}-{job.end_year}_",
+        today.strftime("%Y-%m-%d"), ".csv"])
+
+
+def dataset_path(job, root, today=None):
+    """Return the path of the Parquet file for a job in a dataset kept
+    in the given folder, partitioned by preset, user-selected MeSH,
+    and date of the run (see medline_trends.sinks)."""
+    today = today or date.today()
+    if job.preset.name is None:
+        preset = "_".join(filename_mesh(term) for term in job.preset.terms)
+    else:
+        preset = job.preset.name
+    return os.path.join(
+        root, f"preset={quote(preset, safe='')}",
+        f"user_mesh={quote(job.user_mesh, safe='')}",
+        f"run_date={today.isoformat()}",
+        f"{job.start_year}-{job.end_year}.parquet")
+
+
+def write_csv(rows, path, filename, dataset=None):
+    """Write rows to a CSV file in the given folder, each as soon as it
+    arrives (see medline_trends.sinks), and, given the path of a
+    Parquet file (see dataset_path()), to that file as well."""
+    # The Parquet file is opened first, so that a missing pyarrow stops
+        # the run before anything is searched for.
+    parquet = sinks.ParquetSink(dataset) if dataset else None
+    with sinks.CsvSink(os.path.join(path, filename)) as sink:
+        try:
+            for row in rows:
+                sink.write(row)
+                if parquet is not None:
+                    parquet.write(row)
+        except BaseException:
+            if parquet is not None:
+                parquet.discard()
+            raise
+    if parquet is not None:
+        parquet.close()
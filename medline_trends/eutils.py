@@ -0,0 +1,552 @@
+"""
+SUMMARY: This module is the E-utilities client that the engine sends
+    its searches through. It keeps several esearch requests in flight
+    at once and spaces them out with a token bucket so that the client
+    never goes over the NCBI rate limit. As described here,
+    https://www.ncbi.nlm.nih.gov/books/NBK25497/, the limit is 3
+    requests per second without an API key and 10 with one. Searches
+    for counts ask for the count only (rettype=count), and the response
+    is read by a small streaming parser instead of being built into a
+    tree. Requests that time out, fail to connect, come back with a 429
+    or 5xx status, or come back without a count are tried again after a
+    wait that grows with each try, up to a limit. Searches too long to
+    fit in a URL are sent with POST.
+
+HISTORY: A client made with history=True searches for a clause that
+    every search of a job shares, such as the user-selected MeSH (see
+    use_history()), once with usehistory=y, and NCBI keeps the result
+    in a session on its history server. Each search is then sent as
+    "#1 AND <the rest of the search>" with the session's WebEnv and
+    usehistory=y, without which esearch ignores the WebEnv, so the
+    request is shorter and the shared clause is not worked out again.
+    A session is replaced after an hour, or as soon as a search against
+    it fails or lists "#1" among its errors (PubMed counts the rest of
+    the search when it cannot find the session), since NCBI forgets
+    sessions that go unused. The cache still keeps the counts under the
+    full search.
+"""
+
+# The asyncio module is used to keep several requests in flight at once.
+import asyncio
+# The collections module is used to define a record type for count
+    # results.
+from collections import namedtuple
+# The contextvars module is used to share the limit on requests in
+    # flight, and the threads they run in, with every task of a run.
+import contextvars
+# The email.utils module reads Retry-After headers given as dates.
+from email.utils import parsedate_to_datetime
+# The concurrent.futures module provides the threads that the blocking
+    # GET requests run in.
+from concurrent.futures import ThreadPoolExecutor
+# The os module is used to read the optional API key, tool name, and
+    # email address from environment variables.
+import os
+# The queue module is used to hand counts from the event loop back to
+    # the code that asked for them as soon as they arrive, and to keep
+    # the pool of sessions.
+import queue
+# The random module adds jitter to the waits between tries.
+import random
+# The threading module is used to run the event loop in the background
+    # and to share rate limits between threads.
+import threading
+# The time module is used to keep track of when tokens are added to the
+    # bucket.
+import time
+# The urllib.parse module is used to measure the query string.
+from urllib.parse import urlencode
+# The warnings module is used to report the errors and warnings that
+    # come back with a count.
+import warnings
+# The xml.etree module reads the count responses as a stream.
+from xml.etree import ElementTree
+
+# The requests module is used to send the GET requests.
+import requests
+# The HTTPAdapter class is used to keep one connection open for each
+    # request in flight.
+from requests.adapters import HTTPAdapter
+
+# Counts that have already been retrieved are kept in a local cache.
+from medline_trends.cache import CountCache
+# The progress of a run is kept in its client's metrics.
+from medline_trends.metrics import Metrics
+
+# The esearch endpoint, as shown in the "Searching a Database" section
+    # of this guide: https://www.ncbi.nlm.nih.gov/books/NBK25500/
+ESEARCH_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
+
+# The number of requests per second NCBI allows without and with an API
+    # key.
+RATE = 3
+RATE_WITH_KEY = 10
+
+# The number of requests to keep in flight at once. This only needs to
+    # be high enough to cover the time each request takes to come back;
+    # the token bucket decides how fast they are sent.
+CONCURRENCY = 8
+
+# The longest query string sent with GET. Longer ones, such as searches
+    # that OR many MeSH together, are sent with POST, as the E-utilities
+    # documentation recommends.
+MAX_GET = 2000
+
+# How long to wait for a connection and for a response, in seconds.
+TIMEOUT = (10, 60)
+
+# How many times to try a request again after it fails, and the wait
+    # before the first retry and the longest wait, in seconds. Each
+    # wait is drawn at random from zero up to twice the one before, so
+    # that clients that failed together do not retry together.
+RETRIES = 5
+BACKOFF = 1
+MAX_BACKOFF = 60
+
+# The parameters that make esearch return the count and nothing else.
+COUNT_ONLY = {"rettype": "count", "retmax": 0}
+
+# The parameters that make esearch keep its result on the history server
+    # and return the count and the session, without any PMIDs.
+HISTORY = {"usehistory": "y", "retmax": 0}
+
+# How long a history server session is used before a new one is made,
+    # in seconds.
+HISTORY_LIFETIME = 3600
+
+# The result of a count search: the count (or None if there was none),
+    # and the messages in its ErrorList and WarningList, each as
+    # "<tag>: <text>", for example "PhraseNotFound: Physician".
+CountResult = namedtuple("CountResult", ["count", "errors", "warnings"])
+
+# A history server session: its WebEnv, the query key of the clause kept
+    # in it, and the time it was made.
+History = namedtuple("History", ["web_env", "query_key", "created"])
+
+# Marks the end of the results coming back from the event loop.
+_DONE = object()
+
+# The semaphore that limits the requests in flight and the threads that
+    # send them, for the run that the current task belongs to.
+_slots = contextvars.ContextVar("slots")
+_executor = contextvars.ContextVar("executor")
+
+# The lock that lets only one task of a run make a history server
+    # session at a time.
+_history_lock = contextvars.ContextVar("history_lock")
+
+
+class TransientError(Exception):
+    """Raised when a request fails in a way that may not happen again,
+    with how long the server asked us to wait, if it did."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def retry_after(response):
+    """Return the number of seconds a response's Retry-After header asks
+    for, or None if it has none."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0, when.timestamp() - time.time())
+
+
+def backoff(attempt, base=BACKOFF, cap=MAX_BACKOFF):
+    """Return how long to wait before retry number `attempt` (counting
+    from 0): a random time up to base * 2 ** attempt, capped."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class SearchWarning(UserWarning):
+    """Issued when an esearch response lists errors or warnings along
+    with its count."""
+
+
+def parse_count(text):
+    """Return a CountResult for the text of an esearch response. Only
+    the Count element and the lists of errors and warnings are read;
+    the parser keeps nothing else."""
+    parser = ElementTree.XMLPullParser(events=("start", "end"))
+    parser.feed(text)
+    parser.close()
+    count = None
+    errors, warned = [], []
+    lists = {"ErrorList": errors, "WarningList": warned}
+    current = None
+    for event, elem in parser.read_events():
+        if event == "start":
+            if elem.tag in lists:
+                current = lists[elem.tag]
+            continue
+        if elem.tag == "Count" and count is None:
+            count = int(elem.text)
+        elif elem.tag in lists:
+            current = None
+        elif current is not None:
+            current.append(f"{elem.tag}: {elem.text}")
+        elif elem.tag == "ERROR":
+            # Requests that fail outright come back as a single ERROR
+                # element.
+            errors.append(f"ERROR: {elem.text}")
+        elem.clear()
+    return CountResult(count, errors, warned)
+
+
+def parse_history(text):
+    """Return the WebEnv and query key in the text of an esearch response
+    to a search sent with usehistory=y, or None for each that is not
+    there."""
+    parser = ElementTree.XMLPullParser(events=("end",))
+    parser.feed(text)
+    parser.close()
+    found = {"WebEnv": None, "QueryKey": None}
+    for _, elem in parser.read_events():
+        if elem.tag in found and found[elem.tag] is None:
+            found[elem.tag] = elem.text
+        elem.clear()
+    return found["WebEnv"], found["QueryKey"]
+
+
+def history_query(query, clause, query_key):
+    """Return a search with one of its AND parts, the clause, replaced by
+    a reference to the query key of a history server session."""
+    parts = query.split(" AND ")
+    parts.remove(clause)
+    return " AND ".join([f"#{query_key}"] + parts)
+
+
+def lost_history(result, query_key):
+    """Return whether a search against a history server session could
+    not find the session's query key. PubMed then counts the rest of
+    the search, and lists the reference as a phrase it did not find,
+    or sends only an error, so the count is not the search's."""
+    reference = f"#{query_key}"
+    return result.count is None or any(
+        reference in message.split() for message in result.errors)
+
+
+class TokenBucket:
+    """A token bucket that hands out one token per request. Tokens are
+    added at a steady rate up to a capacity, so requests can never go
+    out faster than the rate allows. Requests that find the bucket empty
+    reserve the next token and wait for it, which keeps them in the
+    order they arrived in. The bucket can be shared by threads and
+    event loops."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token and return how many seconds to wait before it
+        can be used."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity,
+                self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(0, -self.tokens / self.rate)
+
+    def hold(self, seconds):
+        """Make every request wait at least this many seconds, as when
+        the server answers with a Retry-After header."""
+        with self.lock:
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+    async def acquire(self):
+        """Wait until a token can be used."""
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+# The token buckets in use, by API key. NCBI counts requests against the
+    # key (or against the computer, without one), so every client with
+    # the same key shares one bucket.
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def shared_bucket(api_key=None, rate=None):
+    """Return the token bucket shared by every client with this API
+    key. A rate that is given must be the rate of the key's bucket, if
+    it has one; otherwise, ValueError is raised, since NCBI allows a
+    key one rate however many clients use it."""
+    with _buckets_lock:
+        bucket = _buckets.get(api_key)
+        if bucket is None:
+            bucket = _buckets[api_key] = TokenBucket(
+                rate or (RATE_WITH_KEY if api_key else RATE))
+        elif rate is not None and rate != bucket.rate:
+            raise ValueError(
+                f"The clients of this API key send {bucket.rate} requests "
+                f"per second, not {rate}")
+        return bucket
+
+
+class EutilsClient:
+    """A client for esearch that keeps several requests in flight under
+    a shared rate limit. The API key, tool name, and email address are
+    optional. If they are not given, they are read from the
+    NCBI_API_KEY, NCBI_TOOL, and NCBI_EMAIL environment variables.
+    Counts are looked up in the cache before any request is sent; pass
+    cache=False to always send the request. A client of a server other
+    than NCBI's does not use the shared cache. The items that still failed
+    after every retry are kept in `failures`, with the error for
+    each. The progress of its runs is kept in `metrics` (see
+    medline_trends.metrics). With history=True, the clauses passed to
+    use_history() are kept on the NCBI history server (see HISTORY
+    above)."""
+
+    # PubMed explodes "[mh]" searches: a search for a MeSH also finds the
+        # citations tagged with the MeSH below it.
+    explodes = True
+
+    def __init__(
+            self, api_key=None, tool=None, email=None, rate=None,
+            concurrency=CONCURRENCY, url=ESEARCH_URL, cache=True,
+            timeout=TIMEOUT, retries=RETRIES, metrics=None, history=False):
+        self.api_key = api_key or os.environ.get("NCBI_API_KEY")
+        self.tool = tool or os.environ.get("NCBI_TOOL")
+        self.email = email or os.environ.get("NCBI_EMAIL")
+        self.bucket = shared_bucket(self.api_key, rate)
+        self.concurrency = concurrency
+        self.url = url
+        self.timeout = timeout
+        self.retries = retries
+        self.retried = 0
+        self.failures = {}
+        self.sessions = queue.SimpleQueue()
+        self.metrics = metrics or Metrics()
+        self.history = history
+        self.history_clauses = set()
+        self.histories = {}
+        # The shared cache holds PubMed's counts, and its keys are the
+            # searches alone, so a client of any other server (such as a
+            # stand-in, see medline_trends/mockserver.py) gets none
+            # unless it is given its own.
+        if cache is True:
+            cache = CountCache() if url == ESEARCH_URL else None
+        self.cache = cache or None
+
+    def params(self, query, **extra):
+        """Return the query string parameters for a search."""
+        params = {"db": "pubmed", "term": query, **extra}
+        for name in ["api_key", "tool", "email"]:
+            if getattr(self, name):
+                params[name] = getattr(self, name)
+        return params
+
+    def session(self):
+        """Take a free session from the client's pool, creating one if
+        there is none. Hand it back with self.sessions.put() when done.
+        The pool outlives the threads of each run, so the connections in
+        it are reused by every run of the client."""
+        try:
+            return self.sessions.get_nowait()
+        except queue.Empty:
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(pool_maxsize=1))
+            session.mount("http://", HTTPAdapter(pool_maxsize=1))
+            return session
+
+    def get(self, params):
+        """Send one request and return the text of the response. It is a
+        GET request unless the query string is longer than MAX_GET. This
+        blocks, so the event loop runs it in a thread."""
+        session = self.session()
+        started = time.monotonic()
+        try:
+            if len(urlencode(params)) > MAX_GET:
+                response = session.post(
+                    self.url, data=params, timeout=self.timeout)
+            else:
+                response = session.get(
+                    self.url, params=params, timeout=self.timeout)
+        except (requests.ConnectionError, requests.Timeout) as error:
+            self.metrics.request(time.monotonic() - started, ok=False)
+            raise TransientError(str(error)) from error
+        finally:
+            self.sessions.put(session)
+        self.metrics.request(time.monotonic() - started, response.ok)
+        if response.status_code == 429 or response.status_code >= 500:
+            raise TransientError(
+                f"HTTP {response.status_code}", retry_after(response))
+        response.raise_for_status()
+        return response.text
+
+    async def send(self, params):
+        """Wait for a free slot and a token, then send one request and
+        return the text of the response."""
+        async with _slots.get():
+            await self.bucket.acquire()
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                _executor.get(), self.get, params)
+
+    async def retrying(self, fn):
+        """Await fn() and return its result, trying again after a
+        TransientError up to `retries` times."""
+        for attempt in range(self.retries + 1):
+            try:
+                return await fn()
+            except TransientError as error:
+                if attempt == self.retries:
+                    raise
+                if error.retry_after:
+                    self.bucket.hold(error.retry_after)
+                self.retried += 1
+                self.metrics.retry()
+                await asyncio.sleep(backoff(attempt))
+
+    async def search(self, query, **extra):
+        """Send one search and return the text of the response. Extra
+        keyword arguments are added to the query string."""
+        params = self.params(query, **extra)
+        return await self.retrying(lambda: self.send(params))
+
+    def use_history(self, clause):
+        """Send the searches that have the clause as one of their AND
+        parts against a history server session that holds it, if the
+        client uses the history server."""
+        if self.history:
+            self.history_clauses.add(clause)
+
+    async def history_for(self, clause):
+        """Return the History that holds a clause, searching for the
+        clause with usehistory=y if there is none yet or it is more than
+        HISTORY_LIFETIME seconds old."""
+        async with _history_lock.get():
+            history = self.histories.get(clause)
+            if history is None or (
+                    time.time() - history.created > HISTORY_LIFETIME):
+                web_env, query_key = parse_history(
+                    await self.send(self.params(clause, **HISTORY)))
+                if web_env is None or query_key is None:
+                    raise TransientError(
+                        f"No history server session for {clause}")
+                history = self.histories[clause] = History(
+                    web_env, query_key, time.time())
+            return history
+
+    async def fetch_count(self, query):
+        """Send one count-only search and return its CountResult. A
+        response that cannot be read or has no count is a
+        TransientError, since NCBI sends those when its search backend
+        is busy. A search against a history server session that comes
+        back without a count, or with its query key among its errors, is
+        sent again at once with a new session, since the session may
+        have expired; its count is never returned."""
+        clause = next((
+            part for part in query.split(" AND ")
+            if part in self.history_clauses), None)
+        for renewed in [False, True]:
+            params = self.params(query, **COUNT_ONLY)
+            if clause is not None:
+                history = await self.history_for(clause)
+                # esearch only looks up the WebEnv of a search sent with
+                    # usehistory=y.
+                params = self.params(
+                    history_query(query, clause, history.query_key),
+                    WebEnv=history.web_env, usehistory="y", **COUNT_ONLY)
+            text = await self.send(params)
+            try:
+                result = parse_count(text)
+            except ElementTree.ParseError as error:
+                raise TransientError(
+                    f"Unreadable response: {error}") from error
+            if clause is None:
+                if result.count is not None:
+                    return result
+                break
+            if not lost_history(result, history.query_key):
+                return result
+            if self.histories.get(clause) == history:
+                del self.histories[clause]
+            if renewed:
+                break
+        raise TransientError(f"No count: {'; '.join(result.errors)}")
+
+    async def count(self, query):
+        """Return the count for a search from the cache or, if it is not
+        there, send the search and cache its count."""
+        if self.cache is not None:
+            count = self.cache.get(query)
+            self.metrics.cache_hit(count is not None)
+            if count is not None:
+                return count
+        result = await self.retrying(lambda: self.fetch_count(query))
+        # PubMed leaves out the parts of a search it cannot match and
+            # counts the rest, so these are worth seeing. "No items
+            # found." only says that the count is zero.
+        messages = result.errors + [
+            message for message in result.warnings
+            if message != "OutputMessage: No items found."]
+        if messages:
+            warnings.warn(
+                f"{query}: {'; '.join(messages)}", SearchWarning,
+                stacklevel=2)
+        count = result.count
+        if self.cache is not None:
+            self.cache.put(query, count)
+        return count
+
+    async def _run(self, fn, items, put):
+        """Await fn(item) for each item and pass (item, result) to put()
+        as each one comes back. At most `concurrency` requests are in
+        flight at a time. Items that fail are skipped, and their errors
+        are kept in `failures`."""
+        _slots.set(asyncio.Semaphore(self.concurrency))
+        _history_lock.set(asyncio.Lock())
+
+        async def one(item):
+            try:
+                result = await fn(item)
+            except Exception as error:
+                self.failures[item] = f"{type(error).__name__}: {error}"
+                return
+            self.failures.pop(item, None)
+            put((item, result))
+
+        try:
+            with ThreadPoolExecutor(self.concurrency) as executor:
+                _executor.set(executor)
+                await asyncio.gather(*[one(item) for item in items])
+        finally:
+            put(_DONE)
+
+    def map(self, fn, items):
+        """Yield (item, result) for each item as soon as the coroutine
+        function fn(item) returns, which may not be in the order given.
+        Items that fail are skipped."""
+        results = queue.Queue()
+        thread = threading.Thread(
+            target=asyncio.run, args=(self._run(fn, items, results.put),),
+            daemon=True)
+        thread.start()
+        while True:
+            item = results.get()
+            if item is _DONE:
+                break
+            yield item
+        thread.join()
+
+    def counts(self, queries):
+        """Yield (query, count) for each query as soon as its count comes
+        back, which may not be in the order given. Queries that fail are
+        skipped."""
+        return self.map(self.count, queries)
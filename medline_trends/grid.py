@@ -0,0 +1,250 @@
+"""
+SUMMARY: This module intersects a user-selected MeSH with more than one
+    list of MeSH at once, such as "Internship and Residency" with each
+    physician subset and each country: every cell of the grid is the
+    number of citations from a year tagged with the user-selected MeSH
+    and one term from each list. A grid has as many cells as the
+    product of the lengths of its lists, so instead of searching for
+    every one, it works up from the smaller intersections. It first
+    searches for the user-selected MeSH on its own in each year, then
+    for its intersections with the terms of one list, then of two, and
+    so on. A citation in a cell is also in every intersection of fewer
+    of the cell's MeSH, so a cell with any such intersection of zero is
+    zero too and is not searched for. Each smaller intersection is
+    found once and reused by every cell it belongs to.
+
+USAGE: Run this from the folder that holds the programs:
+        python -m medline_trends.grid <MeSH> --dimension <list> ...
+            [--start-year YYYY] [--end-year YYYY] [--folder <folder>]
+            [--api-key KEY]
+    Each <list> is the name of a preset (physicians, health-personnel,
+    medicine, or geographic-locations) or one or more MeSH separated by
+    semicolons, such as "Surgeons;Pediatricians". For example:
+        python -m medline_trends.grid "Internship and Residency"
+            --dimension "Surgeons" --dimension geographic-locations
+    The CSV file has a field for the term from each list (named for the
+    preset's field, or mesh_<n> for a list of MeSH), then year,
+    intersecting_citations, intersecting_citations_per_1k, and
+    total_medline_citations. From other code, run() returns its rows.
+
+LIMITS: An intersection of fewer lists is only searched for if it can
+    rule out at least four cells (see RULES_OUT); one that could only
+    rule out one or two would take about as many searches as the cells
+    themselves, unless most of them were zero. Cells whose search fails
+    are left out of the CSV file, as are the cells of years whose totals
+    could not be retrieved, and a warning says how many there were. The
+    lists of the presets are used as they are written in presets.py,
+    and there is no journal; the cache of counts keeps a run that stops
+    partway from searching again for what it already found.
+"""
+
+# The argparse module reads the command-line arguments.
+import argparse
+# The collections module is used to define a record type for grids.
+from collections import namedtuple
+# The datetime module dates the CSV filename.
+from datetime import date
+# The itertools module lists the combinations of lists and of terms.
+import itertools
+# The math module multiplies the lengths of the lists.
+import math
+# The warnings module is used to report the cells that failed.
+import warnings
+
+from medline_trends import engine, eutils, presets, totals
+from medline_trends.engine import filename_mesh, mesh_clause
+
+# An intersection of fewer lists is searched for only if it can rule out
+    # at least this many cells: the product of the lengths of the lists
+    # left out of it.
+RULES_OUT = 4
+
+# A grid: the user-selected MeSH, the lists of MeSH to intersect it
+    # with (each a tuple of MeSH), the names of their CSV fields, and
+    # the first and last years.
+Grid = namedtuple(
+    "Grid", ["user_mesh", "dimensions", "columns", "start_year", "end_year"])
+
+
+def dimension(spec):
+    """Return the MeSH and the CSV field name (None for a list of MeSH)
+    of a list given as the name of a preset or as MeSH separated by
+    semicolons."""
+    if spec in presets.BY_NAME:
+        preset = presets.BY_NAME[spec]
+        return tuple(preset.terms), preset.column
+    return tuple(name.strip() for name in spec.split(";")), None
+
+
+def make_grid(user_mesh, specs, start_year, end_year):
+    """Return the Grid for a user-selected MeSH and lists given as in
+    dimension()."""
+    dimensions, columns = [], []
+    for number, spec in enumerate(specs, 1):
+        terms, column = dimension(spec)
+        dimensions.append(terms)
+        columns.append(column or f"mesh_{number}")
+    return Grid(user_mesh, dimensions, columns, start_year, end_year)
+
+
+def query(user_mesh, key, year):
+    """Return the search for an intersection: the citations from a year
+    tagged with the user-selected MeSH and each term in a key, a tuple
+    of (list number, term) pairs. With one term, it is the search the
+    engine sends for a cell, so their counts share the cache."""
+    return " AND ".join(
+        [mesh_clause(term) for _, term in key]
+        + [mesh_clause(user_mesh), totals.year_query(year)])
+
+
+def worthwhile(grid, chosen):
+    """Return whether the intersections of some of the lists are worth
+    searching for: whether each one can rule out at least RULES_OUT
+    cells. The cells themselves always are."""
+    left_out = [
+        len(terms) for number, terms in enumerate(grid.dimensions)
+        if number not in chosen]
+    return (
+        len(chosen) == len(grid.dimensions)
+        or math.prod(left_out) >= RULES_OUT)
+
+
+def ruled_out(key, year, counts):
+    """Return whether an intersection is known to be zero because one of
+    its smaller intersections is."""
+    for size in range(len(key)):
+        for smaller in itertools.combinations(key, size):
+            if counts.get((smaller, year)) == 0:
+                return True
+    return False
+
+
+def intersections(grid, client):
+    """Return the counts of every cell of a grid, and of the smaller
+    intersections found on the way, by (key, year) (see query()). A
+    failed search leaves its intersection out."""
+    years = range(grid.start_year, grid.end_year + 1)
+    counts = {}
+    # A client that uses the history server keeps the user-selected MeSH
+        # there, since every search has it.
+    if hasattr(client, "use_history"):
+        client.use_history(mesh_clause(grid.user_mesh))
+    metrics = getattr(client, "metrics", None)
+    if metrics is not None:
+        metrics.start()
+    try:
+        # The user-selected MeSH on its own first, then with one list,
+            # then with two, and so on up to the cells.
+        for size in range(len(grid.dimensions) + 1):
+            searches = {}
+            for chosen in itertools.combinations(
+                    range(len(grid.dimensions)), size):
+                if not worthwhile(grid, chosen):
+                    continue
+                for terms in itertools.product(
+                        *[grid.dimensions[number] for number in chosen]):
+                    key = tuple(zip(chosen, terms))
+                    for yr in years:
+                        if ruled_out(key, yr, counts):
+                            counts[key, yr] = 0
+                        else:
+                            searches[query(grid.user_mesh, key, yr)] = (
+                                key, yr)
+            if metrics is not None:
+                metrics.add_cells(len(searches))
+            for search, count in client.counts(list(searches)):
+                counts[searches[search]] = count
+                if metrics is not None:
+                    metrics.cell_done()
+    finally:
+        if metrics is not None:
+            metrics.stop()
+    return counts
+
+
+def run(grid, client=None, year_totals=None):
+    """Run a grid and return its rows, list by list and year by year.
+    The yearly totals are loaded unless they are given, as a dictionary
+    by year."""
+    client = client or eutils.EutilsClient()
+    years = range(grid.start_year, grid.end_year + 1)
+    if year_totals is None:
+        year_totals = totals.load(years, client)
+    counts = intersections(grid, client)
+    rows = []
+    failed = 0
+    untotalled = [yr for yr in years if yr not in year_totals]
+    everything = tuple(range(len(grid.dimensions)))
+    for terms in itertools.product(*grid.dimensions):
+        key = tuple(zip(everything, terms))
+        for yr in years:
+            if yr not in year_totals:
+                continue
+            if (key, yr) not in counts:
+                failed += 1
+                continue
+            count, total = counts[key, yr], year_totals[yr]
+            rows.append({
+                **dict(zip(grid.columns, terms)),
+                "year": yr,
+                "intersecting_citations": count,
+                "intersecting_citations_per_1k": round(
+                    count / total * 1000, 4),
+                "total_medline_citations": total})
+    if failed:
+        warnings.warn(
+            f"{failed} cells could not be retrieved and were left out",
+            RuntimeWarning, stacklevel=2)
+    if untotalled:
+        warnings.warn(
+            f"The yearly totals could not be retrieved for "
+            f"{', '.join(map(str, untotalled))}, so the cells from those "
+            f"years were left out", RuntimeWarning, stacklevel=2)
+    return rows
+
+
+def csv_filename(grid, today=None):
+    """Return the name of the CSV file for a grid."""
+    today = today or date.today()
+    parts = [grid.user_mesh] + [
+        terms[0] if len(terms) == 1 else column
+        for terms, column in zip(grid.dimensions, grid.columns)]
+    return "".join([
+        "grid_", "_".join(filename_mesh(part) for part in parts),
+        f"_{grid.start_year}-{grid.end_year}_",
+        today.strftime("%Y-%m-%d"), ".csv"])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Intersect a MeSH with several lists of MeSH at once.")
+    parser.add_argument("mesh", help="user-selected MeSH")
+    parser.add_argument(
+        "--dimension", action="append", required=True,
+        help="a preset, or MeSH separated by semicolons (repeat for each "
+        "list)")
+    parser.add_argument(
+        "--start-year", type=int, default=1966,
+        help="first year (default: 1966)")
+    parser.add_argument(
+        "--end-year", type=int, default=None,
+        help="last year (default: engine.default_end_year())")
+    parser.add_argument(
+        "--folder", default=".", help="folder for the CSV file")
+    parser.add_argument(
+        "--api-key", default=None,
+        help="NCBI API key (default: NCBI_API_KEY)")
+    args = parser.parse_args()
+    grid = make_grid(
+        args.mesh, args.dimension, args.start_year,
+        args.end_year or engine.default_end_year())
+    client = eutils.EutilsClient(api_key=args.api_key)
+    rows = run(grid, client)
+    engine.write_csv(rows, args.folder, csv_filename(grid))
+    print(f"Wrote {csv_filename(grid)} ({client.metrics.requests} "
+          f"requests for {math.prod(map(len, grid.dimensions))} terms "
+          f"x {grid.end_year - grid.start_year + 1} years)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+SUMMARY: This module is the "groups" mode of the engine. For a long
+    list of terms, most of which never intersect the user-selected MeSH
+    in a given year, it asks about a group of terms at once:
+        ("Chad"[mh] OR "Niger"[mh] OR ...) AND "<MeSH>"[mh] AND 1990[pdat]
+    If the group's count is zero, so is every term's, and one search
+    has done the work of many. If not, the group is split in half and
+    each half is asked about in the same way, down to single terms,
+    whose searches are the same as in the default mode. The CSV file is
+    the same.
+
+SAVINGS: When the first half of a group has a count of zero, every
+    citation the group found came from the second half, so the second
+    half's count is the group's count and is not searched for. For a
+    single term, that is its count.
+"""
+
+# The asyncio module is used to search both halves of a group at the
+    # same time.
+import asyncio
+
+# The search terms for single years.
+from medline_trends.totals import year_query
+
+# How many terms go in a group before it is split.
+GROUP = 16
+
+
+def query(term_clauses, user_clause, year):
+    """Return the search for the citations from a year that are tagged
+    with the user-selected MeSH and any of the terms."""
+    if len(term_clauses) == 1:
+        terms = term_clauses[0]
+    else:
+        terms = f"({' OR '.join(term_clauses)})"
+    return " AND ".join([terms, user_clause, year_query(year)])
+
+
+async def _split(client, term_clauses, user_clause, year, counts,
+                 count=None):
+    """Fill in counts[term clause] for each of the terms for a year. If
+    the group's count is already known, it is passed in."""
+    if count is None:
+        count = await client.count(query(term_clauses, user_clause, year))
+    if count == 0 or len(term_clauses) == 1:
+        counts.update((clause, count) for clause in term_clauses)
+        return
+    middle = len(term_clauses) // 2
+    first, second = term_clauses[:middle], term_clauses[middle:]
+    first_counts = {}
+    await _split(client, first, user_clause, year, first_counts)
+    counts.update(first_counts)
+    if any(first_counts.values()):
+        await _split(client, second, user_clause, year, counts)
+    else:
+        await _split(client, second, user_clause, year, counts, count)
+
+
+def cell_counts(user_clause, year_terms, client, group=GROUP):
+    """Yield ((term clause, year), count) for each term of each year in
+    a dictionary of term clauses by year, a year at a time as each
+    year's searches finish. Years with a search that fails are left
+    out."""
+
+    async def one_year(yr):
+        clauses = year_terms[yr]
+        counts = {}
+        await asyncio.gather(*[
+            _split(client, clauses[i:i + group], user_clause, yr, counts)
+            for i in range(0, len(clauses), group)])
+        return counts
+
+    for yr, counts in client.map(one_year, list(year_terms)):
+        for clause, count in counts.items():
+            yield (clause, yr), count
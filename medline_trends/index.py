@@ -0,0 +1,281 @@
+"""
+SUMMARY: This module builds an inverted index from a local store of
+    MEDLINE citations (see medline_trends/baseline.py): for each MeSH
+    descriptor, the set of PMIDs of the citations tagged with it, and,
+    for each PMID, its publication year. Counting the citations in an
+    intersection is then a matter of combining sets and counting by
+    year, which takes milliseconds, so a whole preset can be run in
+    seconds.
+
+USAGE: To build an index, run this from the folder that holds the
+    programs:
+        python -m medline_trends.index <folder of the store>
+            <folder for the index> [--descriptors descYYYY.xml]
+    With a MeSH descriptor file (see medline_trends/mesh.py), the index
+    knows the MeSH hierarchy and a "[mh]" search also covers the MeSH
+    below the one searched for, as it does on PubMed; only then does the
+    engine skip the terms under a term with a count of zero. To run a
+    program against the index, pass a MeshIndex as the client:
+        engine.run(job, client=index.MeshIndex("<folder for the index>"))
+
+FORMAT: The PMIDs are split into chunks of 65,536 by their upper 16
+    bits, and the PMIDs of a descriptor within a chunk are kept in one
+    of two ways, whichever is smaller: as a sorted list of their lower
+    16 bits (up to 4,096 PMIDs) or as a bitmap of 8,192 bytes. This is
+    the layout of a Roaring bitmap. The lists and bitmaps are kept end
+    to end in postings.bin, and containers.npy says where each one is.
+    The files are memory-mapped when the first search arrives, so
+    opening an index is instant and only the parts a search needs are
+    read from disk.
+"""
+
+# The argparse module reads the command-line arguments.
+import argparse
+# The os module is used to build paths.
+import os
+
+# The numpy module holds the index and combines the sets.
+import numpy as np
+
+from medline_trends.baseline import (
+    LocalClient, Store, descriptor_number, read_names)
+from medline_trends.mesh import Descriptor, Tree, read_descriptors
+
+# The number of PMIDs in a chunk, and the most a chunk can hold as a
+    # list before a bitmap is smaller.
+CHUNK = 1 << 16
+MAX_LIST = 4096
+
+# One record for each list or bitmap: the number in its descriptor's
+    # ID, the upper 16 bits of its PMIDs, how many PMIDs it holds, and
+    # where it starts in postings.bin.
+CONTAINER = np.dtype([
+    ("descriptor", "<u4"), ("key", "<u2"), ("cardinality", "<u4"),
+    ("offset", "<i8")])
+
+# How many chunks of PMIDs are indexed at once while building. This
+    # bounds the memory used to sort the (descriptor, PMID) pairs.
+BLOCK_CHUNKS = 64
+
+
+def write_descriptors(descriptors, path):
+    """Write the ID, name, and tree numbers of each descriptor."""
+    with open(path, "w", encoding="utf-8") as f:
+        for d in sorted(descriptors, key=lambda d: d.ui):
+            f.write(f"{d.ui}\t{d.name}\t{';'.join(d.tree_numbers)}\n")
+
+
+def read_index_descriptors(path):
+    """Yield a Descriptor for each line written by
+    write_descriptors()."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            ui, name, numbers = line.rstrip("\n").split("\t")
+            yield Descriptor(ui, name, numbers.split(";") if numbers else [])
+
+
+def index_block(pmid, descriptor, postings):
+    """Write the lists and bitmaps for one block of (PMID, descriptor)
+    pairs to the open postings file, and return their records. The
+    block must hold every pair of the chunks it covers."""
+    order = np.lexsort((pmid, descriptor))
+    pmid, descriptor = pmid[order], descriptor[order]
+    keys = pmid >> 16
+    starts = np.flatnonzero(np.r_[
+        True, (descriptor[1:] != descriptor[:-1]) | (keys[1:] != keys[:-1])])
+    cardinality = np.diff(np.r_[starts, len(pmid)])
+    records = np.zeros(len(starts), CONTAINER)
+    records["descriptor"] = descriptor[starts]
+    records["key"] = keys[starts]
+    records["cardinality"] = cardinality
+    # Write every list in one go. A list starts wherever the lists
+        # before it in the block end.
+    is_list = cardinality <= MAX_LIST
+    in_list = np.repeat(is_list, cardinality)
+    lows = (pmid[in_list] & (CHUNK - 1)).astype("<u2")
+    base = postings.tell()
+    postings.write(lows.tobytes())
+    list_starts = np.cumsum(np.r_[0, cardinality[is_list][:-1]])
+    records["offset"][is_list] = base + 2 * list_starts
+    # Bitmaps are only needed for the descriptors that tag more than one
+        # in 16 citations in a chunk, so there are few of them.
+    for i in np.flatnonzero(~is_list):
+        bits = np.zeros(CHUNK, bool)
+        start = starts[i]
+        bits[pmid[start:start + cardinality[i]] & (CHUNK - 1)] = True
+        records["offset"][i] = postings.tell()
+        postings.write(np.packbits(bits, bitorder="little").tobytes())
+    return records
+
+
+def build(store_path, index_path, descriptor_file=None):
+    """Build an index from a store. If a MeSH descriptor file is given,
+    its names and tree numbers are kept with the index."""
+    store = Store(store_path)
+    os.makedirs(index_path, exist_ok=True)
+    pmid = store.columns["pmid"]
+    offsets = store.columns["mesh_offsets"]
+    mesh_ids = store.columns["mesh_ids"]
+    # The year of each PMID, with 0 for PMIDs not in the store.
+    years = np.zeros(int(pmid.max()) + 1 if len(pmid) else 1, "<i2")
+    years[pmid] = store.columns["year"]
+    np.save(os.path.join(index_path, "years.npy"), years)
+    # The rows of the store are in PMID order, so each block of chunks is
+        # a run of rows.
+    bounds = np.searchsorted(
+        pmid, np.arange(0, len(years) + CHUNK * BLOCK_CHUNKS,
+                        CHUNK * BLOCK_CHUNKS))
+    records = []
+    with open(os.path.join(index_path, "postings.bin"), "wb") as postings:
+        for first, last in zip(bounds[:-1], bounds[1:]):
+            if first == last:
+                continue
+            lengths = np.diff(offsets[first:last + 1])
+            records.append(index_block(
+                np.repeat(pmid[first:last], lengths),
+                np.asarray(mesh_ids[offsets[first]:offsets[last]]),
+                postings))
+    containers = (
+        np.concatenate(records) if records else np.zeros(0, CONTAINER))
+    containers.sort(order=["descriptor", "key"])
+    np.save(os.path.join(index_path, "containers.npy"), containers)
+    if descriptor_file:
+        descriptors = list(read_descriptors(descriptor_file))
+    else:
+        descriptors = [
+            Descriptor(ui, name, [])
+            for name, ui in read_names(store_path).items()]
+    write_descriptors(
+        descriptors, os.path.join(index_path, "descriptors.tsv"))
+
+
+def bitmap_and(a, b):
+    """Return the intersection of two sets held as dictionaries of
+    bitmaps (arrays of 1,024 64-bit words) by chunk."""
+    result = {}
+    for key in a.keys() & b.keys():
+        words = a[key] & b[key]
+        if words.any():
+            result[key] = words
+    return result
+
+
+def bitmap_or(a, b):
+    """Return the union of two sets held as dictionaries of bitmaps by
+    chunk."""
+    result = dict(a)
+    for key, words in b.items():
+        result[key] = result[key] | words if key in result else words
+    return result
+
+
+class MeshIndex(LocalClient):
+    """An index built by build(). It answers the searches the engine
+    sends, so it can stand in for the E-utilities client."""
+
+    def __init__(self, path):
+        self.path = path
+        self._opened = False
+        self._sets = {}
+        self._years = {}
+
+    def open(self):
+        """Memory-map the index, if that has not been done yet."""
+        if self._opened:
+            return
+        self.years = np.load(
+            os.path.join(self.path, "years.npy"), mmap_mode="r")
+        self.containers = np.load(
+            os.path.join(self.path, "containers.npy"), mmap_mode="r")
+        self.postings = np.memmap(
+            os.path.join(self.path, "postings.bin"), dtype="u1", mode="r")
+        self.tree = Tree(read_index_descriptors(
+            os.path.join(self.path, "descriptors.tsv")))
+        self._descriptor_column = self.containers["descriptor"]
+        self._opened = True
+
+    @property
+    def explodes(self):
+        """Whether "[mh]" is exploded, which it is if the index was built
+        with a MeSH descriptor file and so has the tree numbers."""
+        self.open()
+        return bool(self.tree.numbers)
+
+    def descriptor_set(self, ui):
+        """Return the PMIDs of the citations tagged with one descriptor,
+        as a dictionary of bitmaps by chunk."""
+        number = descriptor_number(ui)
+        first, last = np.searchsorted(
+            self._descriptor_column, [number, number + 1])
+        result = {}
+        for record in self.containers[first:last]:
+            offset, cardinality = record["offset"], record["cardinality"]
+            if cardinality <= MAX_LIST:
+                bits = np.zeros(CHUNK, bool)
+                bits[self.postings[offset:offset + 2 * cardinality].view(
+                    "<u2")] = True
+                bitmap = np.packbits(bits, bitorder="little")
+            else:
+                bitmap = self.postings[offset:offset + CHUNK // 8]
+            result[int(record["key"])] = np.array(bitmap).view("<u8")
+        return result
+
+    def mesh_set(self, name):
+        """Return the PMIDs that a "[mh]" search for a MeSH matches: the
+        citations tagged with it or with any MeSH below it."""
+        key = name.lower()
+        if key not in self._sets:
+            descriptor = self.tree.by_name.get(key)
+            result = {}
+            if descriptor is not None:
+                for ui in self.tree.explode(descriptor.ui):
+                    result = bitmap_or(result, self.descriptor_set(ui))
+            self._sets[key] = result
+        return self._sets[key]
+
+    def year_counts(self, names):
+        """Return the number of citations matching a "[mh]" search for
+        every one of the given MeSH in each year, as an array indexed by
+        year."""
+        self.open()
+        key = tuple(sorted(name.lower() for name in names))
+        if key not in self._years:
+            if key:
+                years = self.years[self.pmids(key)]
+            else:
+                years = self.years
+            self._years[key] = np.bincount(years, minlength=10000)
+        return self._years[key]
+
+    def pmids(self, names):
+        """Return a sorted array of the PMIDs matching a "[mh]" search
+        for every one of the given MeSH."""
+        self.open()
+        names = sorted(names, key=lambda name: len(self.mesh_set(name)))
+        result = self.mesh_set(names[0])
+        for name in names[1:]:
+            result = bitmap_and(result, self.mesh_set(name))
+        found = [
+            np.flatnonzero(np.unpackbits(
+                result[key].view("u1"), bitorder="little")) + key * CHUNK
+            for key in sorted(result)]
+        return (
+            np.concatenate(found).astype(np.int64) if found
+            else np.zeros(0, np.int64))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build a MeSH index from a local MEDLINE store.")
+    parser.add_argument("store", help="folder of the store")
+    parser.add_argument("index", help="folder for the index")
+    parser.add_argument(
+        "--descriptors", default=None,
+        help="MeSH descriptor file (descYYYY.xml or .gz), to search the "
+        "MeSH below each MeSH too")
+    args = parser.parse_args()
+    build(args.store, args.index, args.descriptors)
+
+
+if __name__ == "__main__":
+    main()
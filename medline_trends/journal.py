@@ -0,0 +1,239 @@
+"""
+SUMMARY: This module keeps a journal of the cells of a job whose counts
+    have come back. Each count is added to the end of the journal, and
+    written to disk, as soon as it arrives. If a run stops partway (a
+    crash, the computer going to sleep, or Ctrl-C), running the same
+    job again reads the journal, skips the cells it already has, and
+    only searches for the rest. The CSV file is built from the journal
+    once every cell is in it. The journal also starts with the job
+    itself and keeps a ledger of the cells that could not be retrieved
+    even after retrying, with the error for each. Once every cell is
+    in, the journal is marked as finished, and running the job again
+    after that starts the journal over, so that a run weeks later
+    searches again for the recent years instead of rebuilding the CSV
+    file from old counts (the settled years still come from the cache
+    of counts, without a search).
+
+USAGE: Pass a journal to the engine:
+        engine.run(job, journal=journal.for_job(job, path))
+    The journal is kept next to the CSV file, with the same name minus
+    the date and with ".journal" at the end, so that a run that is
+    restarted the next day still finds it. Delete the journal to start
+    the job over. To see how far a job got and which cells failed, and
+    to search again for only the failed cells and write the CSV file,
+    run this from the folder that holds the programs:
+        python -m medline_trends.journal <journal> [--refetch]
+"""
+
+# The argparse module reads the command-line arguments.
+import argparse
+# The datetime module dates the start of a run.
+from datetime import date
+# The json module is used to write each record as one line of JSON.
+import json
+# The os module is used to build the path of the journal and to make
+    # sure each line reaches the disk.
+import os
+
+from medline_trends import engine
+from medline_trends.engine import Cell, Job, Preset, csv_filename
+
+
+def journal_filename(job):
+    """Return the name of the journal for a job."""
+    return csv_filename(job)[:-len("_YYYY-MM-DD.csv")] + ".journal"
+
+
+def for_job(job, path):
+    """Return the journal for a job, kept in the given folder."""
+    return Journal(os.path.join(path, journal_filename(job)))
+
+
+def job_record(job, started=None):
+    """Return the record for a job whose run started on the given date
+    (by default, today)."""
+    return {
+        "job": {
+            "user_mesh": job.user_mesh,
+            # The terms a rule selected are written out, so the rule
+                # itself is not needed.
+            "preset": job.preset._replace(rule=None)._asdict(),
+            "start_year": job.start_year, "end_year": job.end_year},
+        # The counts of a run were retrieved on or after this date (see
+            # medline_trends.refresh).
+        "started": (started or date.today()).isoformat()}
+
+
+def count_record(cell, count):
+    """Return the record for a cell's count."""
+    return {"term": cell.term, "year": cell.year, "count": count}
+
+
+class Journal:
+    """An append-only file of records, one line of JSON each: the job,
+    then (term, year, count) for each cell that came back and (term,
+    year, error) for each cell that failed, and, once every cell came
+    back, a record that the run finished."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def records(self):
+        """Yield each record in the journal. A line cut short by a crash
+        is ignored."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def job(self):
+        """Return the job the journal is for, or None if it has not been
+        started."""
+        for record in self.records():
+            if "job" in record:
+                job = record["job"]
+                return Job(
+                    job["user_mesh"], Preset(**job["preset"]),
+                    job["start_year"], job["end_year"])
+        return None
+
+    def started(self):
+        """Return the date the journal's run started, or None if it has
+        not been started or does not say, as journals from before the
+        date was kept do not."""
+        for record in self.records():
+            if "job" in record:
+                started = record.get("started")
+                return date.fromisoformat(started) if started else None
+        return None
+
+    def read(self):
+        """Return a dictionary of the counts in the journal by cell."""
+        return {
+            Cell(record["term"], record["year"]): record["count"]
+            for record in self.records() if "count" in record}
+
+    def failures(self):
+        """Return a dictionary of the last error for each cell that
+        failed and has not come back since."""
+        failures = {}
+        for record in self.records():
+            if "error" in record:
+                failures[Cell(record["term"], record["year"])] = (
+                    record["error"])
+            elif "count" in record:
+                failures.pop(Cell(record["term"], record["year"]), None)
+        return failures
+
+    def finished(self):
+        """Return whether every cell of the journal's run came back."""
+        return any("finished" in record for record in self.records())
+
+    def start(self, job):
+        """Write the job at the top of a new journal."""
+        if self.job() is None:
+            self.append(job_record(job))
+
+    def finish(self):
+        """Mark the journal's run as finished, so that the next run of
+        the job starts over (see restart())."""
+        self.append({"finished": True})
+
+    def reset(self, job, counts):
+        """Start the journal over with the job and the given counts by
+        cell, replacing whatever it held (see medline_trends.refresh)."""
+        self.rewrite([job_record(job)] + [
+            count_record(cell, count) for cell, count in counts.items()])
+
+    def restart(self):
+        """Start the journal over for a new run of its job, starting
+        today, keeping only the records that say what the job is: the
+        job and, for a shard, which shard it is (see
+        medline_trends.shards)."""
+        job = self.job()
+        self.rewrite([
+            job_record(job) if "job" in record else record
+            for record in self.records()
+            if "job" in record or "shard" in record])
+
+    def rewrite(self, records):
+        """Replace whatever the journal held with the given records. The
+        new journal is written next to the old one first, so that a
+        crash leaves one or the other."""
+        self.close()
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+
+    def write(self, cell, count):
+        """Add a cell's count to the end of the journal and make sure it
+        reaches the disk."""
+        self.append(count_record(cell, count))
+
+    def write_failure(self, cell, error):
+        """Add a cell that failed, and why, to the end of the journal."""
+        self.append({"term": cell.term, "year": cell.year, "error": error})
+
+    def append(self, record):
+        """Add a record to the end of the journal and make sure it
+        reaches the disk."""
+        if self.file is None:
+            self.file = open(self.path, "a+", encoding="utf-8")
+            # Start on a new line if the last run was cut off
+                # mid-line.
+            self.file.seek(0, os.SEEK_END)
+            if self.file.tell():
+                self.file.seek(self.file.tell() - 1)
+                if self.file.read(1) != "\n":
+                    self.file.write("\n")
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        """Close the journal file, if it is open."""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Show the state of a job's journal, or search again "
+        "for the cells that failed.")
+    parser.add_argument("journal", help="path of the journal")
+    parser.add_argument(
+        "--refetch", action="store_true",
+        help="search again for the failed cells and write the CSV file")
+    parser.add_argument(
+        "--mode", choices=sorted(engine.MODES), default="esearch",
+        help="how to get the counts (default: esearch)")
+    args = parser.parse_args()
+    journal = Journal(args.journal)
+    job = journal.job()
+    if job is None:
+        parser.error(f"{args.journal} is not a started journal")
+    # A finished journal has no failed cells, and running its job again
+        # would start it over.
+    if args.refetch and not journal.finished():
+        rows = engine.run(job, mode=args.mode, journal=journal)
+        path = os.path.dirname(os.path.abspath(args.journal))
+        engine.write_csv(rows, path, csv_filename(job))
+    counts, failures = journal.read(), journal.failures()
+    print(f"{len(counts)} of {len(engine.plan(job))} cells retrieved, "
+          f"{len(failures)} failed")
+    for cell, error in sorted(failures.items()):
+        print(f"{cell.term}\t{cell.year}\t{error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""
+SUMMARY: This module reads the MeSH descriptor file that NLM publishes
+    each year (descYYYY.xml or descYYYY.gz, available here:
+    https://www.nlm.nih.gov/databases/download/mesh.html). For each
+    descriptor, it keeps the descriptor's ID, its name, its tree
+    numbers, which say where it sits in the MeSH hierarchy, and the
+    first year of literature it has been applied to. A descriptor's
+    tree numbers start with the tree numbers of the descriptors above
+    it; for example, "Physicians" is M01.526.485 and "Surgeons" is
+    M01.526.485.810.
+
+FIRST YEARS: The first year comes from the descriptor's history note,
+    which is where the MeSH database's "Year introduced" comes from.
+    "2021 (2020)" means that the heading was introduced in 2021 and
+    applied back to literature from 2020. Older notes use two-digit
+    years and may list the earlier names of the heading, as in
+    "91(75); was SURGEONS 1963-90". The earliest year in the note is
+    taken, so that a heading is never assumed to start later than it
+    does.
+
+COMPACT COPY: Reading a descriptor file takes a while, so the first
+    time one is loaded with load(), a compact copy of what was read is
+    saved next to the cache of counts (see medline_trends/cache.py) and
+    used from then on, until the descriptor file changes. The compact
+    copy is kept with NumPy, which is only imported when one is saved
+    or opened.
+
+SELECTIONS: A preset can name its terms with rules instead of a list.
+    Subtree("Physicians", 0, 1) selects "Physicians" and every MeSH one
+    level below it; Subtree("Z01", 1, 1, ["Z01.639"]) selects every MeSH
+    one level below "Geographic Locations" except "Oceans and Seas".
+    Headings can be given by name or by tree number.
+"""
+
+# The bisect module finds the range of tree numbers under a descriptor.
+import bisect
+# The collections module is used to define a record type for
+    # descriptors.
+from collections import namedtuple
+# The gzip module reads compressed descriptor files.
+import gzip
+# The os module is used to find the compact copy of a descriptor file.
+import os
+# The re module is used to find the years in history notes.
+import re
+# The xml.etree module parses the descriptor file as a stream.
+from xml.etree import ElementTree
+
+# The compact copies are kept in the same folder as the cache.
+from medline_trends import cache
+
+# A MeSH descriptor. first_year is None if it is not known.
+Descriptor = namedtuple(
+    "Descriptor", ["ui", "name", "tree_numbers", "first_year"],
+    defaults=[None])
+
+# A rule that selects the MeSH from min_depth through max_depth levels
+    # below a heading (0 is the heading itself), leaving out the
+    # headings in "exclude" and everything below them. max_depth=None
+    # means no limit.
+Subtree = namedtuple(
+    "Subtree", ["heading", "min_depth", "max_depth", "exclude"],
+    defaults=[()])
+
+# Tree numbers, such as "M01.526.485", as opposed to names.
+_TREE_NUMBER = re.compile(r"[A-Z]\d{2}(\.\d{3})*")
+
+# Years in a history note, which may have two or four digits.
+_YEAR = re.compile(r"\b(\d{4}|\d{2})\b")
+
+# The trees already loaded, by the path and stamp of their files.
+_loaded = {}
+
+
+def first_year(note):
+    """Return the earliest year in a history note, or None if it has
+    none. Two-digit years are in the 1900s."""
+    years = [
+        int(year) + (1900 if len(year) == 2 else 0)
+        for year in _YEAR.findall(note or "")]
+    return min(years) if years else None
+
+
+def read_descriptors(path):
+    """Yield a Descriptor for each record in a descriptor file. Each
+    record is cleared once it has been read, so memory use stays
+    flat."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        root = None
+        for event, elem in ElementTree.iterparse(f, events=("start", "end")):
+            if root is None:
+                root = elem
+            if event == "end" and elem.tag == "DescriptorRecord":
+                yield Descriptor(
+                    elem.findtext("DescriptorUI"),
+                    elem.findtext("DescriptorName/String"),
+                    [tag.text for tag in elem.iterfind(
+                        "TreeNumberList/TreeNumber")],
+                    first_year(elem.findtext("HistoryNote")))
+                root.clear()
+
+
+class Tree:
+    """The MeSH hierarchy, built from descriptors."""
+
+    def __init__(self, descriptors):
+        self.descriptors = {d.ui: d for d in descriptors}
+        self.by_name = {d.name.lower(): d for d in self.descriptors.values()}
+        pairs = sorted(
+            (number, d.ui) for d in self.descriptors.values()
+            for number in d.tree_numbers)
+        self.numbers = [number for number, ui in pairs]
+        self.uis = [ui for number, ui in pairs]
+        self.owner = dict(pairs)
+
+    @classmethod
+    def from_file(cls, path):
+        """Build the hierarchy from a descriptor file."""
+        return cls(read_descriptors(path))
+
+    def descendants(self, ui):
+        """Return the IDs of every descriptor anywhere below a
+        descriptor, not including the descriptor itself."""
+        found = set()
+        for number in self.descriptors[ui].tree_numbers:
+            found.update(
+                self.owner[n] for n in self.numbers_under(number))
+        found.discard(ui)
+        return found
+
+    def numbers_under(self, number):
+        """Return the tree numbers below a tree number, in order, not
+        including the tree number itself."""
+        # Every tree number below this one starts with it and a period,
+            # and "/" is the character after the period.
+        start = bisect.bisect_left(self.numbers, number + ".")
+        end = bisect.bisect_left(self.numbers, number + "/")
+        return self.numbers[start:end]
+
+    def heading_numbers(self, heading):
+        """Return the tree numbers of a heading given by name or by tree
+        number. A name that is not in the tree has none."""
+        if _TREE_NUMBER.fullmatch(heading):
+            return [heading]
+        descriptor = self.by_name.get(heading.lower())
+        return sorted(descriptor.tree_numbers) if descriptor else []
+
+    def select(self, rules):
+        """Return the names of the MeSH selected by a list of Subtree
+        rules, rule by rule and in tree-number order within a rule. A
+        MeSH selected more than once is listed the first time."""
+        names = {}
+        for rule in rules:
+            excluded = [
+                number for heading in rule.exclude
+                for number in self.heading_numbers(heading)]
+            for root in self.heading_numbers(rule.heading):
+                if root not in self.owner:
+                    continue
+                depth = root.count(".")
+                for number in [root] + self.numbers_under(root):
+                    level = number.count(".") - depth
+                    if level < rule.min_depth or (
+                            rule.max_depth is not None
+                            and level > rule.max_depth):
+                        continue
+                    if any(
+                            number == other or number.startswith(other + ".")
+                            for other in excluded):
+                        continue
+                    names.setdefault(
+                        self.descriptors[self.owner[number]].name, None)
+        return list(names)
+
+    def save(self, path, stamp=(0, 0)):
+        """Save a compact copy of the tree. The stamp records the size and
+        modification time of the descriptor file it came from."""
+        # Imported here so that numpy is only needed for the compact copy,
+            # not to import the presets.
+        import numpy as np
+        descriptors = sorted(self.descriptors.values())
+        names = [d.name.encode("utf-8") for d in descriptors]
+        owners = [
+            i for i, d in enumerate(descriptors) for _ in d.tree_numbers]
+        with open(path, "wb") as f:
+            np.savez(
+                f, stamp=np.array(stamp, "<i8"),
+                uis=np.array([d.ui for d in descriptors], "S"),
+                names=np.frombuffer(b"".join(names), "u1"),
+                name_ends=np.cumsum([len(name) for name in names]),
+                first_years=np.array(
+                    [d.first_year or 0 for d in descriptors], "<i2"),
+                numbers=np.array(
+                    [n for d in descriptors for n in d.tree_numbers], "S"),
+                owners=np.array(owners, "<i4"))
+
+    @classmethod
+    def open(cls, path):
+        """Load a compact copy of a tree saved with save(), and return
+        it with its stamp."""
+        # Imported here for the same reason as in save().
+        import numpy as np
+        with np.load(path) as data:
+            blob = data["names"].tobytes()
+            ends = data["name_ends"].tolist()
+            starts = [0] + ends[:-1]
+            numbers = [[] for _ in starts]
+            for number, owner in zip(
+                    data["numbers"].tolist(), data["owners"].tolist()):
+                numbers[owner].append(number.decode("ascii"))
+            descriptors = [
+                Descriptor(
+                    ui.decode("ascii"), blob[start:end].decode("utf-8"),
+                    tree_numbers, first_year or None)
+                for ui, start, end, tree_numbers, first_year in zip(
+                    data["uis"].tolist(), starts, ends, numbers,
+                    data["first_years"].tolist())]
+            stamp = tuple(data["stamp"].tolist())
+        return cls(descriptors), stamp
+
+    def explode(self, ui):
+        """Return the IDs of a descriptor and every descriptor below it,
+        which is what a "[mh]" search covers."""
+        return {ui} | self.descendants(ui)
+
+    def first_year(self, name):
+        """Return the first year a "[mh]" search for a MeSH can find
+        anything: the earliest first year of the MeSH and every MeSH
+        below it. Return None if the MeSH or any of those years is not
+        known."""
+        descriptor = self.by_name.get(name.lower())
+        if descriptor is None:
+            return None
+        years = [
+            self.descriptors[ui].first_year
+            for ui in self.explode(descriptor.ui)]
+        if None in years:
+            return None
+        return min(years)
+
+    def first_years(self, names):
+        """Return a dictionary of first_year() for each of the given
+        MeSH, by name. MeSH whose first year is not known are left
+        out."""
+        years = {name: self.first_year(name) for name in names}
+        return {name: year for name, year in years.items() if year}
+
+    def parents(self, names):
+        """Return a dictionary of the MeSH each of the given MeSH sits
+        under, by name, choosing from the given MeSH. Where several of
+        them are above a MeSH, the closest one (the one with the fewest
+        MeSH below it) is chosen. MeSH with none above them, or that
+        are not in the hierarchy, are left out."""
+        below = {}
+        for name in names:
+            descriptor = self.by_name.get(name.lower())
+            if descriptor is not None:
+                below[name] = self.descendants(descriptor.ui)
+        found = {}
+        for name in below:
+            ui = self.by_name[name.lower()].ui
+            above = [other for other in below if ui in below[other]]
+            if above:
+                found[name] = min(above, key=lambda other: len(below[other]))
+        return found
+
+
+def compact_path(path):
+    """Return where the compact copy of a descriptor file is kept."""
+    folder = os.path.dirname(os.path.abspath(
+        os.environ.get("MEDLINE_TRENDS_CACHE") or cache.DEFAULT_PATH))
+    return os.path.join(folder, os.path.basename(path) + ".tree.npz")
+
+
+def load(path):
+    """Return the Tree for a descriptor file, from its compact copy if
+    the copy is up to date, or else by reading the file and saving a
+    new copy. A tree is only loaded once per process, so every job of a
+    batch shares it."""
+    info = os.stat(path)
+    stamp = (info.st_size, info.st_mtime_ns)
+    key = (os.path.abspath(path), stamp)
+    if key in _loaded:
+        return _loaded[key]
+    compact = compact_path(path)
+    tree = None
+    if os.path.exists(compact):
+        tree, saved = Tree.open(compact)
+        if saved != stamp:
+            tree = None
+    if tree is None:
+        tree = Tree.from_file(path)
+        os.makedirs(os.path.dirname(compact), exist_ok=True)
+        tree.save(compact, stamp)
+    _loaded[key] = tree
+    return tree
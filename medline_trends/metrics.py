@@ -0,0 +1,248 @@
+"""
+SUMMARY: This module keeps track of how a run is going: how many of its
+    cells have come back and how many there are, how many requests are
+    being sent per second, how long they take, how many failed or were
+    tried again, and how many counts came from the cache. While a run
+    is going, a progress line on the console is updated with them, and
+    they can also be written to a file that a job monitor can read.
+
+USAGE: Every E-utilities client keeps its metrics in `client.metrics`.
+    The progress line is shown when the console is a terminal. To also
+    write the metrics to a file every few seconds, set the
+    MEDLINE_TRENDS_METRICS environment variable to its path. A path
+    ending in ".prom" gets the Prometheus text format, and any other
+    path gets JSON. The file is replaced in one step, so a monitor
+    never reads half of it. To alert on a stalled run, compare
+    last_progress (the time the last cell came back) with the current
+    time.
+
+LIMITS: The request rate and the time remaining are worked out from the
+    last minute of the run, so they follow changes in speed but take a
+    minute to settle. The latencies are those of the last 1,000
+    requests. When several jobs run one after another in one batch,
+    the total counts the cells of the jobs started so far.
+"""
+
+# The collections module holds the recent requests and latencies.
+from collections import deque
+# The json module writes the metrics file as JSON.
+import json
+# The os module is used to replace the metrics file in one step.
+import os
+# The sys module is used to write the progress line.
+import sys
+# The threading module runs the reports in the background and keeps
+    # the counters consistent between threads.
+import threading
+# The time module tells how long requests and the run take.
+import time
+
+# How many seconds of the run the rates are worked out from.
+WINDOW = 60
+
+# How many of the latest latencies the percentiles are worked out from.
+LATENCIES = 1000
+
+# How many seconds apart the progress line and the file are updated.
+INTERVAL = 5
+
+
+def percentile(values, fraction):
+    """Return the value below which the given fraction of a list of
+    values falls, or None if the list is empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def duration(seconds):
+    """Format a number of seconds as hours, minutes, and seconds."""
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+class Metrics:
+    """The metrics of the runs of one client, and the reports of them.
+    The counters are safe to update from any thread."""
+
+    def __init__(self, path=None, interval=INTERVAL, console=None):
+        self.path = path or os.environ.get("MEDLINE_TRENDS_METRICS")
+        self.interval = interval
+        self.console = sys.stderr.isatty() if console is None else console
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.cells_total = self.cells_done = 0
+        self.requests = self.errors = self.retries = 0
+        self.cache_hits = self.cache_misses = 0
+        self.last_progress = None
+        self.request_times = deque()
+        self.cell_times = deque()
+        self.latencies = deque(maxlen=LATENCIES)
+        self.thread = None
+        self.stopping = threading.Event()
+
+    def add_cells(self, total, done=0):
+        """Add the cells of a job to the total, some of which may be done
+        already."""
+        with self.lock:
+            self.cells_total += total
+            self.cells_done += done
+
+    def cell_done(self):
+        """Count a cell whose count has come back."""
+        now = time.time()
+        with self.lock:
+            self.cells_done += 1
+            self.last_progress = now
+            self.cell_times.append(now)
+
+    def request(self, seconds, ok=True):
+        """Count a request that took the given number of seconds."""
+        now = time.time()
+        with self.lock:
+            self.requests += 1
+            self.errors += 0 if ok else 1
+            self.request_times.append(now)
+            self.latencies.append(seconds)
+
+    def retry(self):
+        """Count a request that is being tried again."""
+        with self.lock:
+            self.retries += 1
+
+    def cache_hit(self, hit):
+        """Count a count that was (or was not) found in the cache."""
+        with self.lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    def snapshot(self):
+        """Return the metrics as a dictionary."""
+        now = time.time()
+        with self.lock:
+            for times in [self.request_times, self.cell_times]:
+                while times and times[0] < now - WINDOW:
+                    times.popleft()
+            window = min(WINDOW, max(now - self.started, 1e-9))
+            request_rate = len(self.request_times) / window
+            cell_rate = len(self.cell_times) / window
+            remaining = self.cells_total - self.cells_done
+            looked_up = self.cache_hits + self.cache_misses
+            latencies = list(self.latencies)
+            return {
+                "time": now,
+                "elapsed_seconds": now - self.started,
+                "cells_done": self.cells_done,
+                "cells_total": self.cells_total,
+                "requests": self.requests,
+                "request_errors": self.errors,
+                "retries": self.retries,
+                "request_rate": request_rate,
+                "error_ratio": self.errors / self.requests
+                if self.requests else 0.0,
+                "cache_hits": self.cache_hits,
+                "cache_misses": self.cache_misses,
+                "cache_hit_ratio": self.cache_hits / looked_up
+                if looked_up else 0.0,
+                "latency_seconds": {
+                    str(fraction): percentile(latencies, fraction)
+                    for fraction in [0.5, 0.9, 0.99]},
+                "eta_seconds": remaining / cell_rate if cell_rate else None,
+                "last_progress": self.last_progress}
+
+    def line(self, snapshot):
+        """Return the progress line for a snapshot."""
+        done, total = snapshot["cells_done"], snapshot["cells_total"]
+        parts = [
+            f"{done}/{total} cells"
+            + (f" ({done / total:.0%})" if total else ""),
+            f"{snapshot['request_rate']:.1f} req/s"]
+        p50 = snapshot["latency_seconds"]["0.5"]
+        p99 = snapshot["latency_seconds"]["0.99"]
+        if p50 is not None:
+            parts.append(f"p50 {p50 * 1000:.0f} ms, p99 {p99 * 1000:.0f} ms")
+        parts.append(
+            f"{snapshot['request_errors']} errors, "
+            f"{snapshot['retries']} retries")
+        if snapshot["cache_hits"] + snapshot["cache_misses"]:
+            parts.append(f"cache {snapshot['cache_hit_ratio']:.0%}")
+        if snapshot["eta_seconds"] is not None:
+            parts.append(f"ETA {duration(snapshot['eta_seconds'])}")
+        return " | ".join(parts)
+
+    def prometheus(self, snapshot):
+        """Return a snapshot in the Prometheus text format."""
+        series = [
+            ("cells_done", "gauge", "Cells whose count has come back"),
+            ("cells_total", "gauge", "Cells in the jobs started so far"),
+            ("requests", "counter", "Requests sent"),
+            ("request_errors", "counter", "Requests that failed"),
+            ("retries", "counter", "Requests tried again"),
+            ("request_rate", "gauge",
+             "Requests per second over the last minute"),
+            ("cache_hits", "counter", "Counts found in the cache"),
+            ("cache_misses", "counter", "Counts not found in the cache"),
+            ("eta_seconds", "gauge", "Seconds until every cell is done"),
+            ("last_progress", "gauge", "Unix time the last cell came back")]
+        lines = []
+        for key, kind, description in series:
+            if snapshot[key] is None:
+                continue
+            name = f"medline_trends_{key}"
+            if kind == "counter":
+                name += "_total"
+            lines += [
+                f"# HELP {name} {description}.", f"# TYPE {name} {kind}",
+                f"{name} {snapshot[key]}"]
+        lines += [
+            "# HELP medline_trends_latency_seconds Request latency.",
+            "# TYPE medline_trends_latency_seconds summary"]
+        for fraction, seconds in snapshot["latency_seconds"].items():
+            if seconds is not None:
+                lines.append(
+                    f'medline_trends_latency_seconds{{quantile="{fraction}"}}'
+                    f" {seconds}")
+        return "\n".join(lines) + "\n"
+
+    def report(self, final=False):
+        """Update the progress line and the metrics file."""
+        snapshot = self.snapshot()
+        if self.console:
+            end = "\n" if final else ""
+            sys.stderr.write(f"\r{self.line(snapshot)}\033[K{end}")
+            sys.stderr.flush()
+        if self.path:
+            if self.path.endswith(".prom"):
+                text = self.prometheus(snapshot)
+            else:
+                text = json.dumps(snapshot, indent=1)
+            temporary = f"{self.path}.tmp"
+            with open(temporary, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(temporary, self.path)
+
+    def start(self):
+        """Start reporting every `interval` seconds in the background, if
+        there is anywhere to report to and it has not started yet."""
+        if not (self.console or self.path) or self.thread is not None:
+            return
+        self.stopping.clear()
+
+        def loop():
+            while not self.stopping.wait(self.interval):
+                self.report()
+
+        self.thread = threading.Thread(target=loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop reporting in the background and make a final report."""
+        if self.thread is None:
+            return
+        self.stopping.set()
+        self.thread.join()
+        self.thread = None
+        self.report(final=True)
@@ -0,0 +1,401 @@
+"""
+SUMMARY: This module is a stand-in for esearch.fcgi that runs on this
+    computer, so that changes to the programs can be measured, and
+    tested, without sending any searches to NCBI. It makes up its
+    counts, but always the same counts for the same search, and it can
+    be made slow, uneven, or unreliable on purpose.
+
+USAGE: To run it on its own, run this from the folder that holds the
+    programs:
+        python -m medline_trends.mockserver [--port 8000] [--latency S]
+            [--jitter S] [--rate-limited F] [--errors F] [--seed N]
+            [--history-lifetime S]
+    and pass its address as the client's URL:
+        eutils.EutilsClient(
+            url="http://127.0.0.1:8000/esearch.fcgi", cache=False)
+    (A client of any URL but NCBI's leaves out the shared cache of
+    counts anyway, so that made-up counts never end up in it.)
+    The benchmark (see medline_trends/benchmark.py) starts its own.
+    --latency is how long each response takes, in seconds, and
+    --jitter how much that varies either way. --rate-limited and
+    --errors are the fractions of requests that get a 429 (with a
+    Retry-After header) or a 500 response instead of a count. Which
+    requests those are depends only on the search, how many times it
+    has been sent, and the seed, so a benchmark can be repeated.
+    --history-lifetime is how long, in seconds, a history server
+    session lasts after it is made (by default, as long as the server
+    runs).
+
+COUNTS: It understands the searches the engine sends: "[mh]" clauses,
+    a single group of them joined by OR in parentheses, and a year or
+    a range of years with "[pdat]" (every year, without one), all joined
+    by AND. Its counts agree with one another the way PubMed's do where
+    the engine relies on it: the count for a range of years is the sum
+    of its years, a group's count is zero only if each of its terms'
+    is, and a term's count is never more than that of the term above it
+    (see presets.py) or that of the same search without one of its
+    MeSH. A group's count is the sum of its terms', as if no citation
+    had two of them. It does not return PMIDs, so it cannot stand in
+    for the "pmids" mode.
+
+HISTORY: Like esearch, it keeps the search of a request sent with
+    usehistory=y in a session and returns its WebEnv and query key. A
+    later search sent with the WebEnv can refer to it as "#<query key>".
+    A search against a session that has expired, or never existed, gets
+    the error PubMed sends for one: "Unable to obtain query #1". As with
+    esearch, the WebEnv is only looked up for a request sent with
+    usehistory=y; without it, "#1" is listed as a phrase not found
+    (PhraseNotFound) and the rest of the search is counted.
+"""
+
+# The argparse module reads the command-line arguments.
+import argparse
+# The itertools module numbers the history server sessions.
+import itertools
+# The hashlib module turns searches into repeatable random numbers.
+import hashlib
+# The http.server module answers the requests.
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+# The re module reads the parts of a search.
+import re
+# The threading module runs the server in the background and keeps its
+    # counters consistent between threads.
+import threading
+# The time module makes the responses take time.
+import time
+# The urllib.parse module reads the query strings and POST bodies.
+from urllib.parse import parse_qs, urlparse
+
+from medline_trends.totals import FIRST_YEAR
+
+# The last year of the made-up citations.
+LAST_YEAR = 2030
+
+# A "[mh]" clause and a "[pdat]" clause of a search.
+_MESH = re.compile(r'^"(.+)"\[mh\]$')
+_YEARS = re.compile(r"^(\d{4})(?::(\d{4}))?\[pdat\]$")
+
+# A reference to a search kept in a history server session.
+_QUERY_KEY = re.compile(r"^#(\d+)$")
+
+
+def uniform(*parts):
+    """Return a number from 0 up to 1 that depends only on the parts."""
+    digest = hashlib.blake2b(
+        "\t".join(map(str, parts)).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2 ** 64
+
+
+def parse(term):
+    """Return the groups of MeSH in a search (each a tuple of the MeSH
+    joined by OR) and its first and last years, which are those of all
+    the citations if it has no "[pdat]" clause. Raise ValueError for a
+    search it does not understand."""
+    groups, years = [], None
+    for part in term.split(" AND "):
+        span = _YEARS.match(part)
+        if span and years is None:
+            years = (int(span.group(1)), int(span.group(2) or span.group(1)))
+            continue
+        if part.startswith("(") and part.endswith(")"):
+            part = part[1:-1]
+        matches = [_MESH.match(clause) for clause in part.split(" OR ")]
+        if not all(matches):
+            raise ValueError(f"Cannot read {part!r}")
+        groups.append(tuple(match.group(1) for match in matches))
+    if years is None:
+        years = (FIRST_YEAR, LAST_YEAR)
+    return groups, years
+
+
+class Corpus:
+    """The made-up citations: how many there are in each year and how
+    many are tagged with each set of MeSH. "parents" maps MeSH to the
+    MeSH above them."""
+
+    def __init__(self, parents=None, seed=0):
+        self.parents = parents or {}
+        self.seed = seed
+        # The counts already made up, by MeSH and year.
+        self.cells = {}
+
+    def total(self, year):
+        """Return the number of citations from a year."""
+        return 200000 + 15000 * max(0, year - FIRST_YEAR)
+
+    def share(self, name):
+        """Return the share of citations tagged with a MeSH."""
+        return 0.00005 + 0.05 * uniform(self.seed, name) ** 6
+
+    def cell(self, names, year):
+        """Return the number of citations from a year tagged with every
+        MeSH in a sorted tuple of MeSH."""
+        if (names, year) in self.cells:
+            return self.cells[names, year]
+        count = None
+        for name in names:
+            parent = self.parents.get(name)
+            if parent is not None and parent not in names:
+                # Keep the count within that of the MeSH above.
+                above = tuple(sorted(set(names) - {name} | {parent}))
+                count = int(
+                    self.cell(above, year)
+                    * uniform(self.seed, names, year) ** 2)
+                break
+        if count is None:
+            expected = self.total(year)
+            for name in names:
+                expected *= self.share(name)
+            # MeSH are used together more often than by chance.
+            if len(names) > 1:
+                expected *= 3
+            count = int(2 * expected * uniform(self.seed, names, year))
+        # A citation tagged with several MeSH is tagged with each of them,
+            # so the count is never more than that of the same MeSH
+            # without any one of them.
+        if len(names) > 1:
+            count = min([count] + [
+                self.cell(names[:i] + names[i + 1:], year)
+                for i in range(len(names))])
+        self.cells[names, year] = count
+        return count
+
+    def count(self, term):
+        """Return the count for a search."""
+        groups, (start, end) = parse(term)
+        count = 0
+        for year in range(start, end + 1):
+            if not groups:
+                count += self.total(year)
+                continue
+            combinations = [()]
+            for group in groups:
+                combinations = [
+                    chosen + (name,)
+                    for chosen in combinations for name in group]
+            count += sum(
+                self.cell(tuple(sorted(set(chosen))), year)
+                for chosen in combinations)
+        return count
+
+
+class MockServer:
+    """A stand-in for esearch.fcgi, served from a background thread.
+    `calls` counts the requests it has answered, `statuses` how many
+    got each status, and `received` the bytes of their query strings
+    and POST bodies."""
+
+    def __init__(self, corpus=None, latency=0.0, jitter=0.0,
+                 rate_limited=0.0, errors=0.0, seed=0, port=0,
+                 history_lifetime=None):
+        self.corpus = corpus or Corpus(seed=seed)
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limited = rate_limited
+        self.errors = errors
+        self.seed = seed
+        self.port = port
+        self.history_lifetime = history_lifetime
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.received = 0
+        self.statuses = {}
+        self.sent = {}
+        self.sessions = {}
+        self.session_numbers = itertools.count(1)
+        self.server = None
+
+    @property
+    def url(self):
+        """Return the address to pass as the client's URL."""
+        return f"http://127.0.0.1:{self.server.server_port}/esearch.fcgi"
+
+    def expire(self):
+        """Forget every history server session, as NCBI does with those
+        that go unused."""
+        with self.lock:
+            self.sessions.clear()
+
+    def recall(self, term, web_env):
+        """Return a search with its references to the searches kept in a
+        session replaced by those searches. Raise ValueError if the
+        session or a search in it cannot be found."""
+        with self.lock:
+            session = self.sessions.get(web_env)
+        expired = session is None or (
+            self.history_lifetime is not None
+            and time.time() - session["created"] > self.history_lifetime)
+        parts = []
+        for part in term.split(" AND "):
+            key = _QUERY_KEY.match(part)
+            if key:
+                number = int(key.group(1))
+                if expired or number > len(session["queries"]):
+                    raise ValueError(f"Unable to obtain query #{number}")
+                part = session["queries"][number - 1]
+            parts.append(part)
+        return " AND ".join(parts)
+
+    def unmatched(self, term):
+        """Return a search with its references to history server sessions
+        left out, and the references, as esearch does with a search sent
+        without usehistory=y: it ignores the WebEnv and lists the
+        references as phrases it did not find. Raise ValueError if
+        nothing is left."""
+        parts, references = [], []
+        for part in term.split(" AND "):
+            (references if _QUERY_KEY.match(part) else parts).append(part)
+        if not parts:
+            raise ValueError("Empty term and query_key - nothing todo")
+        return " AND ".join(parts), references
+
+    def keep(self, term, web_env):
+        """Keep a search in a session, making a new session unless one
+        is given, and return the session's WebEnv and the search's query
+        key."""
+        with self.lock:
+            session = self.sessions.get(web_env)
+            if session is None:
+                web_env = f"MCID_{self.seed}_{next(self.session_numbers)}"
+                session = self.sessions[web_env] = {
+                    "created": time.time(), "queries": []}
+            session["queries"].append(term)
+            return web_env, len(session["queries"])
+
+    def respond(self, params):
+        """Return the status, headers, and body of the response to a
+        request."""
+        term = params.get("term", [""])[0]
+        web_env = params.get("WebEnv", [None])[0]
+        with self.lock:
+            self.calls += 1
+            attempt = self.sent[term] = self.sent.get(term, 0) + 1
+        delay = self.latency + self.jitter * (
+            2 * uniform(self.seed, "delay", term, attempt) - 1)
+        time.sleep(max(0.0, delay))
+        roll = uniform(self.seed, "status", term, attempt)
+        if roll < self.rate_limited:
+            return 429, {"Retry-After": "1"}, "Too Many Requests"
+        if roll < self.rate_limited + self.errors:
+            return 500, {}, "Internal Server Error"
+        history = params.get("usehistory", ["n"])[0] == "y"
+        try:
+            if history:
+                search, unfound = self.recall(term, web_env), []
+            else:
+                search, unfound = self.unmatched(term)
+            count = self.corpus.count(search)
+        except ValueError as error:
+            body = f"<ERROR>{error}</ERROR>"
+        else:
+            body = f"<Count>{count}</Count>"
+            if history:
+                web_env, query_key = self.keep(search, web_env)
+                body += (
+                    f"<QueryKey>{query_key}</QueryKey>"
+                    f"<WebEnv>{web_env}</WebEnv>")
+            if unfound:
+                body += "<ErrorList>" + "".join(
+                    f"<PhraseNotFound>{reference}</PhraseNotFound>"
+                    for reference in unfound) + "</ErrorList>"
+        return 200, {"Content-Type": "text/xml"}, (
+            '<?xml version="1.0" encoding="UTF-8" ?>\n'
+            f"<eSearchResult>{body}</eSearchResult>\n")
+
+    def handler(self):
+        """Return the request handler class for this server."""
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def answer(self, params):
+                status, headers, body = mock.respond(params)
+                data = body.encode("utf-8")
+                with mock.lock:
+                    mock.statuses[status] = mock.statuses.get(status, 0) + 1
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                query = urlparse(self.path).query
+                with mock.lock:
+                    mock.received += len(query)
+                self.answer(parse_qs(query))
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                with mock.lock:
+                    mock.received += length
+                self.answer(parse_qs(self.rfile.read(length).decode()))
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        """Start serving in a background thread and return the URL."""
+        self.server = ThreadingHTTPServer(
+            ("127.0.0.1", self.port), self.handler())
+        self.server.daemon_threads = True
+        threading.Thread(
+            target=self.server.serve_forever, daemon=True).start()
+        return self.url
+
+    def stop(self):
+        """Stop serving."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve made-up esearch counts on this computer.")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--latency", type=float, default=0.0,
+        help="seconds each response takes (default: 0)")
+    parser.add_argument(
+        "--jitter", type=float, default=0.0,
+        help="seconds the latency varies either way (default: 0)")
+    parser.add_argument(
+        "--rate-limited", type=float, default=0.0,
+        help="fraction of requests that get a 429 (default: 0)")
+    parser.add_argument(
+        "--errors", type=float, default=0.0,
+        help="fraction of requests that get a 500 (default: 0)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--history-lifetime", type=float, default=None,
+        help="seconds a history server session lasts (default: no limit)")
+    args = parser.parse_args()
+    # Imported here so that the server can be used without the presets.
+    from medline_trends import presets
+    parents = {}
+    for preset in presets.BY_NAME.values():
+        parents.update(preset.parents or {})
+    server = MockServer(
+        Corpus(parents, args.seed), args.latency, args.jitter,
+        args.rate_limited, args.errors, args.seed, args.port,
+        args.history_lifetime)
+    print(f"Serving {server.start()}; press Ctrl-C to stop")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
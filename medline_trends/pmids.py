@@ -0,0 +1,127 @@
+"""
+SUMMARY: This module is the "pmids" mode of the engine. Instead of
+    asking the server for the size of every (term, year) intersection,
+    it harvests the PMIDs of the user-selected MeSH once for each year
+    and the PMIDs of each term once for the whole range of years, then
+    intersects the lists on this computer. The number of searches
+    grows with the number of terms, not the number of terms times the
+    number of years, and the lists are cached, so a term's list can be
+    reused for the next user-selected MeSH.
+
+LIMITS: PubMed only returns the first 10,000 PMIDs of a search. When a
+    search has more, its date range is split in half until each piece
+    has 10,000 or fewer. Terms with millions of citations (for example,
+    "United States") take many searches to harvest; for those, the
+    default mode may be quicker the first time.
+"""
+
+# The asyncio module is used to harvest the pieces of a split search
+    # at the same time.
+import asyncio
+# The datetime module is used to split date ranges.
+from datetime import date, timedelta
+# The xml.etree module reads the esearch responses as a stream.
+from xml.etree import ElementTree
+
+# The numpy module holds the PMID lists as sorted arrays and intersects
+    # them.
+import numpy as np
+
+# The most PMIDs PubMed returns for one search.
+PAGE = 10000
+
+
+def date_query(clause, start, end):
+    """Return a search for the citations matching a clause that were
+    published between two dates."""
+    return f"{clause} AND {start:%Y/%m/%d}:{end:%Y/%m/%d}[pdat]"
+
+
+def parse_ids(text):
+    """Return the count and the PMIDs in an esearch response. As with
+    counts (see eutils.parse_count()), the response is read as a stream
+    and only the Count element and the Id elements of the IdList are
+    kept. Raise ValueError for a response without a count."""
+    parser = ElementTree.XMLPullParser(events=("start", "end"))
+    parser.feed(text)
+    parser.close()
+    count = None
+    ids = []
+    errors = []
+    in_list = False
+    for event, elem in parser.read_events():
+        if event == "start":
+            if elem.tag == "IdList":
+                in_list = True
+            continue
+        if elem.tag == "Count" and count is None:
+            count = int(elem.text)
+        elif elem.tag == "IdList":
+            in_list = False
+        elif in_list and elem.tag == "Id":
+            ids.append(int(elem.text))
+        elif elem.tag == "ERROR":
+            errors.append(elem.text)
+        elem.clear()
+    if count is None:
+        raise ValueError(f"No count: {'; '.join(errors)}")
+    return count, ids
+
+
+async def _harvest(client, clause, start, end):
+    """Return the PMIDs matching a clause that were published between
+    two dates, splitting the range until each search fits in one
+    page."""
+    query = date_query(clause, start, end)
+    count, ids = parse_ids(await client.search(query, retmax=PAGE))
+    if count <= PAGE:
+        return ids
+    if start == end:
+        raise RuntimeError(
+            f"{query} has {count} citations on one day; only {PAGE} can "
+            "be retrieved")
+    middle = start + (end - start) // 2
+    halves = await asyncio.gather(
+        _harvest(client, clause, start, middle),
+        _harvest(client, clause, middle + timedelta(days=1), end))
+    return halves[0] + halves[1]
+
+
+async def harvest(client, clause, start_year, end_year):
+    """Return a sorted array of the PMIDs matching a clause that were
+    published from start_year through end_year. The array is cached
+    with the same expiry as counts for those years."""
+    start, end = date(start_year, 1, 1), date(end_year, 12, 31)
+    key = date_query(clause, start, end)
+    if client.cache is not None:
+        cached = client.cache.get_ids(key)
+        if cached is not None:
+            return np.frombuffer(cached, dtype="<u4")
+    # A citation can match more than one piece of a split range, since
+        # [pdat] covers both its print and electronic dates.
+    ids = np.unique(np.array(
+        await _harvest(client, clause, start, end), dtype="<u4"))
+    if client.cache is not None:
+        client.cache.put_ids(key, ids.tobytes())
+    return ids
+
+
+def cell_counts(user_clause, term_clauses, years, client):
+    """Yield ((term clause, year), count) for each intersection, a term
+    at a time as each term's harvest comes back. The user clause is
+    harvested once for each year, which doubles as the year of each of
+    its PMIDs, and each term clause once for the whole range. Terms
+    whose harvest fails are left out."""
+    years = list(years)
+
+    async def user_year(yr):
+        return await harvest(client, user_clause, yr, yr)
+
+    async def term(clause):
+        return await harvest(client, clause, years[0], years[-1])
+
+    user_ids = dict(client.map(user_year, years))
+    for clause, ids in client.map(term, list(dict.fromkeys(term_clauses))):
+        for yr, year_ids in user_ids.items():
+            yield (clause, yr), len(
+                np.intersect1d(ids, year_ids, assume_unique=True))
@@ -0,0 +1,299 @@
+"""
+SUMMARY: This module holds the lists of MeSH that the mesh-intersections
+    programs intersect with the user-selected MeSH. Each list is wrapped
+    in a preset that also names the CSV file and the CSV field that
+    holds the MeSH from the list. For the lists that cover a MeSH and
+    the headings 1-2 levels below it, the preset also records which
+    heading in the list each one sits under, so that the engine can
+    skip the years in which the heading above is already zero.
+
+RULES: MeSH is revised every year, so each preset also has a rule that
+    selects its terms from the MeSH tree (see medline_trends/mesh.py).
+    If a MeSH descriptor file is available (see medline_trends/
+    engine.py), the terms come from the rule and the file, and the
+    lists here are only used without one.
+"""
+
+# The Preset record type is defined by the engine.
+from medline_trends.engine import Preset
+# Rules select terms from the MeSH tree.
+from medline_trends.mesh import Subtree
+
+
+def parents(root, terms, groups):
+    """Return a dictionary of the heading each term sits under, by term.
+    Terms in a group sit under the group's heading; every other term
+    sits under the root."""
+    found = {term: root for term in terms if term != root}
+    for parent, children in groups.items():
+        found.update((child, parent) for child in children)
+    return found
+
+
+# Create a list of MeSH that includes "Physicians" and all headings
+    # that are one level below it.
+physician_subsets = [
+    "Physicians", "Allergists", "Anesthesiologists", "Cardiologists",
+    "Dermatologists", "Endocrinologists", "Foreign Medical Graduates",
+    "Gastroenterologists", "General Practitioners", "Geriatricians",
+    "Gynecologists", "Hospitalists", "Nephrologists", "Neurologists",
+    "Obstetricians", "Occupational Health Physicians", "Oncologists",
+    "Ophthalmologists", "Osteopathic Physicians", "Otolaryngologists",
+    "Pathologists", "Pediatricians", "Physiatrists", "Physicians, Family",
+    "Physicians, Primary Care", "Physicians, Women", "Pulmonologists",
+    "Radiologists", "Rheumatologists", "Surgeons", "Urologists"]
+PHYSICIANS = Preset(
+    "physicians", "physician_subset", physician_subsets,
+    parents("Physicians", physician_subsets, {}),
+    [Subtree("Physicians", 0, 1)])
+
+# Create a list of MeSH that includes "Health Personnel" and all
+    # headings that are 1-2 levels below it.
+hp_subsets = [
+    "Health Personnel", "Allied Health Personnel", "Animal Technicians",
+    "Community Health Workers", "Dental Auxiliaries",
+    "Emergency Medical Technicians", "Home Health Aides",
+    "Licensed Practical Nurses", "Medical Record Administrators",
+    "Medical Secretaries", "Nursing Assistants",
+    "Operating Room Technicians", "Paramedics", "Pharmacy Technicians",
+    "Physical Therapist Assistants", "Physician Assistants", "Anatomists",
+    "Anesthetists", "Anesthesiologists", "Nurse Anesthetists", "Audiologists",
+    "Caregivers", "Case Managers", "Coroners and Medical Examiners",
+    "Dental Staff", "Dental Staff, Hospital", "Dentists", "Dentists, Women",
+    "Endodontists", "Oral and Maxillofacial Surgeons", "Orthodontists",
+    "Doulas", "Emergency Medical Dispatcher", "Epidemiologists",
+    "Faculty, Dental", "Faculty, Medical", "Faculty, Nursing",
+    "Health Educators", "Health Facility Administrators",
+    "Hospital Administrators", "Infection Control Practitioners",
+    "Medical Chaperones", "Medical Laboratory Personnel", "Medical Staff",
+    "Medical Staff, Hospital", "Nurses", "Nurse Administrators",
+    "Nurse Practitioners", "Nurse Specialists", "Nurses, Community Health",
+    "Nurses, International", "Nurses, Male", "Nurses, Public Health",
+    "Nursing Staff", "Nursing Staff, Hospital", "Nutritionists",
+    "Occupational Therapists", "Optometrists", "Personnel, Hospital",
+    "Hospital Volunteers", "Pharmacists", "Physical Therapists",
+    "Physician Executives", "Physicians", "Allergists", "Cardiologists",
+    "Dermatologists", "Endocrinologists", "Foreign Medical Graduates",
+    "Gastroenterologists", "General Practitioners", "Geriatricians",
+    "Gynecologists", "Hospitalists", "Nephrologists", "Neurologists",
+    "Obstetricians", "Occupational Health Physicians", "Oncologists",
+    "Ophthalmologists", "Osteopathic Physicians", "Otolaryngologists",
+    "Pathologists", "Pediatricians", "Physiatrists", "Physicians, Family",
+    "Physicians, Primary Care", "Physicians, Women", "Pulmonologists",
+    "Radiologists", "Rheumatologists", "Surgeons", "Urologists",
+    "Psychotherapists", "Traditional Medicine Practitioners", "Veterinarians"]
+# The headings in hp_subsets that have headings from the list one level
+    # below them.
+hp_groups = {
+    "Allied Health Personnel": [
+        "Animal Technicians", "Community Health Workers",
+        "Dental Auxiliaries", "Emergency Medical Technicians",
+        "Home Health Aides", "Licensed Practical Nurses",
+        "Medical Record Administrators", "Medical Secretaries",
+        "Nursing Assistants", "Operating Room Technicians", "Paramedics",
+        "Pharmacy Technicians", "Physical Therapist Assistants",
+        "Physician Assistants"],
+    "Anesthetists": ["Anesthesiologists", "Nurse Anesthetists"],
+    "Dental Staff": ["Dental Staff, Hospital"],
+    "Dentists": [
+        "Dentists, Women", "Endodontists", "Oral and Maxillofacial Surgeons",
+        "Orthodontists"],
+    "Health Facility Administrators": ["Hospital Administrators"],
+    "Medical Staff": ["Medical Staff, Hospital"],
+    "Nurses": [
+        "Nurse Administrators", "Nurse Practitioners", "Nurse Specialists",
+        "Nurses, Community Health", "Nurses, International",
+        "Nurses, Male", "Nurses, Public Health"],
+    "Nursing Staff": ["Nursing Staff, Hospital"],
+    "Personnel, Hospital": ["Hospital Volunteers"],
+    # "Anesthesiologists" is listed under "Anesthetists" instead.
+    "Physicians": [
+        term for term in physician_subsets
+        if term not in ("Physicians", "Anesthesiologists")]}
+HEALTH_PERSONNEL = Preset(
+    "health-personnel", "health_personnel_subset", hp_subsets,
+    parents("Health Personnel", hp_subsets, hp_groups),
+    [Subtree("Health Personnel", 0, 2)])
+
+# Create a list of MeSH that includes "Medicine" and all headings that
+    # are 1-2 levels below it.
+medicine_subsets = [
+    "Medicine", "Addiction Medicine", "Adolescent Medicine",
+    "Aerospace Medicine", "Allergy and Immunology", "Immunochemistry",
+    "Anesthesiology", "Bariatric Medicine", "Behavioral Medicine",
+    "Clinical Medicine", "Evidence-Based Medicine", "Genomic Medicine",
+    "Precision Medicine", "Community Medicine", "Dermatology",
+    "Disaster Medicine", "Emergency Medicine", "Pediatric Emergency Medicine",
+    "Forensic Medicine", "Forensic Genetics", "Forensic Pathology",
+    "General Practice", "Family Practice", "Genetics, Medical",
+    "Geography, Medical", "Topography, Medical", "Geriatrics", "Geroscience",
+    "Global Health", "Hospital Medicine", "Integrative Medicine",
+    "Internal Medicine", "Cardiology", "Endocrinology", "Gastroenterology",
+    "Hematology", "Infectious Disease Medicine", "Medical Oncology",
+    "Nephrology", "Pulmonary Medicine", "Rheumatology",
+    "Sleep Medicine Specialty", "Military Medicine", "Molecular Medicine",
+    "Naval Medicine", "Submarine Medicine", "Neurology", "Neuropathology",
+    "Neurotology", "Osteopathic Medicine", "Palliative Medicine", "Pathology",
+    "Pathology, Clinical", "Pathology, Molecular", "Pathology, Surgical",
+    "Telepathology", "Pediatrics", "Neonatology", "Perinatology",
+    "Perioperative Medicine", "Physical and Rehabilitation Medicine",
+    "Rehabilitation", "Psychiatry", "Adolescent Psychiatry",
+    "Biological Psychiatry", "Child Psychiatry", "Community Psychiatry",
+    "Forensic Psychiatry", "Geriatric Psychiatry", "Military Psychiatry",
+    "Neuropsychiatry", "Public Health", "Epidemiology", "Preventive Medicine",
+    "Radiology", "Imaging Genomics", "Nuclear Medicine", "Radiation Genomics",
+    "Radiation Oncology", "Radiology, Interventional",
+    "Regenerative Medicine", "Reproductive Medicine", "Andrology",
+    "Gynecology", "Social Medicine", "Specialties, Surgical",
+    "Colorectal Surgery", "General Surgery", "Neurosurgery", "Obstetrics",
+    "Ophthalmology", "Orthognathic Surgery", "Orthopedics", "Otolaryngology",
+    "Surgery, Plastic", "Surgical Oncology", "Thoracic Surgery",
+    "Traumatology", "Urology", "Sports Medicine",
+    "Sports Nutritional Sciences", "Veterinary Sports Medicine",
+    "Telemedicine", "Teleradiology", "Telerehabilitation",
+    "Theranostic Nanomedicine", "Travel Medicine", "Tropical Medicine",
+    "Vaccinology", "Venereology", "Wilderness Medicine"]
+# The headings in medicine_subsets that have headings from the list one
+    # level below them.
+medicine_groups = {
+    "Allergy and Immunology": ["Immunochemistry"],
+    "Clinical Medicine": [
+        "Evidence-Based Medicine", "Genomic Medicine", "Precision Medicine"],
+    "Emergency Medicine": ["Pediatric Emergency Medicine"],
+    "Forensic Medicine": ["Forensic Genetics", "Forensic Pathology"],
+    "General Practice": ["Family Practice"],
+    "Geography, Medical": ["Topography, Medical"],
+    "Internal Medicine": [
+        "Cardiology", "Endocrinology", "Gastroenterology", "Hematology",
+        "Infectious Disease Medicine", "Medical Oncology", "Nephrology",
+        "Pulmonary Medicine", "Rheumatology", "Sleep Medicine Specialty"],
+    "Naval Medicine": ["Submarine Medicine"],
+    "Neurology": ["Neuropathology", "Neurotology"],
+    "Pathology": [
+        "Pathology, Clinical", "Pathology, Molecular", "Pathology, Surgical",
+        "Telepathology"],
+    "Pediatrics": ["Neonatology", "Perinatology"],
+    "Physical and Rehabilitation Medicine": ["Rehabilitation"],
+    "Psychiatry": [
+        "Adolescent Psychiatry", "Biological Psychiatry", "Child Psychiatry",
+        "Community Psychiatry", "Forensic Psychiatry", "Geriatric Psychiatry",
+        "Military Psychiatry", "Neuropsychiatry"],
+    "Public Health": ["Epidemiology", "Preventive Medicine"],
+    "Radiology": [
+        "Imaging Genomics", "Nuclear Medicine", "Radiation Genomics",
+        "Radiation Oncology", "Radiology, Interventional"],
+    "Reproductive Medicine": ["Andrology", "Gynecology"],
+    "Specialties, Surgical": [
+        "Colorectal Surgery", "General Surgery", "Neurosurgery", "Obstetrics",
+        "Ophthalmology", "Orthognathic Surgery", "Orthopedics",
+        "Otolaryngology", "Surgery, Plastic", "Surgical Oncology",
+        "Thoracic Surgery", "Traumatology", "Urology"],
+    "Sports Medicine": [
+        "Sports Nutritional Sciences", "Veterinary Sports Medicine"],
+    "Telemedicine": ["Teleradiology", "Telerehabilitation"]}
+MEDICINE = Preset(
+    "medicine", "medicine_subset", medicine_subsets,
+    parents("Medicine", medicine_subsets, medicine_groups),
+    [Subtree("Medicine", 0, 2)])
+
+# Create a list of MeSH for geographic locations as described in the
+    # documentation for mesh-intersections_geographic-locations.py.
+geo_places = [
+    "Afghanistan", "Albania", "Algeria", "Andorra", "Angola",
+    "Antarctic Regions", "Antigua and Barbuda", "Arctic Regions", "Argentina",
+    "Armenia", "Aruba", "Atlantic Ocean", "Australia", "Austria",
+    "Azerbaijan", "Azores", "Bahamas", "Bahrain", "Balkan Peninsula",
+    "Bangladesh", "Barbados", "Belgium", "Belize", "Benin", "Bermuda",
+    "Bhutan", "Black Sea", "Bolivia", "Borneo", "Bosnia and Herzegovina",
+    "Botswana", "Brazil", "British Virgin Islands", "Brunei", "Bulgaria",
+    "Burkina Faso", "Burundi", "Cabo Verde", "Cambodia", "Cameroon", "Canada",
+    "Caribbean Netherlands", "Central African Republic", "Chad", "Chile",
+    "China", "Colombia", "Comoros", "Congo", "Costa Rica", "Cote d'Ivoire",
+    "Croatia", "Cuba", "Curacao", "Cyprus", "Czech Republic",
+    "Democratic People's Republic of Korea",
+    "Democratic Republic of the Congo", "Denmark", "Djibouti", "Dominica",
+    "Dominican Republic", "Ecuador", "Egypt", "El Salvador",
+    "Equatorial Guinea", "Eritrea", "Estonia", "Eswatini", "Ethiopia",
+    "Falkland Islands", "Fiji", "Finland", "France", "French Guiana", "Gabon",
+    "Gambia", "Georgia (Republic)", "Germany", "Ghana", "Gibraltar", "Greece",
+    "Greenland", "Grenada", "Guadeloupe", "Guam", "Guatemala", "Guinea",
+    "Guinea-Bissau", "Guyana", "Haiti", "Hawaii", "Honduras", "Hungary",
+    "Iceland", "India", "Indian Ocean", "Indochina", "Indonesia", "Iran",
+    "Iraq", "Ireland", "Israel", "Italy", "Jamaica", "Japan", "Jordan",
+    "Kazakhstan", "Kenya", "Kosovo", "Kuwait", "Kyrgyzstan", "Laos", "Latvia",
+    "Lebanon", "Lesotho", "Liberia", "Libya", "Liechtenstein", "Lithuania",
+    "Luxembourg", "Macau", "Madagascar", "Malawi", "Malaysia", "Maldives",
+    "Mali", "Malta", "Martinique", "Mauritania", "Mauritius",
+    "Mediterranean Sea", "Mekong Valley", "Mexico", "Moldova", "Monaco",
+    "Mongolia", "Montenegro", "Morocco", "Mozambique", "Myanmar", "Namibia",
+    "Nepal", "Netherlands", "New Caledonia", "New Zealand", "Nicaragua",
+    "Niger", "Nigeria", "Norway", "Oman", "Pacific Ocean", "Pakistan",
+    "Palau", "Panama", "Papua New Guinea", "Paraguay", "Peru", "Philippines",
+    "Pitcairn Island", "Poland", "Portugal", "Prince Edward Island",
+    "Puerto Rico", "Qatar", "Republic of Belarus", "Republic of Korea",
+    "Republic of North Macedonia", "Reunion", "Romania", "Russia", "Rwanda",
+    "Saint Kitts and Nevis", "Saint Lucia",
+    "Saint Vincent and the Grenadines", "Samoa", "San Marino",
+    "Sao Tome and Principe", "Saudi Arabia", "Senegal", "Serbia",
+    "Seychelles", "Sicily", "Sierra Leone", "Singapore", "Sint Maarten",
+    "Slovakia", "Slovenia", "Somalia", "South Africa", "South Sudan", "Spain",
+    "Sri Lanka", "Sudan", "Suriname", "Svalbard", "Sweden", "Switzerland",
+    "Syria", "Taiwan", "Tajikistan", "Tanzania", "Thailand", "Timor-Leste",
+    "Togo", "Tonga", "Trinidad and Tobago", "Tunisia", "Turkey",
+    "Turkmenistan", "Uganda", "Ukraine", "United Arab Emirates",
+    "United Kingdom", "United States", "United States Virgin Islands",
+    "Uruguay", "Uzbekistan", "Vanuatu", "Vatican City", "Venezuela",
+    "Vietnam", "Yemen", "Zambia", "Zimbabwe"]
+# The rule behind geo_places, from the list at the end of the
+    # documentation for mesh-intersections_geographic-locations.py: the
+    # MeSH one level below each of these, except as indicated.
+geo_rule = [
+    Subtree("Africa, Northern", 1, 1),
+    Subtree("Africa, Central", 1, 1),
+    Subtree("Africa, Eastern", 1, 1),
+    Subtree("Africa, Southern", 1, 1),
+    Subtree("Africa, Western", 1, 1),
+    Subtree("Caribbean Region", 1, 1, ["West Indies"]),
+    Subtree("West Indies", 1, 1),
+    Subtree("Central America", 1, 1),
+    Subtree("North America", 1, 1),
+    Subtree("South America", 1, 1),
+    # These two MeSH themselves, not the MeSH below them.
+    Subtree("Antarctic Regions", 0, 0),
+    Subtree("Arctic Regions", 0, 0),
+    Subtree("Asia, Central", 1, 1),
+    Subtree("Asia, Eastern", 1, 1, ["Korea"]),
+    Subtree("Korea", 1, 1),
+    Subtree("Asia, Northern", 1, 1),
+    Subtree("Asia, Southeastern", 1, 1),
+    Subtree("Asia, Southern", 1, 1),
+    Subtree("Middle East", 1, 1),
+    Subtree("Europe", 1, 1, [
+        "Europe, Eastern", "European Alpine Region", "Mediterranean Region",
+        "Scandinavian and Nordic Countries", "Transcaucasia", "USSR"]),
+    Subtree("Europe, Eastern", 1, 1),
+    Subtree("Baltic States", 1, 1),
+    Subtree("Mediterranean Islands", 1, 1),
+    Subtree("Scandinavian and Nordic Countries", 1, 1),
+    Subtree("Transcaucasia", 1, 1),
+    Subtree("Islands", 1, 1, [
+        "Atlantic Islands", "Indian Ocean Islands", "Mediterranean Islands",
+        "Pacific Islands", "West Indies"]),
+    Subtree("Atlantic Islands", 1, 1),
+    Subtree("Indian Ocean Islands", 1, 1),
+    # Only "New Zealand" from the MeSH below "Pacific Islands."
+    Subtree("New Zealand", 0, 0),
+    Subtree("Melanesia", 1, 1),
+    Subtree("Micronesia", 1, 1),
+    Subtree("Polynesia", 1, 1),
+    Subtree("Australasia", 1, 1, ["Pacific Islands"]),
+    Subtree("Oceans and Seas", 1, 1)]
+GEOGRAPHIC_LOCATIONS = Preset(
+    "geographic-locations", "geographic_location", geo_places,
+    rule=geo_rule)
+
+# The presets by the name that starts their CSV filenames, for choosing
+    # one from the command line.
+BY_NAME = {
+    preset.name: preset for preset in [
+        PHYSICIANS, HEALTH_PERSONNEL, MEDICINE, GEOGRAPHIC_LOCATIONS]}
@@ -0,0 +1,147 @@
+"""
+SUMMARY: This module brings the output of an earlier run up to date
+    without running the whole job again. The counts for the years that
+    had settled when the earlier run was made are taken from its CSV
+    file or journal as they are. Only the years that are new since
+    then, and the years that were still settling then, whose counts
+    keep growing as indexing catches up, are searched for again. It
+    then reports each cell whose count changed, and by how much.
+
+USAGE: Run this from the folder that holds the programs, with the
+    journal of the earlier run (see medline_trends/journal.py):
+        python -m medline_trends.refresh <journal> [--end-year YYYY]
+            [--settling-years N] [--changes <CSV file>] [--mode <mode>]
+    The job is the one in the journal, but ending in --end-year (by
+    default, engine.default_end_year()). The new CSV file and journal
+    are written next to the earlier journal, and the changes are
+    printed and, with --changes, written to a CSV file. --settling-years
+    is how many of the most recent years as of the earlier run,
+    counting the year it started in, are searched for again even though
+    it has them (default: 3). The journal records the date its run
+    started; for a journal from before that was kept, every year is
+    searched for again. From other code, refresh() also takes an
+    earlier CSV file, whose date is the one in its name.
+"""
+
+# The argparse module reads the command-line arguments.
+import argparse
+# The collections module is used to define a record type for changes.
+from collections import namedtuple
+# The csv module reads earlier CSV files.
+import csv
+# The datetime module reads the date in the name of a CSV file.
+from datetime import date
+# The os module is used to build paths.
+import os
+# The re module finds the date in the name of a CSV file.
+import re
+
+from medline_trends import engine, sinks, totals
+from medline_trends.cache import SETTLING_YEARS
+from medline_trends.engine import Cell, csv_filename
+from medline_trends.journal import Journal, for_job
+
+# A cell whose count is not what it was in the earlier run.
+Change = namedtuple("Change", ["term", "year", "old", "new"])
+
+
+def read_csv(path, job):
+    """Return the counts in a CSV file written for a job (or for the
+    same job with other years), by cell."""
+    counts = {}
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            if job.preset.column is None:
+                cell = Cell(job.preset.terms[0], int(row["publication_year"]))
+            else:
+                cell = Cell(row[job.preset.column], int(row["year"]))
+            counts[cell] = int(row["intersecting_citations"])
+    return counts
+
+
+def previous_counts(path, job):
+    """Return the counts in an earlier CSV file or journal, by cell."""
+    if path.endswith(".journal"):
+        return Journal(path).read()
+    return read_csv(path, job)
+
+
+def run_date(path):
+    """Return the date an earlier run started, from its journal or the
+    name of its CSV file, or None if it cannot be told."""
+    if path.endswith(".journal"):
+        return Journal(path).started()
+    found = re.search(r"_(\d{4}-\d{2}-\d{2})\.csv$", path)
+    return date.fromisoformat(found.group(1)) if found else None
+
+
+def refresh(job, previous_path, path, client=None, mode="esearch",
+            settling_years=SETTLING_YEARS, descriptors=None, started=None):
+    """Bring an earlier run of a job up to date and return the rows of
+    the job and the cells whose counts changed. The counts for the
+    years that had settled when the earlier run started (by default,
+    on the date its journal or the name of its CSV file gives) are
+    taken from its CSV file or journal; the rest are searched for. The
+    journal of the job is kept in the given folder and starts over with
+    the counts that are reused."""
+    previous = previous_counts(previous_path, job)
+    # Judged as the table of totals judges its own years, so an earlier
+        # run of unknown date has no settled years.
+    last_settled = totals.settled(
+        started or run_date(previous_path), settling_years)
+    kept = {
+        cell: count for cell, count in previous.items()
+        if cell.year <= last_settled}
+    journal = for_job(job, path)
+    journal.reset(job, kept)
+    rows = engine.run(job, client, mode, journal, descriptors)
+    changes = [
+        Change(cell.term, cell.year, previous[cell], count)
+        for cell, count in journal.read().items()
+        if cell in previous and cell not in kept
+        and count != previous[cell]]
+    return rows, changes
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Bring an earlier run of a job up to date, searching "
+        "only for the new and settling years.")
+    parser.add_argument("journal", help="journal of the earlier run")
+    parser.add_argument(
+        "--end-year", type=int, default=engine.default_end_year(),
+        help="last year (default: engine.default_end_year())")
+    parser.add_argument(
+        "--settling-years", type=int, default=SETTLING_YEARS,
+        help="recent years to search for again (default: "
+        f"{SETTLING_YEARS})")
+    parser.add_argument(
+        "--changes", default=None, help="CSV file for the changed cells")
+    parser.add_argument(
+        "--mode", choices=sorted(engine.MODES), default="esearch",
+        help="how to get the counts (default: esearch)")
+    args = parser.parse_args()
+    job = Journal(args.journal).job()
+    if job is None:
+        parser.error(f"{args.journal} is not a started journal")
+    job = job._replace(end_year=args.end_year)
+    path = os.path.dirname(os.path.abspath(args.journal))
+    rows, changes = refresh(
+        job, args.journal, path, mode=args.mode,
+        settling_years=args.settling_years)
+    engine.write_csv(rows, path, csv_filename(job))
+    for change in changes:
+        print(f"{change.term}\t{change.year}\t{change.old} -> "
+              f"{change.new} ({change.new - change.old:+d})")
+    print(f"{len(changes)} cells changed; wrote "
+          f"{os.path.join(path, csv_filename(job))}")
+    if args.changes:
+        with sinks.CsvSink(args.changes) as sink:
+            for change in changes:
+                sink.write({
+                    **change._asdict(),
+                    "difference": change.new - change.old})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+SUMMARY: This module splits a job into shards that can run on several
+    computers at once, each with its own API key and so its own share
+    of the NCBI rate limit, and merges what they find into the CSV file
+    that one computer running the whole job would have written. A shard
+    is a block of consecutive years of the job. The same job split
+    into the same number of shards always gives the same blocks, so
+    each computer only needs to be told its shard number.
+
+USAGE: On each computer, run this from the folder that holds the
+    programs, with that computer's API key and shard number:
+        python -m medline_trends.shards run <MeSH> --preset <preset>
+            <shard> <shards> [--start-year YYYY] [--end-year YYYY]
+            [--api-key KEY] [--folder <folder>]
+    <preset> is the name of a preset in medline_trends/presets.py
+    (physicians, health-personnel, medicine, or geographic-locations);
+    use --pair <MeSH> instead to intersect two MeSH. Each shard writes
+    a partial file, a journal (see medline_trends/journal.py) named
+    after the job with ".shard-<shard>-of-<shards>.journal" at the end.
+    A shard that stops partway picks up where it left off when it is
+    run again; one that finished starts over. Then copy the partial
+    files to one folder and run:
+        python -m medline_trends.shards merge <partial file> ...
+            [--folder <folder>]
+
+MERGE: The merge checks that the partial files are all from the same
+    job and that every shard is there. A shard that was run more than
+    once (on two computers, say) is only counted once, and if two
+    partial files disagree about a count, the merge stops. It also
+    stops if any cell or yearly total is missing; run that shard again
+    to fill it in. Each partial file also keeps the yearly totals its
+    shard used, so the merge does not search for anything.
+"""
+
+# The argparse module reads the command-line arguments.
+import argparse
+# The os module is used to build the paths of the partial files.
+import os
+
+from medline_trends import engine, eutils, totals
+from medline_trends.engine import Job, csv_filename, make_row, plan
+from medline_trends.journal import Journal, journal_filename
+
+
+def shard(job, index, shards):
+    """Return the part of a job that shard number index (counting from
+    1) of the given number of shards covers: a block of consecutive
+    years. The first blocks get one more year when the years do not
+    split evenly."""
+    years = job.end_year - job.start_year + 1
+    if not 1 <= index <= shards <= years:
+        raise ValueError(
+            f"Shard {index} of {shards} does not fit a job of {years} "
+            "years")
+    size, extra = divmod(years, shards)
+    start = job.start_year + (index - 1) * size + min(index - 1, extra)
+    end = start + size - 1 + (1 if index <= extra else 0)
+    return job._replace(start_year=start, end_year=end)
+
+
+def partial_filename(job, index, shards):
+    """Return the name of the partial file for a shard of a job."""
+    return (
+        journal_filename(job)[:-len(".journal")]
+        + f".shard-{index}-of-{shards}.journal")
+
+
+def run(job, index, shards, path, client=None, mode="esearch",
+        descriptors=None):
+    """Run one shard of a job, keeping its counts and totals in its
+    partial file in the given folder, and return its rows."""
+    client = client or eutils.EutilsClient()
+    part = shard(job, index, shards)
+    partial = Journal(
+        os.path.join(path, partial_filename(job, index, shards)))
+    # Start a finished shard over before its totals are read, since the
+        # engine would start it over anyway (see engine.stream()).
+    if partial.finished():
+        partial.restart()
+    records = list(partial.records())
+    try:
+        if not any("shard" in record for record in records):
+            partial.append({"shard": {
+                "index": index, "shards": shards,
+                "start_year": job.start_year, "end_year": job.end_year}})
+        # Keep the totals with the counts, so that the merge divides by
+            # the same totals the shard would have. A shard run again uses
+            # the totals it kept and only searches for the rest.
+        year_totals = {
+            record["year"]: record["total"]
+            for record in records if "total" in record}
+        found = totals.load([
+            yr for yr in range(part.start_year, part.end_year + 1)
+            if yr not in year_totals], client)
+        for yr, total in sorted(found.items()):
+            partial.append({"year": yr, "total": total})
+        year_totals.update(found)
+    finally:
+        partial.close()
+    return engine.run(
+        part, client, mode=mode, journal=partial, descriptors=descriptors,
+        year_totals=year_totals)
+
+
+def read_partial(path):
+    """Return the shard record, the job, the counts, and the totals in a
+    partial file."""
+    partial = Journal(path)
+    info = None
+    year_totals = {}
+    for record in partial.records():
+        if "shard" in record:
+            info = record["shard"]
+        elif "total" in record:
+            year_totals[record["year"]] = record["total"]
+    part = partial.job()
+    if info is None or part is None:
+        raise ValueError(f"{path} is not a started shard of a job")
+    return info, part, partial.read(), year_totals
+
+
+def merge(paths):
+    """Return the job that the partial files at the given paths are
+    shards of and the rows of its CSV file. Raise ValueError if they
+    are not all from the same job, if a shard is missing, if two of
+    them disagree, or if any cell or yearly total is missing."""
+    job = shards = None
+    seen = set()
+    counts, year_totals = {}, {}
+    for path in paths:
+        info, part, part_counts, part_totals = read_partial(path)
+        whole = part._replace(
+            start_year=info["start_year"], end_year=info["end_year"])
+        if job is None:
+            job, shards = whole, info["shards"]
+        elif (whole, info["shards"]) != (job, shards):
+            raise ValueError(f"{path} is from a different job")
+        if part != shard(job, info["index"], shards):
+            raise ValueError(
+                f"{path} does not cover the years of shard "
+                f"{info['index']} of {shards}")
+        seen.add(info["index"])
+        for key, found, merged in [
+                ("count", part_counts, counts),
+                ("total", part_totals, year_totals)]:
+            for item, value in found.items():
+                if merged.setdefault(item, value) != value:
+                    raise ValueError(
+                        f"The partial files disagree about the {key} for "
+                        f"{item}")
+    if job is None:
+        raise ValueError("No partial files were given")
+    missing = sorted(set(range(1, shards + 1)) - seen)
+    if missing:
+        raise ValueError(
+            f"Missing shards (of {shards}): {', '.join(map(str, missing))}")
+    untotalled = [
+        yr for yr in range(job.start_year, job.end_year + 1)
+        if yr not in year_totals]
+    if untotalled:
+        raise ValueError(
+            f"The partial files have no total for "
+            f"{', '.join(map(str, untotalled))}; run their shards again")
+    cells = plan(job)
+    absent = [cell for cell in cells if cell not in counts]
+    if absent:
+        raise ValueError(
+            f"{len(absent)} of {len(cells)} cells are missing, starting "
+            f"with {absent[0]}; run their shards again")
+    return job, [
+        make_row(job, cell, counts[cell], year_totals[cell.year])
+        for cell in cells]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run a shard of a job, or merge the shards of a job "
+        "into its CSV file.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run one shard of a job")
+    run_parser.add_argument("mesh", help="the user-selected MeSH")
+    preset = run_parser.add_mutually_exclusive_group(required=True)
+    preset.add_argument(
+        "--preset", help="name of a preset in medline_trends/presets.py")
+    preset.add_argument("--pair", help="a MeSH to intersect with")
+    run_parser.add_argument(
+        "shard", type=int, help="this shard's number, counting from 1")
+    run_parser.add_argument("shards", type=int, help="number of shards")
+    run_parser.add_argument(
+        "--start-year", type=int, default=totals.FIRST_YEAR,
+        help=f"first year (default: {totals.FIRST_YEAR})")
+    run_parser.add_argument(
+        "--end-year", type=int, default=engine.default_end_year(),
+        help="last year (default: engine.default_end_year())")
+    run_parser.add_argument(
+        "--api-key", default=None,
+        help="this computer's API key (default: NCBI_API_KEY)")
+    run_parser.add_argument(
+        "--mode", choices=sorted(engine.MODES), default="esearch",
+        help="how to get the counts (default: esearch)")
+    run_parser.add_argument(
+        "--url", default=eutils.ESEARCH_URL,
+        help="esearch URL, to test against a stand-in server (which "
+        "leaves out the cache of counts)")
+    run_parser.add_argument(
+        "--folder", default=".", help="folder for the partial file")
+    merge_parser = commands.add_parser(
+        "merge", help="merge the partial files of a job")
+    merge_parser.add_argument("partials", nargs="+", help="partial files")
+    merge_parser.add_argument(
+        "--folder", default=".", help="folder for the CSV file")
+    args = parser.parse_args()
+    if args.command == "run":
+        if args.pair:
+            chosen = engine.pair(args.pair)
+        else:
+            # Imported here so that merging does not need the presets.
+            from medline_trends import presets
+            if args.preset not in presets.BY_NAME:
+                parser.error(
+                    "--preset must be one of "
+                    f"{', '.join(sorted(presets.BY_NAME))}")
+            chosen = presets.BY_NAME[args.preset]
+        job = Job(args.mesh, chosen, args.start_year, args.end_year)
+        client = eutils.EutilsClient(api_key=args.api_key, url=args.url)
+        try:
+            run(job, args.shard, args.shards, args.folder, client,
+                args.mode)
+        except ValueError as error:
+            parser.error(str(error))
+    else:
+        try:
+            job, rows = merge(args.partials)
+        except ValueError as error:
+            parser.error(str(error))
+        engine.write_csv(rows, args.folder, csv_filename(job))
+        print(f"Wrote {len(rows)} rows to "
+              f"{os.path.join(args.folder, csv_filename(job))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+SUMMARY: This module holds the sinks that the rows of a run are written
+    to as they come out of the engine (see engine.stream()). Each row
+    is written, and flushed to disk, as soon as it arrives, so the
+    output of a long run can be watched as it fills in and only one row
+    is held in memory at a time. A sink is anything with a write(row)
+    method and a close() method; the sinks here can also be used in a
+    "with" statement, which closes them at the end.
+
+FORMAT: CsvSink writes the same CSV file the programs have always
+    written with pandas: UTF-8 with a byte order mark, the fields in
+    the order of the first row, and no index column. JsonLinesSink
+    writes one JSON object per row. ParquetSink writes a Parquet file
+    with typed columns: the years as 16-bit integers, the counts and
+    totals as 32-bit integers, the counts per 1,000 as 32-bit floats,
+    and the terms as strings. A Parquet file cannot be read until it
+    is closed, so its rows are written in row groups of up to 10,000,
+    to a temporary file that takes the file's name when the sink is
+    closed; a half-written file is never seen by a reader.
+
+DATASET: engine.dataset_path() places the Parquet file of each run in a
+    folder for its preset, its user-selected MeSH, and the date of the
+    run, named the way Hive, Spark, and pyarrow.dataset expect:
+        <root>/preset=<preset>/user_mesh=<MeSH>/run_date=YYYY-MM-DD/
+            <start year>-<end year>.parquet
+    Many runs can then be read as one table, and a filter on the
+    preset, the MeSH, or the date only opens the files it needs:
+        pyarrow.dataset.dataset(root, partitioning="hive")
+
+LIMITS: ParquetSink needs pyarrow (pip install pyarrow), which the rest
+    of the package does not; it is only imported when a Parquet file is
+    written.
+"""
+
+# The csv module writes the rows of the CSV file.
+import csv
+# The json module writes the rows of a JSON Lines file.
+import json
+# The os module provides the line ending that pandas used, creates the
+    # folders of a dataset, and gives a Parquet file its name once it is
+    # complete.
+import os
+
+# How many rows each row group of a Parquet file holds.
+ROW_GROUP = 10000
+
+# The Arrow type of each field of the rows, by name. Other fields are
+    # strings.
+PARQUET_TYPES = {
+    "year": "int16",
+    "publication_year": "int16",
+    "intersecting_citations": "int32",
+    "total_medline_citations": "int32",
+    "total_citations": "int32",
+    "intersecting_citations_per_1k": "float32"}
+
+
+class Sink:
+    """The base of the sinks here: a file opened for writing, which is
+    flushed after every row."""
+
+    encoding = "utf-8"
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "w", newline="", encoding=self.encoding)
+
+    def write(self, row):
+        """Write a row to the file."""
+        raise NotImplementedError
+
+    def close(self):
+        """Close the file."""
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CsvSink(Sink):
+    """A CSV file, written a row at a time."""
+
+    encoding = "utf-8-sig"
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.writer = None
+
+    def write(self, row):
+        """Write a row to the file, after the header if it is the first
+        row."""
+        if self.writer is None:
+            self.writer = csv.DictWriter(
+                self.file, fieldnames=list(row), lineterminator=os.linesep)
+            self.writer.writeheader()
+        self.writer.writerow(row)
+        self.file.flush()
+
+
+class JsonLinesSink(Sink):
+    """A JSON Lines file, written a row at a time."""
+
+    def write(self, row):
+        """Write a row to the file as one line of JSON."""
+        self.file.write(json.dumps(row) + "\n")
+        self.file.flush()
+
+
+class ParquetSink(Sink):
+    """A Parquet file, written a row group at a time."""
+
+    def __init__(self, path):
+        try:
+            # The pyarrow library writes the Parquet file. It is imported
+                # here because it is optional.
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as error:
+            raise ImportError(
+                "Writing Parquet files needs pyarrow; install it with "
+                "\"pip install pyarrow\"") from error
+        self.pyarrow = pyarrow
+        self.parquet = pyarrow.parquet
+        self.path = path
+        self.temporary = f"{path}.tmp"
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.schema = None
+        self.writer = None
+        self.rows = []
+
+    def write(self, row):
+        """Add a row to the file, writing a row group when there are
+        enough rows for one."""
+        self.rows.append(row)
+        if len(self.rows) >= ROW_GROUP:
+            self.flush()
+
+    def flush(self):
+        """Write the rows held so far as a row group."""
+        if not self.rows:
+            return
+        if self.schema is None:
+            self.schema = self.pyarrow.schema([
+                (name, getattr(self.pyarrow, PARQUET_TYPES.get(
+                    name, "string"))())
+                for name in self.rows[0]])
+            self.writer = self.parquet.ParquetWriter(
+                self.temporary, self.schema)
+        self.writer.write_table(self.pyarrow.Table.from_pylist(
+            self.rows, schema=self.schema))
+        self.rows = []
+
+    def close(self):
+        """Write the last row group and give the file its name."""
+        if self.rows is None:
+            return
+        self.flush()
+        if self.writer is None:
+            # A run without rows still leaves a file behind.
+            self.writer = self.parquet.ParquetWriter(
+                self.temporary, self.pyarrow.schema([]))
+        self.writer.close()
+        os.replace(self.temporary, self.path)
+        self.writer = self.rows = None
+
+    def discard(self):
+        """Close the file without giving it its name, as when a run
+        stops partway, and remove it."""
+        if self.writer is not None:
+            self.writer.close()
+        if os.path.exists(self.temporary):
+            os.remove(self.temporary)
+        self.writer = self.rows = None
+
+    def __exit__(self, kind, *exc_info):
+        if kind is None:
+            self.close()
+        else:
+            self.discard()
@@ -0,0 +1,80 @@
+"""
+SUMMARY: This module is the "spans" mode of the engine. Instead of
+    asking for the size of every (term, year) intersection, it first
+    asks for the size of the intersection over the whole range of
+    years. If that is zero, every year is zero and one search has done
+    the work of many. If not, the range is split in half and each half
+    is asked about in the same way, until each piece is a single year
+    or has a count of zero. The counts for single years are the same
+    as in the default mode, so the CSV file is the same.
+
+LIMITS: For a term that intersects the user-selected MeSH in most
+    years, splitting the range takes more searches than asking about
+    each year. Once a span's count is large enough that none of its
+    years is likely to be zero (see DENSE), its years are asked about
+    one at a time instead.
+"""
+
+# The asyncio module is used to search both halves of a span at the
+    # same time.
+import asyncio
+
+# The search terms for single years and ranges of years.
+from medline_trends.totals import span_query
+
+# A span whose count is at least this many times its number of years is
+    # not split further; each of its years is searched for instead.
+DENSE = 2
+
+
+def runs(years):
+    """Return the runs of consecutive years in a list of years, as
+    (first, last) pairs."""
+    spans = []
+    for yr in sorted(set(years)):
+        if spans and spans[-1][1] == yr - 1:
+            spans[-1][1] = yr
+        else:
+            spans.append([yr, yr])
+    return [tuple(span) for span in spans]
+
+
+def query(term_clause, user_clause, start, end):
+    """Return the search for the intersection of a term and the
+    user-selected MeSH from start through end."""
+    return " AND ".join([term_clause, user_clause, span_query(start, end)])
+
+
+async def _split(client, term_clause, user_clause, start, end, counts):
+    """Fill in counts[year] for each year from start through end."""
+    count = await client.count(query(term_clause, user_clause, start, end))
+    if start == end or count == 0:
+        counts.update((yr, count) for yr in range(start, end + 1))
+    elif count >= DENSE * (end - start + 1):
+        await asyncio.gather(*[
+            _split(client, term_clause, user_clause, yr, yr, counts)
+            for yr in range(start, end + 1)])
+    else:
+        middle = (start + end) // 2
+        await asyncio.gather(
+            _split(client, term_clause, user_clause, start, middle, counts),
+            _split(client, term_clause, user_clause, middle + 1, end,
+                   counts))
+
+
+def cell_counts(user_clause, term_years, client):
+    """Yield ((term clause, year), count) for each year of each term in
+    a dictionary of years by term clause, a term at a time as each
+    term's searches finish. Terms with a search that fails are left
+    out."""
+
+    async def term(clause):
+        counts = {}
+        await asyncio.gather(*[
+            _split(client, clause, user_clause, start, end, counts)
+            for start, end in runs(term_years[clause])])
+        return counts
+
+    for clause, counts in client.map(term, list(term_years)):
+        for yr, count in counts.items():
+            yield (clause, yr), count
@@ -0,0 +1,145 @@
+"""
+SUMMARY: This module supplies the total number of MEDLINE-indexed
+    citations published each year, which every program divides its
+    counts by. The totals are the same for every job, so instead of
+    searching for them at the start of every run, the programs read
+    them from a table of totals (medline_trends/data/
+    medline_totals.csv), if it has been made. Only the years that were
+    still settling when the table was made, and any years it does not
+    have yet, are searched for. Until the table is made, every year is
+    searched for, although the cache of counts (see
+    medline_trends/cache.py) keeps the totals of settled years for
+    good, so a computer only searches for those once.
+
+USAGE: To make the table, or to bring it up to date, run this from the
+    folder that holds the programs:
+        python -m medline_trends.totals
+    This searches again for the years that are still settling and for
+    any missing years, then rewrites the table with a new version.
+"""
+
+# The csv module is used to read and write the table.
+import csv
+# The datetime module is used to date each version of the table and to
+    # tell which years are settled.
+from datetime import date
+# The os module is used to find the table and create its folder.
+import os
+
+# Recent years are searched for again because their totals keep growing
+    # as indexing catches up.
+from medline_trends.cache import SETTLING_YEARS
+
+# The table of yearly totals, once it has been made.
+TABLE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "medline_totals.csv")
+
+# The first year in the table. See the documentation for the programs
+    # for why 1966 is the earliest default start year.
+FIRST_YEAR = 1966
+
+
+def year_query(year):
+    """Return the search term for every MEDLINE citation from a year."""
+    return f"{year}[pdat]"
+
+
+def span_query(start, end):
+    """Return the search term for every MEDLINE citation from start
+    through end. A single year has the same term as in year_query()."""
+    if start == end:
+        return year_query(start)
+    return f"{start}:{end}[pdat]"
+
+
+def read_table(path=TABLE_PATH):
+    """Return the version of the table (the date it was made, or None if
+    it has not been made) and a dictionary of its totals by year."""
+    version = None
+    totals = {}
+    if not os.path.exists(path):
+        return version, totals
+    with open(path, newline="", encoding="utf-8") as f:
+        lines = []
+        for line in f:
+            if line.startswith("# version:"):
+                version = date.fromisoformat(line.split(":", 1)[1].strip())
+            elif not line.startswith("#"):
+                lines.append(line)
+    for row in csv.DictReader(lines):
+        totals[int(row["year"])] = int(row["total_citations"])
+    return version, totals
+
+
+def write_table(totals, path=TABLE_PATH, version=None):
+    """Write a new version of the table."""
+    version = version or date.today()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        f.write(f"# version: {version.isoformat()}\n")
+        writer = csv.writer(f)
+        writer.writerow(["year", "total_citations"])
+        for yr in sorted(totals):
+            writer.writerow([yr, totals[yr]])
+
+
+def settled(version, settling_years=SETTLING_YEARS):
+    """Return the last year whose total was settled when the table was
+    made."""
+    if version is None:
+        return FIRST_YEAR - 1
+    return version.year - settling_years
+
+
+def fetch(years, client):
+    """Search for the totals for the given years. Years whose search
+    fails are left out."""
+    queries = {year_query(yr): yr for yr in years}
+    return {
+        queries[query]: count
+        for query, count in client.counts(list(queries))}
+
+
+def load(years, client, path=TABLE_PATH):
+    """Return a dictionary of the total number of MEDLINE-indexed
+    citations published each year. Settled years come from the table;
+    the rest are searched for. Years whose search fails are left
+    out."""
+    version, table = read_table(path)
+    last_settled = settled(version)
+    totals = {
+        yr: table[yr] for yr in years
+        if yr in table and yr <= last_settled}
+    missing = [yr for yr in years if yr not in totals]
+    if missing:
+        totals.update(fetch(missing, client))
+    return totals
+
+
+def refresh(client, path=TABLE_PATH, end_year=None):
+    """Search again for the years in the table that were still settling
+    when it was made, and for any years it does not have yet, and write
+    a new version of the table. Return the years that were searched
+    for."""
+    # Imported here so that reading the table does not need the engine.
+    from medline_trends.engine import default_end_year
+    end_year = end_year or default_end_year()
+    version, table = read_table(path)
+    last_settled = settled(version)
+    years = [
+        yr for yr in range(FIRST_YEAR, end_year + 1)
+        if yr not in table or yr > last_settled]
+    fetched = fetch(years, client)
+    if len(fetched) < len(years):
+        failed = sorted(set(years) - set(fetched))
+        raise RuntimeError(f"Could not retrieve totals for {failed}")
+    table.update(fetched)
+    write_table(table, path)
+    return years
+
+
+if __name__ == "__main__":
+    from medline_trends.eutils import EutilsClient
+    # Searching the live counts, not the cache, is the point here.
+    searched = refresh(EutilsClient(cache=False))
+    print(f"Updated {len(searched)} years in {TABLE_PATH}")
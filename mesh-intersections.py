@@ -23,43 +23,39 @@ SUMMARY: This program determines how much MEDLINE-indexed literature
     citations.
 
 DURATION: For a pair of MeSH going back to 1966, this program may take
-    around 3 minutes to run. This is due in part to the sleep time
-    built in between each GET request to avoid overloading the server.
-    I set up the program to wait 0.5 seconds between each request,
-    which is slightly longer than the NCBI minimum recommended here:
-    # https://www.ncbi.nlm.nih.gov/books/NBK25497/.
+    around 1 minute to run. Its speed is set by the NCBI limit of 3
+    requests per second (https://www.ncbi.nlm.nih.gov/books/NBK25497/).
+    The program keeps several requests going at once and spaces them
+    out so that it stays under that limit. If you have an NCBI API key,
+    which raises the limit to 10 requests per second, set the
+    NCBI_API_KEY environment variable to it to make the program about
+    three times faster.
+
+RUNNING IT AGAIN: If the program stops partway, running it again picks
+    up where it left off, using the journal of counts it keeps next to
+    the CSV file. Once it has finished, running it again starts over,
+    so that the counts for the most recent years, which keep growing as
+    indexing catches up, are brought up to date instead of copied from
+    the last run. The counts for years that have settled come from a
+    cache on this computer without searching for them again.
 
 USER ACTION ITEMS: Users need to do the following:
-    1) Specify where to save the CSV file (see lines 66-68).
+    1) Specify where to save the CSV file (see lines 62-64).
     2) Indicate which two MeSH they want the program to look at (see
-        lines 70-75).
+        lines 66-71).
     3) Determine whether they need to change the first year of
-        literature for the program to search (see lines 77-100).
+        literature for the program to search (see lines 73-102).
     4) (Optional) Decide if they want to override the default for the
         last year of literature for the program to search. The default
         is the last year that has been completed for at least three
-        months (see lines 109-116)."""
+        months (see lines 107-114)."""
 
 # Import libraries.
 
-# The URLs that this program creates are XML files. The bs4 module is
-    # used to pull data from them.
-from bs4 import BeautifulSoup
-# The datetime module is used to establish a default end year and to
-    # create a filename for the CSV file.
-from datetime import date
-# The os module is used to save the CSV file to the user's computer.
-import os
-# The pandas module is used to create a dataframe out of the list of
-    # dictionaries that the for loop produces. The dataframe is what
-    # gets written to the CSV file.
-import pandas as pd
-# The requests module is used to connect to the internet and submit a
-    # GET request to each URL that this program creates.
-import requests
-# The time module is used to pause the program between GET requests to
-    # avoid overloading the server.
-import time
+# The medline_trends package holds the engine that builds the searches,
+    # sends them, keeps a journal of the counts, and writes the CSV
+    # file.
+from medline_trends import engine, journal
 
 # Set variables.
 
@@ -97,113 +93,33 @@ Because not all MeSH are applied back to 1966, YOU MAY NEED TO CHANGE
     from the intersection of "Workforce" and "Sequence Analysis," the
     latter of the two years is the earliest I might find any
     intersecting literature, so I would want to change start_year to
-    1993."""
+    1993.
+If you have downloaded the MeSH descriptor file (descYYYY.xml, from
+    https://www.nlm.nih.gov/databases/download/mesh.html), you can set
+    the MEDLINE_TRENDS_MESH environment variable to its path instead of
+    looking the years up. The program then reads how far back each of
+    the two MeSH has been applied from that file and puts a zero in
+    each year before the later of the two without searching for it."""
 
 # Establish the last year of literature you want to be searched.
-today = date.today()
-if today.month >= 4:
-    end_year = today.year - 1
-else:
-    end_year = today.year - 2
+end_year = engine.default_end_year()
 """
 To make years more comparable, the default end year is the most
     recently completed year that has been over for at least three
     months. That allows some time for literature published toward the
     end of the year to be indexed in MEDLINE and tagged with MeSH.
 If you prefer a different end year, remove the hash and space from the
-    beginning of line 116 and replace the value with the last year of
+    beginning of line 114 and replace the value with the last year of
     literature you want to be searched."""
-# end_year = 2000 # Custom end year (see lines 109-115)
-
-# Build the components for the intersection URLs.
-x_url_pt_1 = "".join([
-    # Start of URL as shown in "Searching a Database" section of this
-        # guide: https://www.ncbi.nlm.nih.gov/books/NBK25500/.
-    "https://eutils.ncbi.nlm.nih.gov/",
-    "entrez/eutils/esearch.fcgi?db=pubmed&term=\"",
-    # Add first MeSH. Encode spaces and commas.
-    mesh_1.replace(" ", "+").replace(",", "%2C"),
-    # Add field code and Boolean operator.
-    "[mh]+AND+\"",
-    # Add second MeSH. Encode spaces and commas.
-    mesh_2.replace(" ", "+").replace(",", "%2C"),
-    # Add field code and Boolean operator.
-    "[mh]+AND+"])
-# x_url_pt_2 is the publication year. It will be added in the for loop
-    # that begins in line 152.
-# Add the field code for the publication year.
-x_url_pt_3 = "[pdat]"
-
-# Build the components for the year URLs.
-yr_url_pt_1 = "".join([
-    # Start of URL as shown in "Searching a Database" section of this
-        # guide: https://www.ncbi.nlm.nih.gov/books/NBK25500/.
-    "https://eutils.ncbi.nlm.nih.gov/",
-    "entrez/eutils/esearch.fcgi?db=pubmed&term="])
-# yr_url_pt_2 is the publication year. It will be added in the for loop
-    # that begins in line 152.
-# Add the field code for the publication year.
-yr_url_pt_3 = "[pdat]"
-
-# Create a list to which to add dictionaries for each year.
-mesh_intersections = []
-
-# Loop through each year.
-for yr in range(start_year, end_year + 1):
-    # Put the URL together to search for data on all citations indexed
-        # by MEDLINE during that year.
-    yr_url = "".join([yr_url_pt_1, str(yr), yr_url_pt_3])
-    # Send a GET request to the URL.
-    yr_response = requests.get(yr_url)
-    # Get the content of the response.
-    yr_data = yr_response.text
-    # Create a BeautifulSoup object, using lxml's XML parser.
-    yr_soup = BeautifulSoup(yr_data, features = "xml")
-    # Scrape the value of the "Count" attribute.
-    medline_count = int(yr_soup.find("Count").text)
-    # Wait 0.5 seconds to avoid overloading the server.
-    time.sleep(0.5)
-    # Put the URL together to search for data on citations from the
-        # indicated year that are indexed with both specified MeSH.
-    x_url = "".join([x_url_pt_1, str(yr), x_url_pt_3])
-    # Send a GET request to the URL.
-    x_response = requests.get(x_url)
-    # Get the content of the response.
-    x_data = x_response.text
-    # Create a BeautifulSoup object, using lxml's XML parser.
-    x_soup = BeautifulSoup(x_data, features= "xml")
-    # Scrape the value of the "Count" attribute.
-    x_count = int(x_soup.find("Count").text)
-    # Create a dictionary for the values you want to add to the CSV
-        # file. Add the dictionary to the list created in line 149.
-    mesh_intersections.append({
-        # Indicate the year the cited documents were published.
-        "publication_year": yr,
-        # Note how many MEDLINE-indexed citations include both MeSH.
-        "intersecting_citations": x_count,
-        # Note how many MEDLINE citations in total were indexed.
-        "total_citations": medline_count,
-        # Note how many MEDLINE-indexed citations that include both
-            # MeSH there were per 1,000 total MEDLINE citations.
-        "intersecting_citations_per_1k": round(
-            x_count / medline_count * 1000, 4)})
-    # Wait 0.5 seconds to avoid overloading the server.
-    time.sleep(0.5)
-
-# Format the user-selected MeSH for the filename by making them
-    # lowercase and replacing any spaces with hyphens.
-fn_mesh_1 = mesh_1.replace(" ", "-").lower()
-fn_mesh_2 = mesh_2.replace(" ", "-").lower()
-
-# Create a filename.
-filename = "".join([
-    f"{fn_mesh_1}_{fn_mesh_2}_{start_year}-{end_year}_",
-    str(today.year), "-", "{:02d}".format(today.month), "-", 
-    "{:02d}".format(today.day), ".csv"])
-
-# Change to the directory to which to save the CSV file.
-os.chdir(path)
-# Create a dataframe out of mesh_intersections.
-df = pd.DataFrame(mesh_intersections)
-# Write the dataframe to a CSV file.
-df.to_csv(filename, encoding = "utf-8-sig", index=False)
+# end_year = 2000 # Custom end year (see lines 107-113)
+
+# Run the searches for the intersection of the two MeSH and write the
+    # results to a CSV file.
+job = engine.Job(mesh_1, engine.pair(mesh_2), start_year, end_year)
+# Each count is added to a journal as soon as it comes back, so if the
+    # run stops partway, running the program again picks up where it
+    # left off; once it has finished, running it again starts over (see
+    # RUNNING IT AGAIN above). Each row is added to the CSV file as soon
+    # as it is ready.
+rows = engine.stream(job, journal=journal.for_job(job, path))
+engine.write_csv(rows, path, engine.csv_filename(job))
@@ -32,20 +32,29 @@ SUMMARY: With this program, the user selects a MeSH. The program
     (5) total_medline_citations: The total number of MEDLINE-indexed
         citations published that year
 
-DURATION: This program may take around 11 minutes to run. This is due
-    in part to the sleep time built in between each GET request to
-    avoid overloading the server. I set up the program to wait 0.5
-    seconds between each request, which is slightly longer than the
-    NCBI minimum recommended here:
-    https://www.ncbi.nlm.nih.gov/books/NBK25497/.
+DURATION: This program may take around 3 minutes to run. Its speed is
+    set by the NCBI limit of 3 requests per second
+    (https://www.ncbi.nlm.nih.gov/books/NBK25497/). The program keeps
+    several requests going at once and spaces them out so that it stays
+    under that limit. If you have an NCBI API key, which raises the
+    limit to 10 requests per second, set the NCBI_API_KEY environment
+    variable to it to make the program about three times faster.
+
+RUNNING IT AGAIN: If the program stops partway, running it again picks
+    up where it left off, using the journal of counts it keeps next to
+    the CSV file. Once it has finished, running it again starts over,
+    so that the counts for the most recent years, which keep growing as
+    indexing catches up, are brought up to date instead of copied from
+    the last run. The counts for years that have settled come from a
+    cache on this computer without searching for them again.
 
 USER ACTION ITEMS: Users need to do the following:
-    1) Specify where to save the CSV file (see lines 77-79).
+    1) Specify where to save the CSV file (see lines 72-74).
     2) Indicate which MeSH they want the program to look at
-        intersections with health personnel subsets for (see lines 81-
-        85).
+        intersections with health personnel subsets for (see lines 76-
+        80).
     3) Determine whether they need to change the first year of
-        literature for the program to search (see lines 87-104).
+        literature for the program to search (see lines 82-108).
     4) (Optional) Decide if they want to override the default for the
         last year of literature for the program to search. The default
         is the last year that has been completed for at least three
@@ -53,24 +62,10 @@ USER ACTION ITEMS: Users need to do the following:
 
 # Import libraries.
 
-# The URLs that this program creates are XML files. The bs4 module is
-    # used to pull data from them.
-from bs4 import BeautifulSoup
-# The datetime module is used to establish a default end year and to
-    # create a filename for the CSV file.
-from datetime import date
-# The os module is used to save the CSV file to the user's computer.
-import os
-# The pandas module is used to create a dataframe out of the list of
-    # dictionaries that the for loop produces. The dataframe is what
-    # gets written to the CSV file.
-import pandas as pd
-# The requests module is used to connect to the internet and submit a
-    # GET request to each URL that this program creates.
-import requests
-# The time module is used to pause the program between GET requests to
-    # avoid overloading the server.
-import time
+# The medline_trends package holds the engine that builds the searches,
+    # sends them, keeps a journal of the counts, and writes the CSV
+    # file, along with the lists of MeSH that the programs look at.
+from medline_trends import engine, journal, presets
 
 # Set variables.
 
@@ -101,14 +96,19 @@ If the MeSH you selected was not applied by 2017, YOU MAY WANT TO
     applied to literature dating back to 2020, so the start year I
     would want to use would be 2020. (I could still run it with the
     default of 2017, but it would return a bunch of zeroes in those
-    fields and would take unnecessarily longer to run.)"""
+    fields and would take unnecessarily longer to run.)
+If you have downloaded the MeSH descriptor file (descYYYY.xml, from
+    https://www.nlm.nih.gov/databases/download/mesh.html), you can set
+    the MEDLINE_TRENDS_MESH environment variable to its path instead.
+    The program then reads how far back each MeSH has been applied from
+    that file and puts a zero in each year before that without
+    searching for it, so each MeSH in effect gets its own start year.
+    The list of MeSH to look at is then also taken from the MeSH tree
+    in that file rather than from medline_trends/presets.py, so it
+    includes any MeSH added since that list was typed out."""
 
 # Establish the last year of literature you want to be searched.
-today = date.today()
-if today.month >= 4:
-    end_year = today.year - 1
-else:
-    end_year = today.year - 2
+end_year = engine.default_end_year()
 """
 To make years more comparable, the default end year is the most
     recently completed year that has been over for at least three
@@ -119,152 +119,14 @@ If you prefer a different end year, remove the hash and space from the
     literature you want to be searched."""
 # end_year = 2000 # Custom end year (see lines 113-119)
 
-# Get total MEDLINE citation counts for each year.
-
-# Build the components for the year URLs.
-yr_url_pt_1 = "".join([
-    # Start of URL as shown in "Searching a Database" section of this
-        # guide: https://www.ncbi.nlm.nih.gov/books/NBK25500/
-    "https://eutils.ncbi.nlm.nih.gov/",
-    "entrez/eutils/esearch.fcgi?db=pubmed&term="])
-# yr_url_pt_2 is the publication year. It will be added in the for loop
-    # that begins in line 139.
-# Add the field code for the publication year.
-yr_url_pt_3 = "[pdat]"
-
-# Create a list to which to add dictionaries for the year counts.
-yr_counts = []
-
-# Loop through each year to get total citation counts.
-for yr in range(start_year, end_year + 1):
-    # Put the URL together to search for data on all citations indexed
-        # by MEDLINE during that year.
-    yr_url = "".join([yr_url_pt_1, str(yr), yr_url_pt_3])
-    # Send a GET request to the URL.
-    yr_response = requests.get(yr_url)
-    # Get the content of the response.
-    yr_data = yr_response.text
-    # Create a BeautifulSoup object.
-    yr_soup = BeautifulSoup(yr_data, features = "xml")
-    # Scrape the value of the "Count" attribute.
-    medline_count = int(yr_soup.find("Count").text)
-    # Create a dictionary with the year as the key and the MEDLINE
-        # count as the value. Add it to the list created in line 136.
-    yr_counts.append({"year": yr, "total_citations": medline_count})
-    # Wait 2-4 seconds to avoid flooding the server.
-    time.sleep(0.5)
-
-# Create a list of MeSH that includes "Health Personnel" and all
-    # headings that are 1-2 levels below it.
-hp_subsets = [
-    "Health Personnel", "Allied Health Personnel", "Animal Technicians",
-    "Community Health Workers", "Dental Auxiliaries",
-    "Emergency Medical Technicians", "Home Health Aides",
-    "Licensed Practical Nurses", "Medical Record Administrators",
-    "Medical Secretaries", "Nursing Assistants",
-    "Operating Room Technicians", "Paramedics", "Pharmacy Technicians",
-    "Physical Therapist Assistants", "Physician Assistants", "Anatomists",
-    "Anesthetists", "Anesthesiologists", "Nurse Anesthetists", "Audiologists",
-    "Caregivers", "Case Managers", "Coroners and Medical Examiners",
-    "Dental Staff", "Dental Staff, Hospital", "Dentists", "Dentists, Women",
-    "Endodontists", "Oral and Maxillofacial Surgeons", "Orthodontists",
-    "Doulas", "Emergency Medical Dispatcher", "Epidemiologists",
-    "Faculty, Dental", "Faculty, Medical", "Faculty, Nursing",
-    "Health Educators", "Health Facility Administrators",
-    "Hospital Administrators", "Infection Control Practitioners",
-    "Medical Chaperones", "Medical Laboratory Personnel", "Medical Staff",
-    "Medical Staff, Hospital", "Nurses", "Nurse Administrators",
-    "Nurse Practitioners", "Nurse Specialists", "Nurses, Community Health",
-    "Nurses, International", "Nurses, Male", "Nurses, Public Health",
-    "Nursing Staff", "Nursing Staff, Hospital", "Nutritionists",
-    "Occupational Therapists", "Optometrists", "Personnel, Hospital",
-    "Hospital Volunteers", "Pharmacists", "Physical Therapists",
-    "Physician Executives", "Physicians", "Allergists", "Cardiologists",
-    "Dermatologists", "Endocrinologists", "Foreign Medical Graduates",
-    "Gastroenterologists", "General Practitioners", "Geriatricians",
-    "Gynecologists", "Hospitalists", "Nephrologists", "Neurologists",
-    "Obstetricians", "Occupational Health Physicians", "Oncologists",
-    "Ophthalmologists", "Osteopathic Physicians", "Otolaryngologists",
-    "Pathologists", "Pediatricians", "Physiatrists", "Physicians, Family",
-    "Physicians, Primary Care", "Physicians, Women", "Pulmonologists",
-    "Radiologists", "Rheumatologists", "Surgeons", "Urologists",
-    "Psychotherapists", "Traditional Medicine Practitioners", "Veterinarians"]
-
-# Build the components for the intersection URLs.
-x_url_pt_1 = "".join([
-    # Start of URL as shown in "Searching a Database" section of this
-        # guide: https://www.ncbi.nlm.nih.gov/books/NBK25500/
-    "https://eutils.ncbi.nlm.nih.gov/",
-    "entrez/eutils/esearch.fcgi?db=pubmed&term=\""])
-# x_url_pt_2 will be added from the hp_subsets in the for loop
-    # that begins in line 217.
-x_url_pt_3 = "".join([
-    # Add field code and Boolean operator.
-    "[mh]+AND+\"",
-    # Add selected MeSH. Encode spaces and commas.
-    mesh.replace(" ", "+").replace(",", "%2C"),
-    # Add field code and Boolean operator.
-    "[mh]+AND+"])
-# x_url_pt_4 is the publication year. It will be added in the for loop
-    # that begins in line 217.
-# Add the field code for the publication year.
-x_url_pt_5 = "[pdat]"
-
-# Create a list to which to add dictionaries for each intersection.
-mesh_intersections = []
-
-# Loop through each subset and year to get citation counts.
-for subset in hp_subsets:
-    for y in yr_counts:
-        # Put the URL together to search for data on citations from the
-            # indicated year that are indexed with the specified MeSH
-            # and the MeSH from the health personnel subset.
-        x_url = "".join([
-            x_url_pt_1,
-            subset.replace(" ", "+").replace(",", "%2C"),
-            x_url_pt_3, str(y["year"]), x_url_pt_5])
-        # Send a GET request to the URL.
-        try:
-            x_response = requests.get(x_url)
-            # Get the content of the response.
-            x_data = x_response.text
-            # Create a BeautifulSoup object.
-            x_soup = BeautifulSoup(x_data, features= "xml")
-            # Scrape the value of the "Count" attribute.
-            x_count = int(x_soup.find("Count").text)
-            # Add a dictionary to mesh_intersections.
-            mesh_intersections.append({
-                # The MeSH that is a subset of "Health Personnel"
-                "health_personnel_subset": subset,
-                # The publication year
-                "year": y["year"],
-                # The number of intersecting citations that year
-                "intersecting_citations": x_count,
-                # The number of intersecting citations per 1,000 total
-                    # MEDLINE-indexed citations that year
-                "intersecting_citations_per_1k": round(
-                    x_count / y["total_citations"]*1000, 4),
-                # The total number of MEDLINE-indexed citations that
-                    # year
-                "total_medline_citations": y["total_citations"]})
-        except:
-            continue
-        # Wait 2-4 seconds to avoid flooding the server.
-        time.sleep(0.5)
-
-# Format the user-selected MeSH for the filename by making it lowercase
-    # and replacing any spaces with hyphens.
-fn_mesh = mesh.replace(" ", "-").lower()
-
-# Create a filename.
-filename = "".join([
-    f"health-personnel_{fn_mesh}_{start_year}-{end_year}_",
-    str(today.year), "-", "{:02d}".format(today.month), "-", 
-    "{:02d}".format(today.day), ".csv"])
-
-# Change to the directory to which to save the CSV file.
-os.chdir(path)
-# Create a dataframe out of mesh_intersections.
-df = pd.DataFrame(mesh_intersections)
-# Write the dataframe to a CSV file.
-df.to_csv(filename, encoding = "utf-8-sig", index=False)
+# Run the searches for the intersection of the selected MeSH with
+    # "Health Personnel" and each MeSH 1-2 levels below it (see
+    # medline_trends/presets.py) and write the results to a CSV file.
+job = engine.Job(mesh, presets.HEALTH_PERSONNEL, start_year, end_year)
+# Each count is added to a journal as soon as it comes back, so if the
+    # run stops partway, running the program again picks up where it
+    # left off; once it has finished, running it again starts over (see
+    # RUNNING IT AGAIN above). Each row is added to the CSV file as soon
+    # as it is ready.
+rows = engine.stream(job, journal=journal.for_job(job, path))
+engine.write_csv(rows, path, engine.csv_filename(job))
@@ -0,0 +1,146 @@
+"""
+SUMMARY: These tests work out the trends of small made-up matrices of
+    counts (see medline_trends/analytics.py) and check each measure,
+    including for cells that failed and for several matrices stacked
+    into one array. They also write the trends file of a CSV file
+    written by the engine, and of an empty CSV file, as a run whose
+    cells all failed leaves.
+
+USAGE: Run this from the folder that holds the programs:
+        python -m pytest tests
+    or, without pytest:
+        python -m unittest discover tests
+"""
+
+# The csv module reads back the trends file.
+import csv
+# The os module is used to build the paths of the CSV files.
+import os
+# The tempfile module holds the CSV files in a folder that is removed
+    # after the tests.
+import tempfile
+# The unittest module runs the tests.
+import unittest
+
+# The numpy module holds the matrices.
+import numpy as np
+
+from medline_trends import analytics, engine
+
+# Counts of three terms over four years: "B" sits under "A", and "C"
+    # failed in its third year.
+COUNTS = np.array([
+    [10.0, 20.0, 0.0, 5.0],
+    [5.0, 5.0, 0.0, 5.0],
+    [10.0, 0.0, np.nan, 2.0]])
+TOTALS = np.array([1000.0, 2000.0, 2000.0, 4000.0])
+NAN = np.nan
+
+
+class Client:
+    """A client that gives each search the count of its term in COUNTS,
+    leaving out the cell that failed."""
+
+    explodes = False
+
+    def counts(self, queries):
+        for query in queries:
+            term = "ABC".index(query[1])
+            year = int(query[-10:-6]) - 2001
+            if not np.isnan(COUNTS[term, year]):
+                yield query, int(COUNTS[term, year])
+
+
+class MeasuresTest(unittest.TestCase):
+    """The measures of a matrix."""
+
+    def assertArrayEqual(self, found, expected):
+        np.testing.assert_array_equal(found, np.array(expected))
+
+    def test_per_1k(self):
+        self.assertArrayEqual(
+            analytics.per_1k(COUNTS, TOTALS)[0], [10, 10, 0, 1.25])
+
+    def test_growth(self):
+        # Relative to the count the year before.
+        self.assertArrayEqual(
+            analytics.growth(COUNTS),
+            [[NAN, 1.0, -1.0, NAN], [NAN, 0.0, -1.0, NAN],
+             [NAN, -1.0, NAN, NAN]])
+
+    def test_share_of_parent(self):
+        above = analytics.parent_index(["A", "B", "C"], {"B": "A"})
+        self.assertArrayEqual(above, [-1, 0, -1])
+        self.assertArrayEqual(
+            analytics.share_of_parent(COUNTS, above)[1],
+            [0.5, 0.25, NAN, 1.0])
+        self.assertTrue(np.isnan(
+            analytics.share_of_parent(COUNTS, above)[[0, 2]]).all())
+
+    def test_ranks(self):
+        # "A" and "C" share first place in the first year, and "A" and
+            # "B" share it in the last.
+        self.assertArrayEqual(
+            analytics.ranks(COUNTS),
+            [[1, 1, 1, 1], [3, 2, 1, 1], [1, 3, NAN, 3]])
+
+    def test_smoothed(self):
+        self.assertArrayEqual(
+            analytics.smoothed(np.array([1.0, 2.0, NAN, 4.0, 6.0]), 2),
+            [1.0, 1.5, 2.0, 4.0, 5.0])
+
+    def test_stacked(self):
+        stacked = np.stack([COUNTS, COUNTS * 2])
+        np.testing.assert_array_equal(
+            analytics.ranks(stacked)[1], analytics.ranks(COUNTS))
+        np.testing.assert_array_equal(
+            analytics.growth(stacked)[1], analytics.growth(COUNTS))
+
+
+class ExportTest(unittest.TestCase):
+    """The trends file of a CSV file."""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_export(self):
+        preset = engine.Preset(
+            "letters", "letter", ["A", "B", "C"], {"B": "A"})
+        job = engine.Job("U", preset, 2001, 2004)
+        with self.assertWarnsRegex(RuntimeWarning, "1 of 12 cells"):
+            rows = engine.run(
+                job, Client(),
+                year_totals=dict(zip(range(2001, 2005), TOTALS)))
+        self.assertEqual(len(rows), 11)
+        matrix = analytics.from_rows(rows, "letter")
+        self.assertEqual(matrix.terms, ["A", "B", "C"])
+        self.assertEqual(matrix.years, [2001, 2002, 2003, 2004])
+        np.testing.assert_array_equal(matrix.counts, COUNTS)
+        engine.write_csv(rows, self.folder.name, "letters.csv")
+        path = os.path.join(self.folder.name, "letters.csv")
+        np.testing.assert_array_equal(
+            analytics.read_csv(path).counts, COUNTS)
+        target = analytics.export(path)
+        self.assertEqual(
+            target, os.path.join(self.folder.name, "letters_trends.csv"))
+        with open(target, newline="", encoding="utf-8-sig") as f:
+            trends = list(csv.DictReader(f))
+        self.assertEqual(len(trends), 12)
+        self.assertEqual(trends[1]["growth"], "1.0")
+        self.assertEqual(trends[10]["rank"], "")
+        self.assertEqual(trends[10]["intersecting_citations"], "")
+
+    def test_empty(self):
+        path = os.path.join(self.folder.name, "empty.csv")
+        engine.write_csv([], self.folder.name, "empty.csv")
+        matrix = analytics.read_csv(path)
+        self.assertEqual((matrix.terms, matrix.years), ([], []))
+        with open(analytics.export(path), encoding="utf-8-sig") as f:
+            self.assertEqual(f.read(), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
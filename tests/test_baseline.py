@@ -0,0 +1,165 @@
+"""
+SUMMARY: These tests build a local store from two small files in
+    tests/data, laid out like the MEDLINE baseline and update files:
+    pubmed_0001.xml has four citations, and pubmed_0002.xml replaces
+    one of them, adds another, and deletes a third. They check what
+    parse() reads from each file, that the merge keeps the last copy of
+    each citation and drops the deleted one, and the counts a Store
+    gives for the searches the engine sends, with and without the MeSH
+    descriptor file desc.xml. They also check that parse() clears what
+    it has read and that the engine only runs a store in the default
+    mode.
+
+USAGE: Run this from the folder that holds the programs:
+        python -m pytest tests
+    or, without pytest:
+        python -m unittest discover tests
+"""
+
+# The os module is used to build the paths of the test files.
+import os
+# The tempfile module holds the store and index in a folder that is
+    # removed after the tests.
+import tempfile
+# The unittest module runs the tests.
+import unittest
+# The unittest.mock module keeps the root of the tree parse() reads.
+from unittest import mock
+# The xml.etree module is the parser parse() uses.
+from xml.etree import ElementTree
+
+from medline_trends import baseline, engine
+
+# The folder of the test files.
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DESCRIPTORS = os.path.join(DATA, "desc.xml")
+
+
+def search(*names, years="2020"):
+    """Return the search the engine sends for the given MeSH and years."""
+    return " AND ".join(
+        [engine.mesh_clause(name) for name in names] + [f"{years}[pdat]"])
+
+
+class ParseTest(unittest.TestCase):
+    """What parse() reads from a baseline and an update file."""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_citations(self):
+        records = list(baseline.parse(os.path.join(DATA, "pubmed_0001.xml")))
+        medline = baseline.STATUSES.index("MEDLINE")
+        self.assertEqual(records[0], (
+            "citation", 1, 2020, medline,
+            [("D013502", "Surgeons"), ("D011634", "Public Health")]))
+        # A MedlineDate gives its first year.
+        self.assertEqual(records[1][2], 2019)
+        # Without a year in the issue date, the electronic date is used.
+        self.assertEqual(records[2][2], 2021)
+        self.assertEqual(
+            records[2][3], baseline.STATUSES.index("In-Process"))
+        self.assertEqual([record[1] for record in records], [1, 2, 3, 4])
+
+    def test_deletions(self):
+        records = list(baseline.parse(os.path.join(DATA, "pubmed_0002.xml")))
+        self.assertEqual(records[-1], ("deleted", 4))
+        self.assertEqual(records[1], (
+            "citation", 5, 2021, baseline.STATUSES.index("Publisher"), []))
+
+    def test_cleared(self):
+        # Every element read is cleared from the tree, deleted citations
+            # too, so nothing piles up over a file. The file is read in
+            # blocks, so the list of deleted citations is put in a later
+            # block than the citation before it.
+        with open(os.path.join(DATA, "pubmed_0002.xml"), "rb") as f:
+            text = f.read()
+        path = os.path.join(self.folder.name, "pubmed_0003.xml")
+        with open(path, "wb") as f:
+            f.write(text.replace(
+                b"<DeleteCitation>", b" " * 100000 + b"<DeleteCitation>"))
+        roots = []
+        iterparse = ElementTree.iterparse
+
+        def recording(*args, **kwargs):
+            for event, elem in iterparse(*args, **kwargs):
+                if not roots:
+                    roots.append(elem)
+                yield event, elem
+
+        with mock.patch.object(
+                baseline.ElementTree, "iterparse", recording):
+            self.assertEqual(list(baseline.parse(path))[-1], ("deleted", 4))
+        self.assertEqual(len(roots[0]), 0)
+
+
+class StoreTest(unittest.TestCase):
+    """The counts of a store built from both files."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.TemporaryDirectory()
+        cls.store_path = os.path.join(cls.folder.name, "store")
+        baseline.ingest(DATA, cls.store_path, workers=2)
+        cls.store = baseline.Store(cls.store_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.folder.cleanup()
+
+    def test_merge(self):
+        # PMID 3 comes from the update file, PMID 4 was deleted there,
+            # and PMID 5 was added there.
+        columns = self.store.columns
+        self.assertEqual(columns["pmid"].tolist(), [1, 2, 3, 5])
+        self.assertEqual(columns["year"].tolist(), [2020, 2019, 2021, 2021])
+        self.assertEqual(columns["mesh_offsets"].tolist(), [0, 2, 4, 6, 6])
+        self.assertEqual(
+            columns["status"][2], baseline.STATUSES.index("MEDLINE"))
+        self.assertEqual(
+            baseline.read_names(self.store_path)["public health"],
+            "D011634")
+        self.assertFalse(os.path.exists(
+            os.path.join(self.store_path, "parts")))
+
+    def test_counts(self):
+        counts = dict(self.store.counts([
+            search("Surgeons", "Public Health"),
+            search("Surgeons", "Public Health", years="2021"),
+            search("Surgeons", years="2019:2021"),
+            search("Physicians", "Public Health", years="2019:2021"),
+            search("Physicians"),
+            search(years="2021"),
+            search("Nursing")]))
+        self.assertEqual(list(counts.values()), [1, 1, 2, 1, 0, 2, 0])
+
+    def test_unanswerable(self):
+        self.assertEqual(
+            list(self.store.counts(['"Surgeons"[tiab] AND 2020[pdat]'])),
+            [])
+
+    def test_esearch_mode_only(self):
+        job = engine.Job("Public Health", engine.pair("Surgeons"), 2019, 2021)
+        with self.assertRaisesRegex(ValueError, "not the spans mode"):
+            engine.run(job, self.store, "spans", year_totals={})
+
+    def test_explode(self):
+        self.assertFalse(self.store.explodes)
+        exploded = baseline.Store(self.store_path, DESCRIPTORS)
+        self.assertTrue(exploded.explodes)
+        # A search for "Physicians" also finds the citations tagged with
+            # "Surgeons", which sits below it.
+        self.assertEqual(
+            exploded.count(search("Physicians", "Public Health")), 1)
+        self.assertEqual(
+            exploded.count(
+                search("Physicians", "Public Health", years="2019:2021")),
+            3)
+        self.assertEqual(exploded.count(search("Surgeons")), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
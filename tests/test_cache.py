@@ -0,0 +1,115 @@
+"""
+SUMMARY: These tests check which searches share a key in the cache of
+    esearch counts, which cached counts expire and when, and that a
+    client finds the counts another client cached instead of sending
+    their searches to the stand-in server (see
+    medline_trends/mockserver.py) again.
+
+USAGE: Run this from the folder that holds the programs:
+        python -m pytest tests
+    or, without pytest:
+        python -m unittest discover tests
+"""
+
+# The datetime module dates the counts put in the cache.
+from datetime import datetime
+# The os module is used to build the path of the cache.
+import os
+# The tempfile module holds the cache in a folder that is removed after
+    # the tests.
+import tempfile
+# The time module dates a count that has expired.
+import time
+# The unittest module runs the tests.
+import unittest
+
+from medline_trends import eutils, mockserver
+from medline_trends.cache import CountCache, normalize
+from medline_trends.metrics import Metrics
+
+# Searches like those the engine sends.
+QUERIES = [
+    f'"Surgeons"[mh] AND "Public Health"[mh] AND {year}[pdat]'
+    for year in range(2015, 2020)]
+
+
+def client(server, cache):
+    """Return a client of a stand-in server with the given cache."""
+    return eutils.EutilsClient(
+        api_key="test", rate=1000, url=server.url, cache=cache,
+        metrics=Metrics(console=False))
+
+
+class CacheTest(unittest.TestCase):
+    """Which cached counts are good, and for how long."""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.cache = CountCache(
+            os.path.join(self.folder.name, "esearch.sqlite"))
+
+    def tearDown(self):
+        self.cache.connection().close()
+        self.folder.cleanup()
+
+    def test_key(self):
+        self.cache.put('"Surgeons"[mh] AND 2020[pdat]', 12)
+        self.assertEqual(
+            self.cache.get('2020[pdat]  and  "surgeons"[MH]'), 12)
+        self.assertIsNone(self.cache.get('"Surgeons"[mh] AND 2021[pdat]'))
+        # The parts of a search with OR in it are left in order.
+        self.assertEqual(
+            normalize('("A"[mh] OR "B"[mh]) AND 2020[pdat]'),
+            '("a"[mh] or "b"[mh]) and 2020[pdat]')
+
+    def test_expires(self):
+        fetched = datetime(2023, 1, 15).timestamp()
+        # Settled when it was retrieved, so it never expires.
+        self.assertIsNone(
+            self.cache.expires('"Surgeons"[mh] AND 2019[pdat]', fetched))
+        # Still settling when it was retrieved, so it expires, however
+            # long ago that was.
+        self.assertEqual(
+            self.cache.expires('"Surgeons"[mh] AND 2022[pdat]', fetched),
+            fetched + self.cache.ttl)
+        self.assertEqual(
+            self.cache.expires('"Surgeons"[mh] AND 2018:2021[pdat]', fetched),
+            fetched + self.cache.ttl)
+        # A search without a year is never settled.
+        self.assertEqual(
+            self.cache.expires('"Surgeons"[mh]', fetched),
+            fetched + self.cache.ttl)
+
+    def test_expired(self):
+        query = '"Surgeons"[mh]'
+        self.cache.put(query, 7)
+        self.assertEqual(self.cache.get(query), 7)
+        with self.cache.connection() as conn:
+            conn.execute(
+                "UPDATE counts SET fetched = ?",
+                (time.time() - self.cache.ttl - 1,))
+        self.assertIsNone(self.cache.get(query))
+
+    def test_ids(self):
+        self.cache.put_ids('"Surgeons"[mh] AND 2019[pdat]', b"\x01\x02")
+        self.assertEqual(
+            self.cache.get_ids('"Surgeons"[mh] AND 2019[pdat]'), b"\x01\x02")
+        self.assertIsNone(self.cache.get('"Surgeons"[mh] AND 2019[pdat]'))
+
+    def test_client(self):
+        with mockserver.MockServer() as server:
+            counts = dict(client(server, self.cache).counts(QUERIES))
+            second = client(server, self.cache)
+            self.assertEqual(dict(second.counts(QUERIES)), counts)
+            self.assertEqual(server.calls, len(QUERIES))
+            self.assertEqual(second.metrics.cache_hits, len(QUERIES))
+
+    def test_other_url_skips_cache(self):
+        # The shared cache holds PubMed's counts, so a client of the
+            # stand-in does not use it unless it is given a cache.
+        with mockserver.MockServer() as server:
+            self.assertIsNone(client(server, True).cache)
+
+
+if __name__ == "__main__":
+    unittest.main()
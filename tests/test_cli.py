@@ -0,0 +1,115 @@
+"""
+SUMMARY: These tests run the "run" command of the command-line entry
+    point (medline_trends/__main__.py) with a preset whose terms
+    include one that is not MeSH, and check that every MeSH of the
+    batch is checked once before any intersection is searched for: a
+    user-selected MeSH that is not MeSH stops the batch, and a preset
+    term that is not MeSH is warned about, whether the terms are
+    looked up in the MeSH descriptor file tests/data/desc.xml or
+    searched for. No batch is run.
+
+USAGE: Run this from the folder that holds the programs:
+        python -m pytest tests
+    or, without pytest:
+        python -m unittest discover tests
+"""
+
+# The contextlib module keeps the error message of the arguments out of
+    # the test output.
+import contextlib
+# The io module holds that message.
+import io
+# The os module is used to build the paths of the test files.
+import os
+# The tempfile module holds the compact copy of the descriptor file in a
+    # folder that is removed after the tests.
+import tempfile
+# The unittest module runs the tests.
+import unittest
+# The unittest.mock module stands in for the client and the batch.
+from unittest import mock
+
+from medline_trends import __main__, engine, eutils, mesh, presets
+
+# The folder of the test files.
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DESCRIPTORS = os.path.join(DATA, "desc.xml")
+
+# Presets with a term that is not MeSH, and with a rule.
+TYPED = engine.Preset(
+    "typed", "term", ["Physicians", "Physician Assistance"])
+RULED = engine.Preset(
+    "ruled", "term", ["Nursing"], rule=[mesh.Subtree("Physicians", 0, 1)])
+
+
+class Client:
+    """A client that finds nothing for "Physician Assistance" and one
+    citation for any other search, and keeps the searches it was
+    sent."""
+
+    def __init__(self, **kwargs):
+        self.sent = []
+
+    def counts(self, queries):
+        for query in queries:
+            self.sent.append(query)
+            yield query, int("Physician Assistance" not in query)
+
+
+class RunTest(unittest.TestCase):
+    """The checks of the "run" command."""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.client = Client()
+        patches = [
+            mock.patch.dict(os.environ, {
+                "MEDLINE_TRENDS_CACHE": os.path.join(
+                    self.folder.name, "esearch.sqlite")}),
+            mock.patch.dict(presets.BY_NAME, {
+                "typed": TYPED, "ruled": RULED}),
+            mock.patch.object(
+                eutils, "EutilsClient", return_value=self.client),
+            mock.patch.object(engine, "batch", return_value=[])]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(self.folder.cleanup)
+
+    def run_command(self, *arguments):
+        __main__.main(
+            ["run", "--folder", self.folder.name, "--end-year", "2000"]
+            + list(arguments))
+
+    def test_preset_term_with_tree(self):
+        with self.assertWarnsRegex(
+                RuntimeWarning, "not MeSH: Physician Assistance$"):
+            self.run_command(
+                "--mesh", "Public Health", "--preset", "typed", "ruled",
+                "--descriptors", DESCRIPTORS)
+        self.assertEqual(self.client.sent, [])
+        engine.batch.assert_called_once()
+
+    def test_preset_term_searched(self):
+        with self.assertWarnsRegex(
+                RuntimeWarning, "not MeSH: Physician Assistance$"):
+            self.run_command(
+                "--mesh", "Public Health", "--preset", "typed", "ruled")
+        # Each MeSH is searched for once, however many presets list it.
+        self.assertEqual(self.client.sent, [
+            engine.mesh_clause(name) for name in [
+                "Public Health", "Physicians", "Physician Assistance",
+                "Nursing"]])
+
+    def test_user_mesh(self):
+        with contextlib.redirect_stderr(io.StringIO()) as error:
+            with self.assertRaises(SystemExit):
+                self.run_command(
+                    "--mesh", "Physician Assistance", "--preset", "ruled",
+                    "--descriptors", DESCRIPTORS)
+        self.assertIn("not MeSH: Physician Assistance", error.getvalue())
+        engine.batch.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+"""
+SUMMARY: These tests check how the engine uses the MeSH hierarchy of a
+    preset: that it searches for the terms higher in the hierarchy
+    first, that a client that explodes "[mh]" (such as the E-utilities
+    client, here against the stand-in server in
+    medline_trends/mockserver.py) skips the terms under a term with a
+    count of zero without changing any row, and that a client that
+    does not explode "[mh]" (such as a store built from the small
+    baseline files in tests/data) skips nothing.
+
+USAGE: Run this from the folder that holds the programs:
+        python -m pytest tests
+    or, without pytest:
+        python -m unittest discover tests
+"""
+
+# The os module is used to build the paths of the test files.
+import os
+# The tempfile module holds the store in a folder that is removed after
+    # the tests.
+import tempfile
+# The unittest module runs the tests.
+import unittest
+
+from medline_trends import baseline, engine, eutils, mockserver, presets
+from medline_trends.metrics import Metrics
+
+# The folder of the test files.
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DESCRIPTORS = os.path.join(DATA, "desc.xml")
+
+
+def client(server):
+    """Return a client of a stand-in server."""
+    return eutils.EutilsClient(
+        api_key="test", rate=1000, url=server.url, cache=False,
+        metrics=Metrics(console=False))
+
+
+class PruneTest(unittest.TestCase):
+    """Skipping the terms under a term with a count of zero."""
+
+    def test_waves(self):
+        parents = {"B": "A", "C": "B", "D": "A"}
+        self.assertEqual(
+            engine.waves(["A", "B", "C", "D", "E"], parents),
+            [["A", "E"], ["B", "D"], ["C"]])
+        self.assertEqual(engine.waves([], {}), [])
+
+    def test_exploding_client(self):
+        job = engine.Job("Leprosy", presets.PHYSICIANS, 1990, 2005)
+        unpruned = job._replace(preset=job.preset._replace(parents=None))
+        corpus = mockserver.Corpus(job.preset.parents)
+        year_totals = {
+            yr: corpus.total(yr)
+            for yr in range(job.start_year, job.end_year + 1)}
+        with mockserver.MockServer(corpus) as server:
+            rows = engine.run(job, client(server), year_totals=year_totals)
+            pruned_calls = server.calls
+            self.assertEqual(
+                engine.run(
+                    unpruned, client(server), year_totals=year_totals),
+                rows)
+            self.assertEqual(
+                server.calls - pruned_calls, len(engine.plan(job)))
+        # "Physicians" was zero in some years, so the terms under it were
+            # not searched for in those years.
+        zero_years = [
+            row["year"] for row in rows
+            if row["physician_subset"] == "Physicians"
+            and row["intersecting_citations"] == 0]
+        self.assertTrue(zero_years)
+        self.assertEqual(
+            pruned_calls,
+            len(engine.plan(job)) - (len(job.preset.terms) - 1)
+            * len(zero_years))
+
+
+class StoreTest(unittest.TestCase):
+    """A store, which only explodes "[mh]" with a descriptor file."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.TemporaryDirectory()
+        cls.store_path = os.path.join(cls.folder.name, "store")
+        baseline.ingest(DATA, cls.store_path, workers=1)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.folder.cleanup()
+
+    def test_engine_does_not_prune(self):
+        # Without the descriptor file, "Physicians" has a count of zero
+            # in 2020 but "Surgeons" does not, so the engine must search
+            # for it.
+        job = engine.Job("Public Health", presets.PHYSICIANS, 2019, 2021)
+        year_totals = {2019: 1000, 2020: 1000, 2021: 1000}
+        for store in [
+                baseline.Store(self.store_path),
+                baseline.Store(self.store_path, DESCRIPTORS)]:
+            rows = engine.run(job, store, year_totals=year_totals)
+            surgeons = {
+                row["year"]: row["intersecting_citations"]
+                for row in rows if row["physician_subset"] == "Surgeons"}
+            self.assertEqual(surgeons, {2019: 0, 2020: 1, 2021: 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
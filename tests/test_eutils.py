@@ -0,0 +1,222 @@
+"""
+SUMMARY: These tests send searches to the stand-in server (see
+    medline_trends/mockserver.py) through the E-utilities client and
+    check that every count comes back the same as the stand-in's own
+    count for the search, with many requests in flight. They also check
+    that clients with the same API key share one rate limit, that
+    searches ask for the count only, how esearch responses are read,
+    and that searches whose responses fail are tried again, up to a
+    limit, and then kept with their errors. Searches that refer to a
+    history server session are checked too, including against
+    sessions that expire partway.
+
+USAGE: Run this from the folder that holds the programs:
+        python -m pytest tests
+    or, without pytest:
+        python -m unittest discover tests
+"""
+
+# The unittest module runs the tests.
+import unittest
+# The unittest.mock module keeps the parameters of each request.
+from unittest import mock
+
+from medline_trends import engine, eutils, mockserver
+from medline_trends.metrics import Metrics
+
+# Searches like those the engine sends, for a few MeSH and years.
+QUERIES = [
+    " AND ".join([
+        engine.mesh_clause(name), engine.mesh_clause("Public Health"),
+        f"{year}[pdat]"])
+    for name in ["Surgeons", "Physicians", "Pediatricians", "Nurses"]
+    for year in range(2010, 2022)]
+
+
+def client(server, **options):
+    """Return a client of a stand-in server that sends its requests as
+    fast as the server answers them."""
+    return eutils.EutilsClient(
+        api_key="test", rate=1000, url=server.url,
+        metrics=Metrics(console=False), **{"cache": False, **options})
+
+
+def response(body):
+    """Return an esearch response with the given elements."""
+    return (
+        '<?xml version="1.0" encoding="UTF-8" ?>\n'
+        f"<eSearchResult>{body}</eSearchResult>\n")
+
+
+class ParseTest(unittest.TestCase):
+    """How esearch responses are read."""
+
+    def test_count(self):
+        self.assertEqual(
+            eutils.parse_count(response("<Count>42</Count>")),
+            eutils.CountResult(42, [], []))
+        # Only the first Count is the search's; the others are those of
+            # its parts.
+        self.assertEqual(eutils.parse_count(response(
+            "<Count>42</Count><TranslationStack><TermSet><Count>9</Count>"
+            "</TermSet></TranslationStack>")).count, 42)
+
+    def test_lists(self):
+        result = eutils.parse_count(response(
+            "<Count>0</Count>"
+            "<ErrorList><PhraseNotFound>Nursez</PhraseNotFound></ErrorList>"
+            "<WarningList><OutputMessage>No items found.</OutputMessage>"
+            "</WarningList>"))
+        self.assertEqual(result, eutils.CountResult(
+            0, ["PhraseNotFound: Nursez"],
+            ["OutputMessage: No items found."]))
+
+    def test_error(self):
+        result = eutils.parse_count(
+            response("<ERROR>Search Backend failed</ERROR>"))
+        self.assertIsNone(result.count)
+        self.assertEqual(result.errors, ["ERROR: Search Backend failed"])
+
+    def test_history(self):
+        text = response(
+            "<Count>7</Count><QueryKey>1</QueryKey><WebEnv>MCID_1</WebEnv>")
+        self.assertEqual(eutils.parse_history(text), ("MCID_1", "1"))
+
+    def test_lost_history(self):
+        # PubMed counts the rest of the search when it cannot find the
+            # session, so a count alone does not mean the session held.
+        lost = eutils.parse_count(response(
+            "<Count>164041</Count>"
+            "<ErrorList><PhraseNotFound>#1</PhraseNotFound></ErrorList>"))
+        self.assertTrue(eutils.lost_history(lost, "1"))
+        self.assertFalse(eutils.lost_history(lost, "12"))
+        self.assertTrue(eutils.lost_history(eutils.parse_count(response(
+            "<ERROR>Unable to obtain query #1</ERROR>")), "1"))
+        self.assertFalse(eutils.lost_history(
+            eutils.parse_count(response("<Count>5</Count>")), "1"))
+
+
+class ClientTest(unittest.TestCase):
+    """Counts from the stand-in, through the client."""
+
+    def expected(self, server):
+        return {query: server.corpus.count(query) for query in QUERIES}
+
+    def test_counts(self):
+        with mockserver.MockServer(latency=0.01) as server:
+            found = dict(client(server, concurrency=8).counts(QUERIES))
+            self.assertEqual(found, self.expected(server))
+            self.assertEqual(server.calls, len(QUERIES))
+
+    def test_count_only(self):
+        with mockserver.MockServer() as server:
+            searcher = client(server)
+            with mock.patch.object(
+                    searcher, "get", wraps=searcher.get) as get:
+                dict(searcher.counts(QUERIES[:2]))
+            self.assertEqual(get.call_count, 2)
+            for call in get.call_args_list:
+                self.assertEqual(call.args[0]["rettype"], "count")
+                self.assertEqual(call.args[0]["retmax"], 0)
+
+    def test_long_search(self):
+        # A search too long for a URL is sent with POST.
+        terms = [f"Term {i}" for i in range(200)]
+        query = " AND ".join([
+            "(" + " OR ".join(map(engine.mesh_clause, terms)) + ")",
+            engine.mesh_clause("Public Health"), "2020[pdat]"])
+        self.assertGreater(len(query), eutils.MAX_GET)
+        with mockserver.MockServer() as server:
+            self.assertEqual(
+                dict(client(server).counts([query])),
+                {query: server.corpus.count(query)})
+
+    def test_history(self):
+        with mockserver.MockServer() as server:
+            searcher = client(server, history=True)
+            searcher.use_history(engine.mesh_clause("Public Health"))
+            found = dict(searcher.counts(QUERIES))
+            self.assertEqual(found, self.expected(server))
+            # One search kept the clause in a session, and each of the
+                # others referred to it.
+            self.assertEqual(server.calls, len(QUERIES) + 1)
+
+    def test_expired_history(self):
+        # Each session lasts long enough for a few searches, so the
+            # client has to make new ones as it goes.
+        with mockserver.MockServer(
+                latency=0.005, history_lifetime=0.05) as server:
+            searcher = client(server, history=True, concurrency=4)
+            searcher.use_history(engine.mesh_clause("Public Health"))
+            found = dict(searcher.counts(QUERIES))
+            self.assertEqual(found, self.expected(server))
+            self.assertGreater(server.calls, len(QUERIES) + 1)
+
+
+class RetryTest(unittest.TestCase):
+    """Searches whose responses fail."""
+
+    def expected(self, server):
+        return {query: server.corpus.count(query) for query in QUERIES}
+
+    def test_retries(self):
+        with mockserver.MockServer(
+                rate_limited=0.1, errors=0.1, seed=3) as server, \
+                mock.patch.object(eutils, "backoff", lambda attempt: 0):
+            searcher = client(server)
+            found = dict(searcher.counts(QUERIES))
+            self.assertEqual(found, self.expected(server))
+            self.assertEqual(searcher.failures, {})
+            self.assertGreater(server.calls, len(QUERIES))
+            self.assertEqual(searcher.retried, server.calls - len(QUERIES))
+
+    def test_failures(self):
+        with mockserver.MockServer(errors=1.0) as server, \
+                mock.patch.object(eutils, "backoff", lambda attempt: 0):
+            searcher = client(server, retries=1)
+            self.assertEqual(list(searcher.counts(QUERIES[:3])), [])
+            self.assertEqual(
+                searcher.failures,
+                {query: "TransientError: HTTP 500" for query in QUERIES[:3]})
+            # Each search was sent once and tried again once.
+            self.assertEqual(server.calls, 6)
+
+    def test_retry_after(self):
+        response = mock.Mock(headers={"Retry-After": "3"})
+        self.assertEqual(eutils.retry_after(response), 3)
+        response.headers = {
+            "Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}
+        self.assertEqual(eutils.retry_after(response), 0)
+        response.headers = {}
+        self.assertIsNone(eutils.retry_after(response))
+
+    def test_backoff(self):
+        for attempt, most in [(0, 1), (3, 8), (10, 60)]:
+            wait = eutils.backoff(attempt)
+            self.assertTrue(0 <= wait <= most)
+
+
+class BucketTest(unittest.TestCase):
+    """The rate limit the clients of an API key share."""
+
+    def test_spacing(self):
+        bucket = eutils.TokenBucket(50)
+        delays = [bucket.reserve() for _ in range(4)]
+        self.assertEqual(delays[0], 0)
+        for wait, expected in zip(delays[1:], [0.02, 0.04, 0.06]):
+            self.assertAlmostEqual(wait, expected, delta=0.005)
+
+    def test_shared(self):
+        bucket = eutils.shared_bucket("bucket-test", 20)
+        self.assertIs(eutils.shared_bucket("bucket-test"), bucket)
+        self.assertIs(eutils.shared_bucket("bucket-test", 20), bucket)
+        self.assertEqual(bucket.rate, 20)
+
+    def test_other_rate(self):
+        eutils.shared_bucket("other-rate-test", 20)
+        with self.assertRaisesRegex(ValueError, "not 5"):
+            eutils.shared_bucket("other-rate-test", 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+"""
+SUMMARY: These tests run grids of a user-selected MeSH with two lists of
+    MeSH (see medline_trends/grid.py) against the stand-in server (see
+    medline_trends/mockserver.py) and check that the count of every
+    cell is the one esearch gives for the cell's own search, and that
+    a grid whose cells are mostly zero takes fewer searches than it has
+    cells. They also check how a grid is described and which
+    intersections are known to be zero.
+
+USAGE: Run this from the folder that holds the programs:
+        python -m pytest tests
+    or, without pytest:
+        python -m unittest discover tests
+"""
+
+# The datetime module dates the CSV filename.
+from datetime import date
+# The unittest module runs the tests.
+import unittest
+
+from medline_trends import eutils, grid, mockserver, presets
+from medline_trends.metrics import Metrics
+
+# The lists of the grids the tests run. The stand-in tags many citations
+    # with the first two MeSH of each list.
+DIMENSIONS = [
+    "Pharmacy Technicians;Gastroenterologists;Surgeons;Nurses",
+    "Armenia;Norway;Chad;Japan"]
+
+
+def client(server):
+    """Return a client of a stand-in server."""
+    return eutils.EutilsClient(
+        api_key="test", rate=1000, url=server.url, cache=False,
+        metrics=Metrics(console=False))
+
+
+class GridTest(unittest.TestCase):
+    """Grids of a MeSH with several lists."""
+
+    def test_make_grid(self):
+        made = grid.make_grid(
+            "Leprosy", ["Chad; Niger", "physicians"], 2000, 2001)
+        self.assertEqual(made.dimensions[0], ("Chad", "Niger"))
+        self.assertEqual(
+            made.dimensions[1], tuple(presets.PHYSICIANS.terms))
+        self.assertEqual(
+            made.columns, ["mesh_1", presets.PHYSICIANS.column])
+        self.assertEqual(
+            grid.csv_filename(made, date(2025, 3, 1)),
+            f"grid_leprosy_mesh_1_{presets.PHYSICIANS.column}"
+            "_2000-2001_2025-03-01.csv")
+
+    def test_ruled_out(self):
+        key = ((0, "Chad"), (1, "Surgeons"))
+        self.assertTrue(grid.ruled_out(key, 2000, {(key[:1], 2000): 0}))
+        self.assertTrue(grid.ruled_out(key, 2000, {((), 2000): 0}))
+        self.assertFalse(grid.ruled_out(key, 2000, {(key[:1], 2000): 3}))
+        self.assertFalse(grid.ruled_out(key, 2001, {(key[:1], 2000): 0}))
+        self.assertEqual(
+            grid.query("U", key, 2000),
+            '"Chad"[mh] AND "Surgeons"[mh] AND "U"[mh] AND 2000[pdat]')
+
+    def test_worthwhile(self):
+        small = grid.make_grid("U", ["A;B", "C;D;E;F"], 2000, 2000)
+        self.assertTrue(grid.worthwhile(small, (0,)))
+        self.assertFalse(grid.worthwhile(small, (1,)))
+        self.assertTrue(grid.worthwhile(small, (0, 1)))
+
+    def check(self, user_mesh):
+        """Run a grid, check each cell against esearch, and return the
+        rows, the number of searches, and the number of cells."""
+        made = grid.make_grid(user_mesh, DIMENSIONS, 1990, 1995)
+        corpus = mockserver.Corpus()
+        year_totals = {yr: corpus.total(yr) for yr in range(1990, 1996)}
+        with mockserver.MockServer(corpus) as server:
+            rows = grid.run(made, client(server), year_totals)
+            searches = server.calls
+            cells = {
+                grid.query(
+                    user_mesh, ((0, row["mesh_1"]), (1, row["mesh_2"])),
+                    row["year"]): row["intersecting_citations"]
+                for row in rows}
+            self.assertEqual(dict(client(server).counts(list(cells))), cells)
+        self.assertEqual(len(rows), 4 * 4 * 6)
+        return rows, searches, len(cells)
+
+    def test_counts(self):
+        rows, _, _ = self.check("Medical Secretaries")
+        found = {row["intersecting_citations"] > 0 for row in rows}
+        self.assertEqual(found, {True, False})
+
+    def test_sparse(self):
+        rows, searches, cells = self.check("Leprosy")
+        self.assertLess(searches, cells)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+"""
+SUMMARY: These tests run a job in the "groups" mode against the
+    stand-in server (see medline_trends/mockserver.py) and check that
+    its rows are the same as those of the default mode, with fewer
+    searches for a long list of terms that rarely intersect the
+    user-selected MeSH. They also check how a group's search is
+    written.
+
+USAGE: Run this from the folder that holds the programs:
+        python -m pytest tests
+    or, without pytest:
+        python -m unittest discover tests
+"""
+
+# The unittest module runs the tests.
+import unittest
+
+from medline_trends import engine, eutils, groups, mockserver, presets
+from medline_trends.metrics import Metrics
+
+# The job the tests run. Most of its cells have a count of zero.
+JOB = engine.Job(
+    "Burnout, Professional", presets.GEOGRAPHIC_LOCATIONS, 1966, 1968)
+
+
+def client(server):
+    """Return a client of a stand-in server."""
+    return eutils.EutilsClient(
+        api_key="test", rate=1000, url=server.url, cache=False,
+        metrics=Metrics(console=False))
+
+
+class GroupsTest(unittest.TestCase):
+    """The "groups" mode of the engine."""
+
+    def test_query(self):
+        self.assertEqual(
+            groups.query(['"A"[mh]', '"B"[mh]'], '"U"[mh]', 2001),
+            '("A"[mh] OR "B"[mh]) AND "U"[mh] AND 2001[pdat]')
+        self.assertEqual(
+            groups.query(['"A"[mh]'], '"U"[mh]', 2001),
+            '"A"[mh] AND "U"[mh] AND 2001[pdat]')
+
+    def test_same_rows(self):
+        corpus = mockserver.Corpus(JOB.preset.parents)
+        year_totals = {
+            yr: corpus.total(yr)
+            for yr in range(JOB.start_year, JOB.end_year + 1)}
+        with mockserver.MockServer(corpus) as server:
+            rows = engine.run(JOB, client(server), year_totals=year_totals)
+            searches = server.calls
+            self.assertEqual(
+                engine.run(
+                    JOB, client(server), "groups", year_totals=year_totals),
+                rows)
+            self.assertLess(server.calls - searches, searches)
+        found = {row["intersecting_citations"] > 0 for row in rows}
+        self.assertEqual(found, {True, False})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+"""
+SUMMARY: These tests build an index from a store of the small baseline
+    files in tests/data (see test_baseline.py) and check that it gives
+    the same counts as the store, with and without the MeSH descriptor
+    file desc.xml, and that the PMIDs of a descriptor come back the
+    same whether they are kept as a list or as a bitmap.
+
+USAGE: Run this from the folder that holds the programs:
+        python -m pytest tests
+    or, without pytest:
+        python -m unittest discover tests
+"""
+
+# The io module holds the lists and bitmaps of a block in memory.
+import io
+# The os module is used to build the paths of the test files.
+import os
+# The tempfile module holds the store and index in a folder that is
+    # removed after the tests.
+import tempfile
+# The unittest module runs the tests.
+import unittest
+
+# The numpy module makes up the PMIDs of a block.
+import numpy as np
+
+from medline_trends import baseline, engine, index
+
+# The folder of the test files.
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DESCRIPTORS = os.path.join(DATA, "desc.xml")
+
+# Searches like those the engine sends.
+SEARCHES = [
+    " AND ".join([engine.mesh_clause(name) for name in names] + [years])
+    for names, years in [
+        (["Surgeons", "Public Health"], "2020[pdat]"),
+        (["Surgeons", "Public Health"], "2021[pdat]"),
+        (["Surgeons"], "2019:2021[pdat]"),
+        (["Physicians", "Public Health"], "2019:2021[pdat]"),
+        (["Physicians"], "2020[pdat]"),
+        ([], "2021[pdat]"),
+        (["Nursing"], "2020[pdat]")]]
+
+
+class IndexTest(unittest.TestCase):
+    """An index built from a store."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.TemporaryDirectory()
+        cls.store_path = os.path.join(cls.folder.name, "store")
+        baseline.ingest(DATA, cls.store_path, workers=1)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.folder.cleanup()
+
+    def test_same_counts(self):
+        for descriptors, explodes in [(None, False), (DESCRIPTORS, True)]:
+            path = os.path.join(
+                self.folder.name, f"index-{bool(descriptors)}")
+            index.build(self.store_path, path, descriptors)
+            mesh_index = index.MeshIndex(path)
+            self.assertEqual(mesh_index.explodes, explodes)
+            store = baseline.Store(self.store_path, descriptors)
+            self.assertEqual(
+                list(mesh_index.counts(SEARCHES)),
+                list(store.counts(SEARCHES)))
+            # Only with the descriptor file does "Physicians" find the
+                # citation tagged with "Surgeons" in 2020.
+            self.assertEqual(
+                mesh_index.count(SEARCHES[4]), int(explodes))
+
+    def test_pmids(self):
+        path = os.path.join(self.folder.name, "index-pmids")
+        index.build(self.store_path, path, DESCRIPTORS)
+        mesh_index = index.MeshIndex(path)
+        self.assertEqual(
+            mesh_index.pmids(["Physicians"]).tolist(), [1, 2, 3])
+        self.assertEqual(
+            mesh_index.pmids(["Surgeons", "Public Health"]).tolist(),
+            [1, 3])
+        self.assertEqual(mesh_index.pmids(["Nursing"]).tolist(), [])
+
+
+class BlockTest(unittest.TestCase):
+    """The lists and bitmaps of a block."""
+
+    def test_lists_and_bitmaps(self):
+        rng = np.random.default_rng(0)
+        # Descriptor 1 tags a few PMIDs in each of two chunks, so they
+            # are kept as lists; descriptor 2 tags more than MAX_LIST in
+            # the first chunk, so they are kept as a bitmap.
+        few = np.array([5, 70000, 131071], np.int64)
+        many = np.sort(rng.choice(
+            index.CHUNK, index.MAX_LIST + 100, replace=False))
+        pmid = np.concatenate([few, many])
+        descriptor = np.array([1] * len(few) + [2] * len(many))
+        postings = io.BytesIO()
+        records = index.index_block(pmid, descriptor, postings)
+        self.assertEqual(records["descriptor"].tolist(), [1, 1, 2])
+        self.assertEqual(records["key"].tolist(), [0, 1, 0])
+        mesh_index = index.MeshIndex(None)
+        mesh_index.containers = records
+        mesh_index._descriptor_column = records["descriptor"]
+        mesh_index.postings = np.frombuffer(postings.getvalue(), "u1")
+        for ui, expected in [("D000001", few), ("D000002", many)]:
+            bitmaps = mesh_index.descriptor_set(ui)
+            found = np.concatenate([
+                np.flatnonzero(np.unpackbits(
+                    bitmaps[key].view("u1"), bitorder="little"))
+                + key * index.CHUNK
+                for key in sorted(bitmaps)])
+            self.assertEqual(found.tolist(), expected.tolist())
+
+
+if __name__ == "__main__":
+    unittest.main()
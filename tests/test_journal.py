@@ -0,0 +1,115 @@
+"""
+SUMMARY: These tests run a small job with a journal against a client
+    that makes up its counts, and check that a run that stops partway
+    picks up where it left off, that a finished run starts over the
+    next time, that the cells that fail are kept in the ledger of
+    failures, and that a line cut short by a crash does no harm.
+
+USAGE: Run this from the folder that holds the programs:
+        python -m pytest tests
+    or, without pytest:
+        python -m unittest discover tests
+"""
+
+# The datetime module dates the runs.
+from datetime import date
+# The tempfile module holds the journals in a folder that is removed
+    # after the tests.
+import tempfile
+# The unittest module runs the tests.
+import unittest
+# The warnings module hides the warnings about failed cells.
+import warnings
+
+from medline_trends import engine, journal
+
+# The job the tests run: a pair of MeSH over a few years.
+JOB = engine.Job("Surgeons", engine.pair("Public Health"), 2018, 2024)
+YEAR_TOTALS = {yr: 1000 for yr in range(2018, 2025)}
+
+
+class Client:
+    """A client that gives every search the same count, except those
+    for the years it is told to fail, and keeps the searches it was
+    sent."""
+
+    explodes = True
+
+    def __init__(self, count=5, failing=()):
+        self.count = count
+        self.failing = failing
+        self.sent = []
+        self.failures = {}
+
+    def counts(self, queries):
+        for query in queries:
+            self.sent.append(query)
+            if not any(f"{yr}[pdat]" in query for yr in self.failing):
+                yield query, self.count
+
+    def years(self):
+        """Return the years of the searches the client was sent."""
+        return sorted({int(query[-10:-6]) for query in self.sent})
+
+
+class JournalTest(unittest.TestCase):
+    """Running a job with a journal."""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.journal = journal.for_job(JOB, self.folder.name)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def run_job(self, client, year_totals=YEAR_TOTALS):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            return engine.run(
+                JOB, client, journal=self.journal, year_totals=year_totals)
+
+    def test_resume_then_restart(self):
+        rows = self.run_job(Client(failing=[2020]))
+        self.assertEqual(len(rows), 6)
+        self.assertFalse(self.journal.finished())
+        self.assertEqual(
+            self.journal.failures(),
+            {engine.Cell("Public Health", 2020): "No count came back"})
+        # Run again, only the failed cell is searched for.
+        client = Client()
+        self.assertEqual(len(self.run_job(client)), 7)
+        self.assertEqual(client.years(), [2020])
+        self.assertTrue(self.journal.finished())
+        self.assertEqual(self.journal.failures(), {})
+        # Once finished, a run starts over and searches for every cell.
+        client = Client(count=9)
+        rows = self.run_job(client)
+        self.assertEqual(client.years(), list(range(2018, 2025)))
+        self.assertEqual(
+            {row["intersecting_citations"] for row in rows}, {9})
+        self.assertEqual(self.journal.job(), JOB)
+        self.assertEqual(self.journal.started(), date.today())
+
+    def test_cut_short(self):
+        # A line cut short by a crash is skipped, and the next record
+            # starts on a line of its own.
+        self.journal.start(JOB)
+        self.journal.write(engine.Cell("Public Health", 2018), 4)
+        self.journal.close()
+        with open(self.journal.path, "a", encoding="utf-8") as f:
+            f.write('{"term": "Public Health", "ye')
+        self.journal.write(engine.Cell("Public Health", 2019), 6)
+        self.journal.close()
+        self.assertEqual(self.journal.read(), {
+            engine.Cell("Public Health", 2018): 4,
+            engine.Cell("Public Health", 2019): 6})
+
+    def test_rule_left_out(self):
+        job = JOB._replace(preset=JOB.preset._replace(rule=["a rule"]))
+        self.journal.start(job)
+        self.journal.close()
+        self.assertEqual(self.journal.job(), JOB)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+"""
+SUMMARY: These tests read the MeSH descriptor file tests/data/desc.xml
+    and check the first year each MeSH was applied, as read from its
+    history note and as covered by a "[mh]" search, and that the engine
+    counts the cells from before a MeSH was applied as zero without
+    searching for them. They also check which MeSH the rules of a
+    preset select from a small made-up tree, that the engine takes a
+    preset's terms from its rule, and that the compact copy of the
+    descriptor file gives back the same tree.
+
+USAGE: Run this from the folder that holds the programs:
+        python -m pytest tests
+    or, without pytest:
+        python -m unittest discover tests
+"""
+
+# The os module is used to build the paths of the test files.
+import os
+# The tempfile module holds the compact copies of the descriptor file in
+    # a folder that is removed after the tests.
+import tempfile
+# The unittest module runs the tests.
+import unittest
+# The unittest.mock module points the cache folder at that folder.
+from unittest import mock
+
+from medline_trends import engine, mesh
+
+# The folder of the test files.
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DESCRIPTORS = os.path.join(DATA, "desc.xml")
+
+
+class Client:
+    """A client that gives every search a count of one and keeps the
+    searches it was sent."""
+
+    explodes = True
+
+    def __init__(self):
+        self.sent = []
+
+    def counts(self, queries):
+        for query in queries:
+            self.sent.append(query)
+            yield query, 1
+
+
+class MeshTest(unittest.TestCase):
+    """The descriptor file, with the compact copies kept in a folder of
+    their own."""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.environment = mock.patch.dict(os.environ, {
+            "MEDLINE_TRENDS_CACHE": os.path.join(
+                self.folder.name, "esearch.sqlite")})
+        self.environment.start()
+
+    def tearDown(self):
+        self.environment.stop()
+        self.folder.cleanup()
+
+
+class FirstYearTest(MeshTest):
+    """The first year each MeSH was applied."""
+
+    def test_history_notes(self):
+        self.assertEqual(mesh.first_year("2021 (2020)"), 2020)
+        self.assertEqual(
+            mesh.first_year("91(75); was SURGEONS 1963-90"), 1963)
+        self.assertEqual(mesh.first_year("66"), 1966)
+        self.assertIsNone(mesh.first_year(None))
+
+    def test_tree(self):
+        tree = mesh.Tree.from_file(DESCRIPTORS)
+        self.assertEqual(tree.descriptors["D013502"].first_year, 1963)
+        # A search for "Physicians" also finds "Surgeons", which was
+            # applied earlier.
+        self.assertEqual(tree.first_year("Physicians"), 1963)
+        self.assertEqual(
+            tree.first_years(["Public Health", "Nursing"]),
+            {"Public Health": 1966})
+
+    def test_engine_skips(self):
+        job = engine.Job(
+            "Surgeons", engine.pair("Public Health"), 1963, 1968)
+        client = Client()
+        rows = engine.run(
+            job, client, descriptors=DESCRIPTORS,
+            year_totals={yr: 100 for yr in range(1963, 1969)})
+        self.assertEqual(
+            [row["intersecting_citations"] for row in rows],
+            [0, 0, 0, 1, 1, 1])
+        self.assertEqual(
+            [query[-10:-6] for query in client.sent],
+            ["1966", "1967", "1968"])
+
+
+# A small part of the MeSH tree.
+TREE = mesh.Tree([
+    mesh.Descriptor("D1", "Geographic Locations", ["Z01"]),
+    mesh.Descriptor("D2", "Africa", ["Z01.058"]),
+    mesh.Descriptor("D3", "Chad", ["Z01.058.290.175"]),
+    mesh.Descriptor("D4", "Oceans and Seas", ["Z01.756"]),
+    mesh.Descriptor("D5", "Atlantic Ocean", ["Z01.756.100"]),
+    mesh.Descriptor("D6", "Americas", ["Z01.107"]),
+    mesh.Descriptor("D7", "Physicians", ["M01.526.485"]),
+    mesh.Descriptor("D8", "Surgeons", ["M01.526.485.810"]),
+    mesh.Descriptor("D9", "Allergists", ["M01.526.485.067"]),
+    mesh.Descriptor(
+        "D10", "Surgeons, Oral", ["M01.526.485.810.500", "Z01.107.900"]),
+])
+
+
+class SelectTest(unittest.TestCase):
+    """The MeSH a preset's rules select."""
+
+    def test_depths(self):
+        self.assertEqual(
+            TREE.select([mesh.Subtree("Physicians", 0, 1)]),
+            ["Physicians", "Allergists", "Surgeons"])
+        self.assertEqual(
+            TREE.select([mesh.Subtree("M01.526.485", 2, None)]),
+            ["Surgeons, Oral"])
+        self.assertEqual(
+            TREE.select([mesh.Subtree("Geographic Locations", 0, None)]),
+            ["Geographic Locations", "Africa", "Chad", "Americas",
+             "Surgeons, Oral", "Oceans and Seas", "Atlantic Ocean"])
+
+    def test_exclude(self):
+        self.assertEqual(
+            TREE.select([mesh.Subtree("Z01", 1, 1, ["Z01.756"])]),
+            ["Africa", "Americas"])
+        self.assertEqual(
+            TREE.select([mesh.Subtree("Z01", 1, 3, ["Africa", "Z01.756"])]),
+            ["Americas", "Surgeons, Oral"])
+
+    def test_several_rules(self):
+        # A MeSH selected by two rules is listed once, the first time.
+        self.assertEqual(
+            TREE.select([
+                mesh.Subtree("Surgeons", 0, 1),
+                mesh.Subtree("Americas", 0, 1)]),
+            ["Surgeons", "Surgeons, Oral", "Americas"])
+        self.assertEqual(TREE.select([mesh.Subtree("Nursing", 0, 1)]), [])
+
+
+class CompactTest(MeshTest):
+    """The compact copy of a descriptor file, and rules in the engine."""
+
+    def test_compact_copy(self):
+        # Trees loaded by the other tests are forgotten, so that this one
+            # is read from the file.
+        with mock.patch.dict(mesh._loaded, clear=True):
+            tree = mesh.load(DESCRIPTORS)
+            self.assertIs(mesh.load(DESCRIPTORS), tree)
+        self.assertTrue(os.path.exists(mesh.compact_path(DESCRIPTORS)))
+        copy, stamp = mesh.Tree.open(mesh.compact_path(DESCRIPTORS))
+        self.assertEqual(copy.descriptors, tree.descriptors)
+        info = os.stat(DESCRIPTORS)
+        self.assertEqual(stamp, (info.st_size, info.st_mtime_ns))
+
+    def test_engine_rule(self):
+        # The preset lists a term, but the rule and the file decide.
+        preset = engine.Preset(
+            "test", "term", ["Nursing"],
+            rule=[mesh.Subtree("Physicians", 0, 1)])
+        job = engine.Job("Public Health", preset, 2000, 2000)
+        rows = engine.run(
+            job, Client(), descriptors=DESCRIPTORS,
+            year_totals={2000: 100})
+        self.assertEqual(
+            [row["term"] for row in rows], ["Physicians", "Surgeons"])
+        rows = engine.run(job, Client(), year_totals={2000: 100})
+        self.assertEqual([row["term"] for row in rows], ["Nursing"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+"""
+SUMMARY: These tests check the metrics of a run (see
+    medline_trends/metrics.py): the counters and ratios of a snapshot,
+    the progress line, and the JSON and Prometheus files. They also
+    run a job against the stand-in server (see
+    medline_trends/mockserver.py), some of whose responses fail, and
+    check that the metrics of its client agree with the server.
+
+USAGE: Run this from the folder that holds the programs:
+        python -m pytest tests
+    or, without pytest:
+        python -m unittest discover tests
+"""
+
+# The json module reads back the metrics file.
+import json
+# The os module is used to build the paths of the metrics files.
+import os
+# The tempfile module holds the metrics files in a folder that is
+    # removed after the tests.
+import tempfile
+# The unittest module runs the tests.
+import unittest
+# The unittest.mock module takes out the waits between retries.
+from unittest import mock
+
+from medline_trends import engine, eutils, metrics, mockserver, presets
+
+
+def counted():
+    """Return the metrics of a made-up run: 4 cells, 3 done; 4
+    requests, 1 failed and tried again; 2 counts from the cache and 2
+    not."""
+    run = metrics.Metrics(console=False)
+    run.add_cells(4, done=1)
+    for seconds, ok in [(0.1, True), (0.2, False), (0.3, True), (0.4, True)]:
+        run.request(seconds, ok)
+    run.retry()
+    for hit in [True, True, False, False]:
+        run.cache_hit(hit)
+    run.cell_done()
+    run.cell_done()
+    return run
+
+
+class MetricsTest(unittest.TestCase):
+    """The counters and reports of the metrics."""
+
+    def test_helpers(self):
+        self.assertEqual(metrics.percentile([3, 1, 2, 4], 0.5), 3)
+        self.assertEqual(metrics.percentile([3, 1, 2, 4], 0.99), 4)
+        self.assertIsNone(metrics.percentile([], 0.5))
+        self.assertEqual(metrics.duration(3725.9), "1:02:05")
+
+    def test_snapshot(self):
+        snapshot = counted().snapshot()
+        self.assertEqual(snapshot["cells_done"], 3)
+        self.assertEqual(snapshot["cells_total"], 4)
+        self.assertEqual(snapshot["requests"], 4)
+        self.assertEqual(snapshot["request_errors"], 1)
+        self.assertEqual(snapshot["retries"], 1)
+        self.assertEqual(snapshot["error_ratio"], 0.25)
+        self.assertEqual(snapshot["cache_hit_ratio"], 0.5)
+        self.assertEqual(snapshot["latency_seconds"]["0.5"], 0.3)
+        self.assertIsNotNone(snapshot["last_progress"])
+        self.assertIsNotNone(snapshot["eta_seconds"])
+        empty = metrics.Metrics(console=False).snapshot()
+        self.assertEqual(empty["error_ratio"], 0.0)
+        self.assertIsNone(empty["eta_seconds"])
+
+    def test_line(self):
+        run = counted()
+        line = run.line(run.snapshot())
+        self.assertTrue(line.startswith("3/4 cells (75%) | "))
+        self.assertIn("p50 300 ms, p99 400 ms", line)
+        self.assertIn("1 errors, 1 retries | cache 50%", line)
+
+    def test_files(self):
+        with tempfile.TemporaryDirectory() as folder:
+            for name in ["metrics.json", "metrics.prom"]:
+                path = os.path.join(folder, name)
+                run = counted()
+                run.path = path
+                run.report()
+                with open(path, encoding="utf-8") as file:
+                    text = file.read()
+                if name.endswith(".json"):
+                    self.assertEqual(json.loads(text)["requests"], 4)
+                else:
+                    lines = text.splitlines()
+                    self.assertIn("medline_trends_requests_total 4", lines)
+                    self.assertIn("medline_trends_cells_done 3", lines)
+                    self.assertIn(
+                        'medline_trends_latency_seconds{quantile="0.9"} 0.4',
+                        lines)
+            self.assertEqual(
+                sorted(os.listdir(folder)), ["metrics.json", "metrics.prom"])
+
+    def test_run(self):
+        job = engine.Job("Public Health", presets.PHYSICIANS, 2000, 2002)
+        corpus = mockserver.Corpus(job.preset.parents)
+        year_totals = {yr: corpus.total(yr) for yr in range(2000, 2003)}
+        with mockserver.MockServer(
+                corpus, errors=0.2, seed=1) as server, \
+                mock.patch.object(eutils, "backoff", lambda attempt: 0):
+            client = eutils.EutilsClient(
+                api_key="test", rate=1000, url=server.url, cache=False,
+                metrics=metrics.Metrics(console=False))
+            rows = engine.run(job, client, year_totals=year_totals)
+            snapshot = client.metrics.snapshot()
+            self.assertEqual(snapshot["requests"], server.calls)
+        self.assertEqual(snapshot["cells_total"], len(engine.plan(job)))
+        self.assertEqual(snapshot["cells_done"], len(rows))
+        self.assertGreater(snapshot["request_errors"], 0)
+        self.assertEqual(snapshot["retries"], snapshot["request_errors"])
+
+
+if __name__ == "__main__":
+    unittest.main()
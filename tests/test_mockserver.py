@@ -0,0 +1,52 @@
+"""
+SUMMARY: These tests check that the made-up counts of the stand-in
+    server (see medline_trends/mockserver.py) agree with one another
+    the way the engine relies on, that a corpus gives the same counts
+    every time, and that a corpus, with the counts it remembers, is
+    freed once nothing refers to it.
+
+USAGE: Run this from the folder that holds the programs:
+        python -m pytest tests
+    or, without pytest:
+        python -m unittest discover tests
+"""
+
+# The gc module frees the corpus in the test of that.
+import gc
+# The unittest module runs the tests.
+import unittest
+# The weakref module tells whether the corpus was freed.
+import weakref
+
+from medline_trends import mockserver, presets
+
+
+class CorpusTest(unittest.TestCase):
+    """The made-up counts."""
+
+    def test_counts_agree(self):
+        corpus = mockserver.Corpus(presets.PHYSICIANS.parents)
+        search = '"Surgeons"[mh] AND "Public Health"[mh] AND {}[pdat]'
+        years = [corpus.count(search.format(yr)) for yr in range(2000, 2003)]
+        self.assertEqual(corpus.count(search.format("2000:2002")), sum(years))
+        self.assertLessEqual(
+            corpus.count(search.format(2001)),
+            corpus.count('"Physicians"[mh] AND "Public Health"[mh] AND '
+                         '2001[pdat]'))
+        self.assertEqual(
+            mockserver.Corpus(presets.PHYSICIANS.parents).count(
+                search.format(2001)),
+            years[1])
+
+    def test_freed(self):
+        corpus = mockserver.Corpus()
+        corpus.count('"Leprosy"[mh] AND 2001[pdat]')
+        self.assertTrue(corpus.cells)
+        freed = weakref.ref(corpus)
+        del corpus
+        gc.collect()
+        self.assertIsNone(freed())
+
+
+if __name__ == "__main__":
+    unittest.main()
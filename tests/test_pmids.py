@@ -0,0 +1,144 @@
+"""
+SUMMARY: These tests run jobs in the "pmids" mode against a client that
+    holds a few made-up citations and answers searches for their PMIDs
+    the way esearch does, and check that the rows are the same as
+    those of the default mode, that the user-selected MeSH is harvested
+    once for each year and each term once for the whole range, that a
+    search with more PMIDs than one page holds is split, and that the
+    harvested lists are cached. They also check how the PMIDs are read
+    from an esearch response.
+
+USAGE: Run this from the folder that holds the programs:
+        python -m pytest tests
+    or, without pytest:
+        python -m unittest discover tests
+"""
+
+# The asyncio module runs the client's searches.
+import asyncio
+# The datetime module dates the made-up citations.
+from datetime import date, timedelta
+# The os module is used to build the path of the cache.
+import os
+# The tempfile module holds the cache in a folder that is removed after
+    # the tests.
+import tempfile
+# The unittest module runs the tests.
+import unittest
+# The unittest.mock module makes a page of PMIDs smaller.
+from unittest import mock
+
+from medline_trends import engine, pmids
+from medline_trends.cache import CountCache
+
+# The job the tests run.
+JOB = engine.Job(
+    "Public Health", engine.Preset(
+        "test", "term", ["Surgeons", "Nurses", "Dentists"]), 2018, 2020)
+YEAR_TOTALS = {2018: 1000, 2019: 1000, 2020: 1000}
+
+# Made-up citations: their PMIDs, publication dates, and MeSH.
+CITATIONS = [
+    (pmid, date(2018 + pmid % 3, 1, 1) + timedelta(days=pmid * 5 % 365),
+     {name for name, every in [
+         ("Public Health", 2), ("Surgeons", 3), ("Nurses", 5)]
+      if pmid % every == 0})
+    for pmid in range(1, 91)]
+
+
+class Client:
+    """A client that answers searches for the made-up citations, with
+    their PMIDs or with a count, and keeps the searches it was sent."""
+
+    cache = None
+
+    def __init__(self):
+        self.searches = []
+
+    def find(self, query):
+        """Return the PMIDs of the citations a search finds."""
+        *clauses, dates = query.split(" AND ")
+        names = {clause[1:-len('"[mh]')] for clause in clauses}
+        if "/" in dates:
+            start, end = [
+                date(*map(int, part.split("/")))
+                for part in dates[:-len("[pdat]")].split(":")]
+        else:
+            year = int(dates[:4])
+            start, end = date(year, 1, 1), date(year, 12, 31)
+        return [
+            pmid for pmid, published, mesh in CITATIONS
+            if start <= published <= end and names <= mesh]
+
+    async def search(self, query, retmax=0):
+        self.searches.append(query)
+        ids = self.find(query)
+        return (
+            f"<eSearchResult><Count>{len(ids)}</Count><RetMax>"
+            f"{min(len(ids), retmax)}</RetMax><IdList>"
+            + "".join(f"<Id>{pmid}</Id>" for pmid in ids[:retmax])
+            + "</IdList></eSearchResult>")
+
+    def map(self, fn, items):
+        for item in items:
+            yield item, asyncio.run(fn(item))
+
+    def counts(self, queries):
+        for query in queries:
+            yield query, len(self.find(query))
+
+
+class ParseTest(unittest.TestCase):
+    """How PMIDs are read from an esearch response."""
+
+    def test_ids(self):
+        text = (
+            '<?xml version="1.0" encoding="UTF-8" ?>\n'
+            "<eSearchResult><Count>3</Count><RetMax>2</RetMax>"
+            "<IdList><Id>40</Id><Id>12</Id></IdList>"
+            "<TranslationStack><TermSet><Count>9</Count></TermSet>"
+            "</TranslationStack></eSearchResult>")
+        self.assertEqual(pmids.parse_ids(text), (3, [40, 12]))
+
+    def test_error(self):
+        with self.assertRaisesRegex(ValueError, "Search Backend failed"):
+            pmids.parse_ids(
+                "<eSearchResult><ERROR>Search Backend failed</ERROR>"
+                "</eSearchResult>")
+
+
+class ModeTest(unittest.TestCase):
+    """Jobs run in the "pmids" mode."""
+
+    def test_same_rows(self):
+        client = Client()
+        rows = engine.run(JOB, client, "pmids", year_totals=YEAR_TOTALS)
+        self.assertEqual(
+            rows, engine.run(JOB, Client(), year_totals=YEAR_TOTALS))
+        self.assertTrue(any(row["intersecting_citations"] for row in rows))
+        # The user-selected MeSH once for each year, and each term once.
+        self.assertEqual(len(client.searches), 3 + 3)
+
+    def test_split(self):
+        client = Client()
+        with mock.patch.object(pmids, "PAGE", 4):
+            rows = engine.run(JOB, client, "pmids", year_totals=YEAR_TOTALS)
+        self.assertEqual(
+            rows, engine.run(JOB, Client(), year_totals=YEAR_TOTALS))
+        self.assertGreater(len(client.searches), 6)
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as folder:
+            cache = CountCache(os.path.join(folder, "esearch.sqlite"))
+            first, second = Client(), Client()
+            first.cache = second.cache = cache
+            rows = engine.run(JOB, first, "pmids", year_totals=YEAR_TOTALS)
+            self.assertEqual(
+                engine.run(JOB, second, "pmids", year_totals=YEAR_TOTALS),
+                rows)
+            self.assertEqual(second.searches, [])
+            cache.connection().close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+"""
+SUMMARY: These tests bring an earlier run of a small job up to date
+    (see medline_trends/refresh.py) against a client that makes up its
+    counts, and check that only the years that were new or still
+    settling when the earlier run started are searched for again,
+    whether the earlier run is read from its journal or its CSV file,
+    and that the cells whose counts changed are reported.
+
+USAGE: Run this from the folder that holds the programs:
+        python -m pytest tests
+    or, without pytest:
+        python -m unittest discover tests
+"""
+
+# The datetime module dates the runs.
+from datetime import date
+# The json module edits the date in a journal.
+import json
+# The os module is used to build the path of the earlier CSV file.
+import os
+# The tempfile module holds the journals and CSV files in a folder that
+    # is removed after the tests.
+import tempfile
+# The unittest module runs the tests.
+import unittest
+# The unittest.mock module stands in for the table of yearly totals.
+from unittest import mock
+
+from medline_trends import engine, journal, refresh, totals
+
+# The job of the earlier run: a pair of MeSH over a few years.
+JOB = engine.Job("Surgeons", engine.pair("Public Health"), 2018, 2024)
+
+
+class Client:
+    """A client that gives every search the same count and keeps the
+    searches it was sent."""
+
+    explodes = True
+
+    def __init__(self, count):
+        self.count = count
+        self.sent = []
+        self.failures = {}
+
+    def counts(self, queries):
+        for query in queries:
+            self.sent.append(query)
+            yield query, self.count
+
+    def years(self):
+        """Return the years of the searches the client was sent."""
+        return sorted({int(query[-10:-6]) for query in self.sent})
+
+
+class RefreshTest(unittest.TestCase):
+    """Bringing an earlier run up to date."""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.journal = journal.for_job(JOB, self.folder.name)
+        self.journal.reset(JOB, {
+            engine.Cell("Public Health", yr): 1 for yr in range(2018, 2025)})
+        self.totals = mock.patch.object(
+            totals, "load",
+            lambda years, client, path=None: {yr: 1000 for yr in years})
+        self.totals.start()
+
+    def tearDown(self):
+        self.totals.stop()
+        self.folder.cleanup()
+
+    def started(self, day):
+        """Change the date the earlier run started, or leave it out."""
+        with open(self.journal.path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        record = json.loads(lines[0])
+        record.pop("started")
+        if day is not None:
+            record["started"] = day
+        lines[0] = json.dumps(record)
+        with open(self.journal.path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def refresh(self, previous_path):
+        client = Client(count=3)
+        rows, changes = refresh.refresh(
+            JOB._replace(end_year=2025), previous_path, self.folder.name,
+            client)
+        return client, rows, changes
+
+    def test_settled_as_of_earlier_run(self):
+        # Run in 2023, the years up to 2020 had settled.
+        self.started("2023-05-01")
+        client, rows, changes = self.refresh(self.journal.path)
+        self.assertEqual(client.years(), [2021, 2022, 2023, 2024, 2025])
+        self.assertEqual(len(rows), 8)
+        self.assertEqual(
+            [row["intersecting_citations"] for row in rows],
+            [1, 1, 1, 3, 3, 3, 3, 3])
+        self.assertEqual(
+            sorted(change.year for change in changes),
+            [2021, 2022, 2023, 2024])
+        self.assertEqual({(c.old, c.new) for c in changes}, {(1, 3)})
+
+    def test_unknown_date(self):
+        self.started(None)
+        client, _, _ = self.refresh(self.journal.path)
+        self.assertEqual(client.years(), list(range(2018, 2026)))
+
+    def test_earlier_csv(self):
+        filename = engine.csv_filename(JOB, date(2023, 5, 1))
+        rows = engine.run(
+            JOB, Client(count=1),
+            year_totals={yr: 1000 for yr in range(2018, 2025)})
+        engine.write_csv(rows, self.folder.name, filename)
+        client, _, changes = self.refresh(
+            os.path.join(self.folder.name, filename))
+        self.assertEqual(client.years(), [2021, 2022, 2023, 2024, 2025])
+        self.assertEqual(len(changes), 4)
+
+    def test_run_date(self):
+        self.assertEqual(
+            refresh.run_date("pair_surgeons_2018-2024_2023-05-01.csv"),
+            date(2023, 5, 1))
+        self.assertIsNone(refresh.run_date("results.csv"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+"""
+SUMMARY: These tests run the shards of a job in separate processes, as
+    separate computers would, against the stand-in server (see
+    medline_trends/mockserver.py), and check that merging their partial
+    files gives the rows of the whole job run at once. They also check
+    how the years are split and that the merge stops when a shard or a
+    yearly total is missing.
+
+USAGE: Run this from the folder that holds the programs:
+        python -m pytest tests
+    or, without pytest:
+        python -m unittest discover tests
+"""
+
+# The glob module finds the partial files.
+import glob
+# The os module is used to build paths and pass on the environment.
+import os
+# The subprocess module runs each shard in its own process.
+import subprocess
+# The sys module names the Python that runs the tests.
+import sys
+# The tempfile module holds the partial files in a folder that is
+    # removed after the tests.
+import tempfile
+# The unittest module runs the tests.
+import unittest
+
+from medline_trends import engine, eutils, mockserver, presets, shards
+from medline_trends.metrics import Metrics
+
+# The folder that holds the programs.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The job the tests split up.
+JOB = engine.Job("Public Health", presets.PHYSICIANS, 2016, 2021)
+SHARDS = 3
+
+
+def corpus():
+    """Return the stand-in's citations, with the hierarchy of every
+    preset."""
+    parents = {}
+    for preset in presets.BY_NAME.values():
+        parents.update(preset.parents or {})
+    return mockserver.Corpus(parents)
+
+
+class SplitTest(unittest.TestCase):
+    """How shard() splits the years of a job."""
+
+    def test_blocks(self):
+        blocks = [
+            (part.start_year, part.end_year)
+            for part in (shards.shard(JOB, i, 4) for i in range(1, 5))]
+        self.assertEqual(
+            blocks, [(2016, 2017), (2018, 2019), (2020, 2020), (2021, 2021)])
+
+    def test_too_many(self):
+        with self.assertRaises(ValueError):
+            shards.shard(JOB, 1, 7)
+
+
+class ShardTest(unittest.TestCase):
+    """Shards run in separate processes and then merged."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.TemporaryDirectory()
+        environment = dict(os.environ, PYTHONPATH=ROOT)
+        with mockserver.MockServer(corpus()) as server:
+            runs = [
+                subprocess.Popen(
+                    [sys.executable, "-m", "medline_trends.shards", "run",
+                     JOB.user_mesh, "--preset", JOB.preset.name,
+                     str(index), str(SHARDS),
+                     "--start-year", str(JOB.start_year),
+                     "--end-year", str(JOB.end_year),
+                     "--api-key", "test", "--url", server.url,
+                     "--folder", cls.folder.name],
+                    cwd=ROOT, env=environment, stderr=subprocess.PIPE)
+                for index in range(1, SHARDS + 1)]
+            cls.errors = [run.communicate()[1] for run in runs]
+            cls.codes = [run.returncode for run in runs]
+            client = eutils.EutilsClient(
+                api_key="test", rate=1000, url=server.url, cache=False,
+                metrics=Metrics(console=False))
+            cls.whole = engine.run(JOB, client)
+        cls.paths = sorted(glob.glob(os.path.join(cls.folder.name, "*")))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.folder.cleanup()
+
+    def test_merge(self):
+        self.assertEqual(self.codes, [0] * SHARDS, self.errors)
+        self.assertEqual(len(self.paths), SHARDS)
+        job, rows = shards.merge(self.paths)
+        self.assertEqual(
+            (job.user_mesh, job.start_year, job.end_year),
+            (JOB.user_mesh, JOB.start_year, JOB.end_year))
+        self.assertEqual(rows, self.whole)
+
+    def test_missing_shard(self):
+        with self.assertRaisesRegex(ValueError, "Missing shards"):
+            shards.merge(self.paths[1:])
+
+    def test_missing_total(self):
+        # A copy of the first partial file without the total of its first
+            # year.
+        copy = os.path.join(self.folder.name, "copy")
+        os.makedirs(copy, exist_ok=True)
+        with open(self.paths[0], encoding="utf-8") as f:
+            lines = [
+                line for line in f
+                if f'"year": {JOB.start_year}, "total"' not in line]
+        edited = os.path.join(copy, os.path.basename(self.paths[0]))
+        with open(edited, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+        with self.assertRaisesRegex(ValueError, "no total for 2016"):
+            shards.merge([edited] + self.paths[1:])
+
+
+if __name__ == "__main__":
+    unittest.main()
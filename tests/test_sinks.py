@@ -0,0 +1,166 @@
+"""
+SUMMARY: These tests write rows to the sinks in medline_trends/sinks.py
+    and check that the CSV file is the same as the one the programs
+    wrote with pandas, that each row is on disk as soon as it is
+    written, and that the JSON Lines file gives back the rows. They
+    also check that engine.write_csv() keeps the rows written before a
+    run stops partway and where engine.dataset_path() puts the Parquet
+    file of a run. If pyarrow is installed, they check that the Parquet
+    file gives back the rows with their types and is only seen once it
+    is complete.
+
+USAGE: Run this from the folder that holds the programs:
+        python -m pytest tests
+    or, without pytest:
+        python -m unittest discover tests
+"""
+
+# The datetime module dates the runs of the dataset.
+from datetime import date
+# The importlib.util module tells whether pyarrow is installed.
+import importlib.util
+# The json module reads back the rows of a JSON Lines file.
+import json
+# The os module is used to build the paths of the files.
+import os
+# The tempfile module holds the files in a folder that is removed after
+    # the tests.
+import tempfile
+# The unittest module runs the tests.
+import unittest
+# The unittest.mock module hides pyarrow.
+from unittest import mock
+
+# The pandas module writes the CSV file the way the programs used to.
+import pandas as pd
+
+from medline_trends import engine, presets, sinks
+
+# Whether the Parquet tests can run.
+PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+# Rows like those the engine makes.
+ROWS = [
+    {"year": 2001, "user_mesh": "Burnout, Professional",
+     "term": "Physicians", "intersecting_citations": 12,
+     "total_medline_citations": 480000,
+     "intersecting_citations_per_1k": 0.025},
+    {"year": 2002, "user_mesh": "Burnout, Professional",
+     "term": "Surgeons", "intersecting_citations": 0,
+     "total_medline_citations": 490000,
+     "intersecting_citations_per_1k": 0.0}]
+
+
+class FileTest(unittest.TestCase):
+    """Files written to a folder of their own."""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.folder.name, name)
+
+    def read(self, name):
+        with open(self.path(name), "rb") as file:
+            return file.read()
+
+
+class SinkTest(FileTest):
+    """The CSV and JSON Lines sinks."""
+
+    def test_csv_like_pandas(self):
+        with sinks.CsvSink(self.path("sink.csv")) as sink:
+            for row in ROWS:
+                sink.write(row)
+        pd.DataFrame(ROWS).to_csv(
+            self.path("pandas.csv"), index=False, encoding="utf-8-sig")
+        self.assertEqual(self.read("sink.csv"), self.read("pandas.csv"))
+        self.assertTrue(self.read("sink.csv").startswith(b"\xef\xbb\xbf"))
+
+    def test_csv_flushed(self):
+        with sinks.CsvSink(self.path("sink.csv")) as sink:
+            sink.write(ROWS[0])
+            lines = self.read("sink.csv").decode("utf-8-sig").splitlines()
+            self.assertEqual(len(lines), 2)
+            self.assertEqual(lines[0].split(","), list(ROWS[0]))
+
+    def test_csv_empty(self):
+        # A run without rows leaves an empty file, without a header.
+        with sinks.CsvSink(self.path("sink.csv")):
+            pass
+        self.assertEqual(self.read("sink.csv"), b"")
+
+    def test_json_lines(self):
+        with sinks.JsonLinesSink(self.path("sink.jsonl")) as sink:
+            sink.write(ROWS[0])
+            self.assertEqual(
+                len(self.read("sink.jsonl").splitlines()), 1)
+            sink.write(ROWS[1])
+        lines = self.read("sink.jsonl").decode("utf-8").splitlines()
+        self.assertEqual([json.loads(line) for line in lines], ROWS)
+
+    def test_write_csv_stopped(self):
+        def rows():
+            yield ROWS[0]
+            raise KeyboardInterrupt
+        with self.assertRaises(KeyboardInterrupt):
+            engine.write_csv(rows(), self.folder.name, "stopped.csv")
+        lines = self.read("stopped.csv").decode("utf-8-sig").splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith("2001,"))
+
+
+class ParquetTest(FileTest):
+    """The Parquet sink and the dataset."""
+
+    def test_dataset_path(self):
+        job = engine.Job("Burnout, Professional", presets.PHYSICIANS, 1966,
+                         2024)
+        self.assertEqual(
+            engine.dataset_path(job, "root", date(2025, 3, 1)),
+            os.path.join(
+                "root", "preset=physicians",
+                "user_mesh=Burnout%2C%20Professional",
+                "run_date=2025-03-01", "1966-2024.parquet"))
+        pair = engine.Job("Surgeons", engine.pair("Public Health"), 2000,
+                          2001)
+        self.assertIn(
+            os.path.join("preset=public-health", "user_mesh=Surgeons"),
+            engine.dataset_path(pair, "root"))
+
+    def test_without_pyarrow(self):
+        with mock.patch.dict("sys.modules", {"pyarrow": None}):
+            with self.assertRaisesRegex(ImportError, "pip install pyarrow"):
+                sinks.ParquetSink(self.path("rows.parquet"))
+
+    @unittest.skipUnless(PYARROW, "pyarrow is not installed")
+    def test_parquet(self):
+        import pyarrow.parquet
+        path = self.path(os.path.join("dataset", "rows.parquet"))
+        with sinks.ParquetSink(path) as sink:
+            for row in ROWS:
+                sink.write(row)
+            self.assertFalse(os.path.exists(path))
+        table = pyarrow.parquet.read_table(path)
+        self.assertEqual(table.to_pylist()[0]["term"], "Physicians")
+        self.assertEqual(len(table), len(ROWS))
+        self.assertEqual(str(table.schema.field("year").type), "int16")
+        self.assertEqual(
+            str(table.schema.field("intersecting_citations").type), "int32")
+
+    @unittest.skipUnless(PYARROW, "pyarrow is not installed")
+    def test_parquet_stopped(self):
+        def rows():
+            yield ROWS[0]
+            raise KeyboardInterrupt
+        path = self.path(os.path.join("dataset", "rows.parquet"))
+        with self.assertRaises(KeyboardInterrupt):
+            engine.write_csv(rows(), self.folder.name, "stopped.csv", path)
+        self.assertEqual(os.listdir(os.path.dirname(path)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+"""
+SUMMARY: These tests run a job in the "spans" mode against the stand-in
+    server (see medline_trends/mockserver.py) and check that its rows
+    are the same as those of the default mode, with fewer searches
+    for a preset whose terms rarely intersect the user-selected MeSH.
+    They also check how the years are put into runs.
+
+USAGE: Run this from the folder that holds the programs:
+        python -m pytest tests
+    or, without pytest:
+        python -m unittest discover tests
+"""
+
+# The unittest module runs the tests.
+import unittest
+
+from medline_trends import engine, eutils, mockserver, presets, spans
+from medline_trends.metrics import Metrics
+
+# The job the tests run. Most of its cells have a count of zero.
+JOB = engine.Job("Leprosy", presets.PHYSICIANS, 1990, 2005)
+
+
+def client(server):
+    """Return a client of a stand-in server."""
+    return eutils.EutilsClient(
+        api_key="test", rate=1000, url=server.url, cache=False,
+        metrics=Metrics(console=False))
+
+
+class SpansTest(unittest.TestCase):
+    """The "spans" mode of the engine."""
+
+    def test_runs(self):
+        self.assertEqual(
+            spans.runs([2003, 2001, 2002, 2005, 2009, 2008]),
+            [(2001, 2003), (2005, 2005), (2008, 2009)])
+
+    def test_same_rows(self):
+        corpus = mockserver.Corpus(JOB.preset.parents)
+        year_totals = {
+            yr: corpus.total(yr)
+            for yr in range(JOB.start_year, JOB.end_year + 1)}
+        with mockserver.MockServer(corpus) as server:
+            rows = engine.run(JOB, client(server), year_totals=year_totals)
+            searches = server.calls
+            self.assertEqual(
+                engine.run(
+                    JOB, client(server), "spans", year_totals=year_totals),
+                rows)
+            self.assertLess(server.calls - searches, searches)
+        found = {row["intersecting_citations"] > 0 for row in rows}
+        self.assertEqual(found, {True, False})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+"""
+SUMMARY: These tests check how the table of yearly totals is written and
+    read, that load() takes the settled years from the table and
+    searches for the rest, that refresh() makes the table and then only
+    searches again for the years still settling when it was made, and
+    that the engine reports the cells of years without a total.
+
+USAGE: Run this from the folder that holds the programs:
+        python -m pytest tests
+    or, without pytest:
+        python -m unittest discover tests
+"""
+
+# The datetime module dates the versions of the table.
+from datetime import date
+# The os module is used to build the path of the table.
+import os
+# The tempfile module holds the table in a folder that is removed after
+    # the tests.
+import tempfile
+# The unittest module runs the tests.
+import unittest
+
+from medline_trends import engine, journal, totals
+
+
+class Client:
+    """A client that makes up a count for each year and keeps the years
+    it was asked for. The years it is told to fail get no count."""
+
+    def __init__(self, failing=()):
+        self.failing = failing
+        self.years = []
+
+    def counts(self, queries):
+        for query in queries:
+            year = int(query[-len("YYYY[pdat]"):-len("[pdat]")])
+            self.years.append(year)
+            if year not in self.failing:
+                yield query, 1000 + year
+
+
+class TotalsTest(unittest.TestCase):
+    """Reading and bringing up to date the table of yearly totals."""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, "data", "totals.csv")
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_table(self):
+        self.assertEqual(totals.read_table(self.path), (None, {}))
+        totals.write_table({2001: 5, 2000: 4}, self.path, date(2020, 6, 1))
+        with open(self.path, encoding="utf-8") as f:
+            self.assertEqual(f.readline(), "# version: 2020-06-01\n")
+        self.assertEqual(
+            totals.read_table(self.path),
+            (date(2020, 6, 1), {2000: 4, 2001: 5}))
+
+    def test_settled(self):
+        self.assertEqual(totals.settled(date(2020, 6, 1)), 2017)
+        self.assertEqual(totals.settled(None), totals.FIRST_YEAR - 1)
+
+    def test_load(self):
+        totals.write_table(
+            {yr: yr for yr in range(2010, 2020)}, self.path,
+            date(2020, 6, 1))
+        client = Client()
+        found = totals.load(range(2012, 2023), client, self.path)
+        # The years up to 2017 had settled when the table was made.
+        self.assertEqual(client.years, list(range(2018, 2023)))
+        self.assertEqual(found[2012], 2012)
+        self.assertEqual(found[2019], 3019)
+        self.assertEqual(sorted(found), list(range(2012, 2023)))
+
+    def test_load_without_table(self):
+        client = Client(failing=[2021])
+        found = totals.load(range(2019, 2023), client, self.path)
+        self.assertEqual(client.years, list(range(2019, 2023)))
+        self.assertEqual(sorted(found), [2019, 2020, 2022])
+
+    def test_refresh(self):
+        first = totals.FIRST_YEAR
+        client = Client()
+        searched = totals.refresh(client, self.path, first + 9)
+        self.assertEqual(searched, list(range(first, first + 10)))
+        version, table = totals.read_table(self.path)
+        self.assertEqual(version, date.today())
+        self.assertEqual(table[first], 1000 + first)
+        self.assertEqual(totals.refresh(Client(), self.path, first + 9), [])
+        # Made in the year after, its last years were still settling.
+        totals.write_table(table, self.path, date(first + 10, 6, 1))
+        self.assertEqual(
+            totals.refresh(Client(), self.path, first + 10),
+            [first + 8, first + 9, first + 10])
+
+    def test_refresh_failure(self):
+        first = totals.FIRST_YEAR
+        with self.assertRaisesRegex(RuntimeError, str(first + 1)):
+            totals.refresh(Client(failing=[first + 1]), self.path, first + 2)
+        self.assertFalse(os.path.exists(self.path))
+
+
+class EngineTest(unittest.TestCase):
+    """A job with a year whose total could not be retrieved."""
+
+    def test_missing_total(self):
+        job = engine.Job("Surgeons", engine.pair("Public Health"), 2018, 2021)
+        with tempfile.TemporaryDirectory() as folder:
+            kept = journal.for_job(job, folder)
+            with self.assertWarnsRegex(
+                    RuntimeWarning, "retrieved for 2019, so 1 cells"):
+                rows = engine.run(
+                    job, Client(), journal=kept,
+                    year_totals={2018: 10, 2020: 10, 2021: 10})
+            self.assertEqual(
+                [row["publication_year"] for row in rows], [2018, 2020, 2021])
+            self.assertIn("for 2019", kept.failures()[
+                engine.Cell("Public Health", 2019)])
+            # The job is not done, so the next run picks it up.
+            self.assertFalse(kept.finished())
+
+
+if __name__ == "__main__":
+    unittest.main()